@@ -1,16 +1,22 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlalchemy.orm import Session
-from models.leave_requests import User
+from models.leave_requests import User, RefreshToken, EmailVerificationToken
 from database import get_db
+from auth_tokens import token_claims
+from rate_limit import throttle, get_stats as get_throttle_stats
+from metrics import bcrypt_in_flight, bcrypt_duration_seconds, timed
 from pydantic import BaseModel
 import bcrypt
 import jwt
 import os
 import secrets
-import requests
+import hashlib
+import logging
 from datetime import datetime, timedelta
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 # Pydantic models for request/response
@@ -26,23 +32,29 @@ class RegisterRequest(BaseModel):
 class RegisterConfirmRequest(BaseModel):
     token: str
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
 class AuthResponse(BaseModel):
     token: str
     user_id: int
     email: str
     name: str
     role: str
+    refresh_token: Optional[str] = None
 
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+CONFIRMATION_TOKEN_EXPIRE_HOURS = int(os.getenv("CONFIRMATION_TOKEN_EXPIRE_HOURS", "48"))
 
 # Brevo Configuration
 BREVO_TOKEN = os.getenv("BREVO_TOKEN")
 BREVO_API_URL = "https://api.brevo.com/v3/smtp/email"
 
-# Confirmation tokens are stored in the users table
+# Confirmation tokens are stored hashed in the email_verification_tokens table
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -54,17 +66,52 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def hash_token(token: str) -> str:
+    """Refresh and confirmation tokens are high-entropy random strings, so a plain SHA-256 is enough (no bcrypt)"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def issue_refresh_token(db: Session, user_id: int, family_id: Optional[str] = None) -> str:
+    """Add a new refresh token to the session (the caller commits) and return its plain value"""
+    token = secrets.token_urlsafe(48)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_token(token),
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+def revoke_refresh_token_family(db: Session, family_id: str):
+    """Revoke every still-active token of a family (the caller commits)"""
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    bcrypt_in_flight.inc()
+    try:
+        with timed(bcrypt_duration_seconds, "verify"):
+            return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    finally:
+        bcrypt_in_flight.dec()
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    bcrypt_in_flight.inc()
+    try:
+        with timed(bcrypt_duration_seconds, "hash"):
+            return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    finally:
+        bcrypt_in_flight.dec()
 
 def send_confirmation_email(email: str, name: str, token: str):
     """Send confirmation email using Brevo API"""
     if not BREVO_TOKEN:
         raise HTTPException(status_code=500, detail="Email service not configured")
     
+    # Imported on first use: only registration sends email, and requests is slow to import
+    import requests
+    
     confirmation_url = f"http://localhost:8000/register_confirm?token={token}"
     
     payload = {
@@ -106,9 +153,12 @@ def send_confirmation_email(email: str, name: str, token: str):
         raise HTTPException(status_code=500, detail=f"Failed to send confirmation email: {str(e)}")
 
 @router.post("/login", response_model=AuthResponse)
-def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+def login(login_data: LoginRequest, request: Request, db: Session = Depends(get_db)):
     """Login endpoint - authenticate user and return JWT token"""
     try:
+        # Reject bursts before spending any bcrypt CPU
+        throttle(request, "login", login_data.email)
+        
         # Find user by email
         user = db.query(User).filter(User.email == login_data.email).first()
         if not user:
@@ -125,16 +175,19 @@ def login(login_data: LoginRequest, db: Session = Depends(get_db)):
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user.email, "user_id": user.id},
+            data=token_claims(user),
             expires_delta=access_token_expires
         )
+        refresh_token = issue_refresh_token(db, user.id)
+        db.commit()
         
         return AuthResponse(
             token=access_token,
             user_id=user.id,
             email=user.email,
             name=user.name,
-            role=user.role
+            role=user.role,
+            refresh_token=refresh_token
         )
         
     except HTTPException:
@@ -143,9 +196,12 @@ def login(login_data: LoginRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Login error: {str(e)}")
 
 @router.post("/register")
-def register(register_data: RegisterRequest, db: Session = Depends(get_db)):
+def register(register_data: RegisterRequest, request: Request, db: Session = Depends(get_db)):
     """Register endpoint - create new user and send confirmation email"""
     try:
+        # Reject bursts before spending any bcrypt CPU
+        throttle(request, "register", register_data.email)
+        
         # Check if user already exists
         existing_user = db.query(User).filter(User.email == register_data.email).first()
         if existing_user:
@@ -163,15 +219,19 @@ def register(register_data: RegisterRequest, db: Session = Depends(get_db)):
         )
         
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        # Flush to get the user id, then store user and token in a single transaction
+        db.flush()
+        user_id = new_user.id
         
         # Generate confirmation token
         confirmation_token = secrets.token_urlsafe(32)
-        new_user.confirmation_token = confirmation_token
+        db.add(EmailVerificationToken(
+            token_hash=hash_token(confirmation_token),
+            user_id=user_id,
+            expires_at=datetime.utcnow() + timedelta(hours=CONFIRMATION_TOKEN_EXPIRE_HOURS)
+        ))
         
         db.commit()
-        db.refresh(new_user)
         
         # Send confirmation email (skip for testing if no BREVO_TOKEN)
         try:
@@ -179,13 +239,16 @@ def register(register_data: RegisterRequest, db: Session = Depends(get_db)):
         except HTTPException as e:
             if "Email service not configured" in str(e.detail):
                 # For testing purposes, just log the token
-                print(f"Confirmation token for {register_data.email}: {confirmation_token}")
+                logger.warning(
+                    "Email service not configured, confirmation token logged instead",
+                    extra={"email": register_data.email, "confirmation_token": confirmation_token}
+                )
             else:
                 raise e
         
         return {
             "message": "Registration successful. Please check your email to confirm your account.",
-            "user_id": new_user.id
+            "user_id": user_id
         }
         
     except HTTPException:
@@ -194,23 +257,42 @@ def register(register_data: RegisterRequest, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Registration error: {str(e)}")
 
+@router.get("/throttle/stats")
+def throttle_stats(request: Request):
+    """Login/registration throttling counters of this worker (manager only)"""
+    user = request.state.user
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if user["role"] != "manager":
+        raise HTTPException(status_code=403, detail="Only managers can view throttling stats")
+    
+    return {"limiters": get_throttle_stats()}
+
 @router.post("/register_confirm")
 def register_confirm(confirm_data: RegisterConfirmRequest, db: Session = Depends(get_db)):
     """Register confirmation endpoint - validate user account"""
     try:
-        # Find user by confirmation token
-        user = db.query(User).filter(User.confirmation_token == confirm_data.token).first()
-        if not user:
+        # Find user by confirmation token (primary key lookup on its hash)
+        row = db.query(EmailVerificationToken, User).join(
+            User, EmailVerificationToken.user_id == User.id
+        ).filter(
+            EmailVerificationToken.token_hash == hash_token(confirm_data.token),
+            EmailVerificationToken.expires_at > datetime.utcnow()
+        ).first()
+        if not row:
             raise HTTPException(status_code=400, detail="Invalid or expired confirmation token")
+        verification, user = row
         
         # Check if already validated
         if user.validated:
             raise HTTPException(status_code=400, detail="Account already validated")
         
-        # Validate user and clear token
+        # Validate user and drop all of its tokens
         user.validated = True
-        user.confirmation_token = None
         user.updated_at = datetime.utcnow()
+        db.query(EmailVerificationToken).filter(
+            EmailVerificationToken.user_id == user.id
+        ).delete(synchronize_session=False)
         
         db.commit()
         
@@ -224,3 +306,77 @@ def register_confirm(confirm_data: RegisterConfirmRequest, db: Session = Depends
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Confirmation error: {str(e)}")
+
+@router.post("/token/refresh", response_model=AuthResponse)
+def refresh_access_token(refresh_data: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Exchange a refresh token for a new access token and a rotated refresh token"""
+    try:
+        stored = db.query(RefreshToken).filter(
+            RefreshToken.token_hash == hash_token(refresh_data.refresh_token)
+        ).first()
+        if not stored:
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+        
+        # A rotated token being presented again means it leaked: kill the whole family
+        if stored.revoked_at is not None:
+            revoke_refresh_token_family(db, stored.family_id)
+            db.commit()
+            raise HTTPException(status_code=401, detail="Refresh token reuse detected")
+        
+        if stored.expires_at < datetime.utcnow():
+            raise HTTPException(status_code=401, detail="Refresh token expired")
+        
+        user = db.query(User).filter(User.id == stored.user_id).first()
+        if not user or not user.validated:
+            raise HTTPException(status_code=401, detail="User not found or not validated")
+        
+        # Rotate only if nobody else did concurrently, so the same token can't be redeemed twice
+        rotated = db.query(RefreshToken).filter(
+            RefreshToken.id == stored.id,
+            RefreshToken.revoked_at.is_(None)
+        ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+        if not rotated:
+            revoke_refresh_token_family(db, stored.family_id)
+            db.commit()
+            raise HTTPException(status_code=401, detail="Refresh token reuse detected")
+        
+        refresh_token = issue_refresh_token(db, user.id, stored.family_id)
+        db.commit()
+        
+        access_token = create_access_token(
+            data=token_claims(user),
+            expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        )
+        
+        return AuthResponse(
+            token=access_token,
+            user_id=user.id,
+            email=user.email,
+            name=user.name,
+            role=user.role,
+            refresh_token=refresh_token
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Token refresh error: {str(e)}")
+
+@router.post("/token/revoke")
+def revoke_refresh_token(refresh_data: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Logout endpoint - revoke the refresh token and every token rotated from it"""
+    try:
+        stored = db.query(RefreshToken).filter(
+            RefreshToken.token_hash == hash_token(refresh_data.refresh_token)
+        ).first()
+        if stored:
+            revoke_refresh_token_family(db, stored.family_id)
+            db.commit()
+        
+        # Same answer for unknown tokens, so the endpoint can't be used to probe them
+        return {"message": "Refresh token revoked"}
+        
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Token revoke error: {str(e)}")
@@ -0,0 +1,164 @@
+from fastapi import APIRouter, HTTPException, Request, Response, Depends, Query
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Literal
+from database import get_db
+from models.leave_requests import CalendarFeedToken, LeaveRequest, RequestTypeEnum, StatusEnum, User
+from calendar_feed import build_calendar, event_lines, feed_tokens, hash_token
+from etags import etag_matches, CACHE_CONTROL
+from response_cache import response_cache
+from directory import directory
+from api.leave_requests import ListVersion, leave_requests_version
+import hashlib
+import secrets
+import time
+
+router = APIRouter()
+
+class CreateCalendarFeed(BaseModel):
+    kind: Literal["user", "unit"]
+    id: int
+
+EVENT_COLUMNS = (
+    LeaveRequest.id, LeaveRequest.user_id, LeaveRequest.request_type, LeaveRequest.start_date, LeaveRequest.end_date,
+    LeaveRequest.start_datetime, LeaveRequest.end_datetime, LeaveRequest.reason, LeaveRequest.updated_at
+)
+SUMMARIES = {RequestTypeEnum.timeoff: "Time off", RequestTypeEnum.permission: "Permission"}
+
+def leave_event(row, summary: str, description=None) -> list:
+    if row.request_type == RequestTypeEnum.timeoff:
+        start, end = row.start_date, row.end_date
+    else:
+        start, end = row.start_datetime, row.end_datetime
+    return event_lines(f"leave-request-{row.id}@timeoff-manager", row.updated_at, summary, start, end, description)
+
+def render_feed(db: Session, kind: str, subject_id: int, version: ListVersion) -> bytes:
+    """Cache value of a feed: content digest (32 bytes), Last-Modified epoch (12 bytes), then the body.
+
+    Last-Modified is when the feed was rendered for this version, not the
+    newest row: renames and archived rows change a feed without a newer
+    updated_at, and If-Modified-Since needs a time that only moves forward.
+    """
+    epoch = int(time.time())
+    directory.catch_up(db, version.users_through, version.units_through)
+    query = db.query(*EVENT_COLUMNS).filter(LeaveRequest.status == StatusEnum.approved)
+    if kind == "user":
+        rows = query.filter(LeaveRequest.user_id == subject_id).order_by(LeaveRequest.id).all()
+        owner = directory.get_user(subject_id, db)
+        name = f"Leave - {owner.name}" if owner else "Leave"
+        # The user's own feed, so reasons are included
+        events = [leave_event(row, SUMMARIES[row.request_type], row.reason) for row in rows]
+    else:
+        rows = query.join(User, User.id == LeaveRequest.user_id).filter(User.unit_id == subject_id).order_by(LeaveRequest.id).all()
+        owners = directory.get_users({row.user_id for row in rows}, db)
+        name = f"Leave - {directory.get_unit_name(subject_id, db) or 'Unit'}"
+        events = []
+        for row in rows:
+            owner = owners.get(row.user_id)
+            events.append(leave_event(row, f"{owner.name if owner else 'Unknown'}: {SUMMARIES[row.request_type]}"))
+
+    body = build_calendar(name, events)
+    return hashlib.blake2b(body, digest_size=16).hexdigest().encode() + b"%012d" % epoch + body
+
+def feed_scope(kind: str, subject_id: int) -> str:
+    """Response cache scope a feed is kept in: the one of the list its rows come from"""
+    return f"leave_requests:user:{subject_id}" if kind == "user" else "leave_requests:all"
+
+def not_modified_since(request: Request, epoch: int) -> bool:
+    header = request.headers.get("if-modified-since")
+    if not header or request.headers.get("if-none-match"):
+        return False
+    try:
+        return parsedate_to_datetime(header).timestamp() >= epoch
+    except (TypeError, ValueError):
+        return False
+
+def serve_feed(request: Request, kind: str, subject_id: int, token: str, db: Session) -> Response:
+    try:
+        # Feeds are public routes: the token in the URL is the only credential
+        if not token or not feed_tokens.check(kind, subject_id, token, db):
+            raise HTTPException(status_code=404, detail="Calendar not found")
+
+        version = leave_requests_version(db, subject_id if kind == "user" else None)
+        cached = response_cache.get_or_compute(
+            feed_scope(kind, subject_id), version.key(), f"calendar:{kind}:{subject_id}",
+            lambda: render_feed(db, kind, subject_id, version)
+        )
+        digest, epoch, body = cached[:32].decode(), int(cached[32:44]), cached[44:]
+        headers = {
+            "ETag": f'"{digest}"',
+            "Last-Modified": formatdate(epoch, usegmt=True),
+            "Cache-Control": CACHE_CONTROL
+        }
+        if etag_matches(request, headers["ETag"]) or not_modified_since(request, epoch):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="text/calendar", headers=headers)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.get("/calendar/user/{user_id}.ics")
+def get_user_calendar(user_id: int, request: Request, token: str = Query(""), db: Session = Depends(get_db)):
+    """Approved leave of one user, as an iCalendar feed"""
+    return serve_feed(request, "user", user_id, token, db)
+
+@router.get("/calendar/unit/{unit_id}.ics")
+def get_unit_calendar(unit_id: int, request: Request, token: str = Query(""), db: Session = Depends(get_db)):
+    """Approved leave of everyone in a unit, as an iCalendar feed (without reasons)"""
+    return serve_feed(request, "unit", unit_id, token, db)
+
+def check_feed_access(request: Request, kind: str, subject_id: int) -> dict:
+    # Access authenticated user from middleware
+    user = request.state.user
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    # Same visibility as the list: users only their own leave, managers everyone's
+    if user["role"] != "manager" and (kind != "user" or subject_id != user["id"]):
+        raise HTTPException(status_code=403, detail="Not allowed to access this calendar")
+    return user
+
+@router.post("/calendar/feeds")
+def create_calendar_feed(request: Request, data: CreateCalendarFeed, db: Session = Depends(get_db)):
+    """Create a secret feed URL to subscribe to from a calendar app; the token is only shown here"""
+    try:
+        user = check_feed_access(request, data.kind, data.id)
+
+        token = secrets.token_urlsafe(32)
+        token_hash = hash_token(token)
+        db.add(CalendarFeedToken(token_hash=token_hash, kind=data.kind, subject_id=data.id, created_by=user["id"]))
+        db.commit()
+        feed_tokens.put(token_hash, data.kind, data.id)
+
+        route = "get_user_calendar" if data.kind == "user" else "get_unit_calendar"
+        path_params = {"user_id": data.id} if data.kind == "user" else {"unit_id": data.id}
+        url = request.url_for(route, **path_params).include_query_params(token=token)
+        return {"url": str(url), "token": token}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to create calendar feed: {str(e)}")
+
+@router.delete("/calendar/feeds/{kind}/{subject_id}")
+def revoke_calendar_feeds(kind: Literal["user", "unit"], subject_id: int, request: Request, db: Session = Depends(get_db)):
+    """Revoke every feed URL of a calendar"""
+    try:
+        check_feed_access(request, kind, subject_id)
+
+        revoked = db.query(CalendarFeedToken).filter(
+            CalendarFeedToken.kind == kind,
+            CalendarFeedToken.subject_id == subject_id
+        ).delete(synchronize_session=False)
+        db.commit()
+        feed_tokens.forget(kind, subject_id)
+        return {"revoked": revoked}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to revoke calendar feeds: {str(e)}")
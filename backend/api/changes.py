@@ -0,0 +1,88 @@
+from fastapi import APIRouter, HTTPException, Request, Depends, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.orm import Session
+from database import get_db
+from change_feed import (
+    read_changes, change_events, change_signal,
+    CHANGE_FEED_MAX_BATCH, CHANGE_FEED_MAX_WAIT, CHANGE_FEED_POLL_SECONDS
+)
+import asyncio
+import time
+
+router = APIRouter()
+
+def require_manager(request: Request) -> dict:
+    # Access authenticated user from middleware
+    user = request.state.user
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if user["role"] != "manager":
+        raise HTTPException(status_code=403, detail="Only managers can read the change feed")
+    return user
+
+def batch_reader(db: Session, limit: int):
+    """Read one batch off the event loop, ending the transaction so the next read sees new commits"""
+    def read(since: int):
+        try:
+            return read_changes(db, since, limit)
+        finally:
+            db.rollback()
+    return lambda since: asyncio.to_thread(read, since)
+
+# The feed reads from the primary: a lagging replica could show a gap's later change long after
+# it was written, and the gap would be skipped as rolled back
+
+@router.get("/changes", response_class=ORJSONResponse)
+async def get_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="Cursor of the last change already applied (0: from the start)"),
+    limit: int = Query(100, ge=1, le=CHANGE_FEED_MAX_BATCH),
+    wait: float = Query(0, ge=0, le=CHANGE_FEED_MAX_WAIT, description="Seconds to wait for a change when there is none (long-poll)"),
+    db: Session = Depends(get_db)
+):
+    """Leave request changes after a cursor, oldest first (manager only)"""
+    try:
+        require_manager(request)
+
+        read_batch = batch_reader(db, limit)
+        deadline = time.monotonic() + wait
+        while True:
+            changes, cursor = await read_batch(since)
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                break
+            await change_signal.wait(min(CHANGE_FEED_POLL_SECONDS, remaining))
+
+        return {
+            "changes": changes,
+            "count": len(changes),
+            "next_cursor": cursor,
+            "has_more": len(changes) == limit
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.get("/changes/stream")
+async def stream_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="Cursor to start after; a Last-Event-ID header takes precedence"),
+    db: Session = Depends(get_db)
+):
+    """Server-Sent Events stream of leave request changes (manager only)"""
+    require_manager(request)
+
+    # EventSource reconnects with the id of the last event it received
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id:
+        if not last_event_id.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+        since = int(last_event_id)
+
+    return StreamingResponse(
+        change_events(batch_reader(db, CHANGE_FEED_MAX_BATCH), since, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
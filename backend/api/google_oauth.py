@@ -3,10 +3,11 @@ from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from models.leave_requests import User, AuthProviderEnum
 from database import get_db
+from api.authentication import issue_refresh_token
+from auth_tokens import token_claims
 from pydantic import BaseModel
 import os
 import jwt
-import requests
 from datetime import datetime, timedelta
 from typing import Optional
 from urllib.parse import urlencode
@@ -59,6 +60,9 @@ def get_google_auth_url(request: Request):
 @router.get("/google/callback")
 def google_callback(code: str, request: Request, db: Session = Depends(get_db)):
     """Handle Google OAuth callback"""
+    # Imported on first use, so workers that never see a Google login don't load requests
+    import requests
+    
     try:
         if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
             raise HTTPException(status_code=500, detail="Google OAuth not configured")
@@ -122,13 +126,15 @@ def google_callback(code: str, request: Request, db: Session = Depends(get_db)):
         # Create JWT token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user.email, "user_id": user.id},
+            data=token_claims(user),
             expires_delta=access_token_expires
         )
+        refresh_token = issue_refresh_token(db, user.id)
+        db.commit()
         
         # Redirect to frontend with token
         frontend_url = "http://localhost:3000"
-        redirect_url = f"{frontend_url}/auth/callback?token={access_token}&user_id={user.id}&email={user.email}&name={user.name}"
+        redirect_url = f"{frontend_url}/auth/callback?token={access_token}&user_id={user.id}&email={user.email}&name={user.name}&refresh_token={refresh_token}"
         
         return RedirectResponse(url=redirect_url)
         
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from health import health_monitor, DRAIN_TOKEN
+import hmac
+
+router = APIRouter()
+
+@router.get("/ready")
+async def readiness():
+    """Readiness for the load balancer: 503 while draining or when a dependency is unhealthy"""
+    report = health_monitor.status()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@router.post("/drain")
+async def drain(request: Request):
+    """Stop receiving traffic before shutdown (call from a pre-stop hook with DRAIN_TOKEN); drains every worker"""
+    # A public route, and the peer address is the proxy's behind a load balancer: only the secret counts
+    if not DRAIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Draining over HTTP is disabled (DRAIN_TOKEN is not set)")
+    token = request.headers.get("x-drain-token", "")
+    if not hmac.compare_digest(token.encode(), DRAIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid drain token")
+    health_monitor.start_draining()
+    return {"draining": True}
@@ -1,11 +1,27 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, null, select, update
 from sqlalchemy.orm import Session
-from models.leave_requests import LeaveRequest, StatusEnum, RequestTypeEnum, User
-from database import get_db
+from models.leave_requests import LeaveRequest, LeaveRequestArchive, LeaveRequestChange, StatusEnum, RequestTypeEnum, Unit, User, PERIOD_END
+from database import get_db, get_read_db
 from pydantic import BaseModel
 from datetime import date, datetime
-from typing import Optional, Union
-from websocket_manager import manager
+from typing import NamedTuple, Optional, Union, List, Dict
+from etags import compute_etag, etag_matches, not_modified_response, set_etag_headers, CACHE_CONTROL
+from response_cache import response_cache
+from directory import directory
+from search import search_leave_request_ids
+from change_feed import record_change
+import logging
+import orjson
+import os
+
+logger = logging.getLogger(__name__)
+
+# Latest change feed ids the manager list version counts; keep it above the writes that can be in flight at once
+LIST_VERSION_WINDOW = int(os.getenv("LIST_VERSION_WINDOW", "1000"))
+# Years of archive partitions read by ?include_archived=true without ?since= (the current year counts)
+INCLUDE_ARCHIVED_YEARS = int(os.getenv("INCLUDE_ARCHIVED_YEARS", "3"))
 
 # Pydantic models for leave requests
 class CreateLeaveRequest(BaseModel):
@@ -22,135 +38,421 @@ class UpdateLeaveRequestStatus(BaseModel):
     status: StatusEnum
     review_comment: Optional[str] = None
 
+class LeaveRequestItem(BaseModel):
+    """A leave request row; every field except id may be left out by ?fields="""
+    id: int
+    user_id: Optional[int] = None
+    user_name: Optional[str] = None
+    user_email: Optional[str] = None
+    request_type: Optional[RequestTypeEnum] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    start_datetime: Optional[datetime] = None
+    end_datetime: Optional[datetime] = None
+    reason: Optional[str] = None
+    status: Optional[StatusEnum] = None
+    reviewed_by: Optional[int] = None
+    reviewed_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class LeaveRequestUser(BaseModel):
+    """Requester entry of the users side table"""
+    name: str
+    email: str
+
+class AuthenticatedUser(BaseModel):
+    id: int
+    name: str
+    email: str
+    role: str
+
+class LeaveRequestListResponse(BaseModel):
+    """Leave request list; users is only present with ?users=table"""
+    leave_requests: List[LeaveRequestItem]
+    count: int
+    message: str
+    authenticated_user: AuthenticatedUser
+    users: Optional[Dict[int, LeaveRequestUser]] = None
+
+class LeaveRequestSearchResult(LeaveRequestItem):
+    """A leave request matching a search, with its relevance (higher is better)"""
+    score: float
+
+class LeaveRequestSearchResponse(BaseModel):
+    """One page of search results, best match first; next_offset is None on the last page"""
+    leave_requests: List[LeaveRequestSearchResult]
+    count: int
+    limit: int
+    offset: int
+    next_offset: Optional[int] = None
+
+class AwayEntry(BaseModel):
+    """A request whose [starts_at, ends_at) interval overlaps the asked period"""
+    leave_request_id: int
+    user_id: int
+    user_name: Optional[str] = None
+    request_type: RequestTypeEnum
+    status: StatusEnum
+    starts_at: datetime
+    ends_at: datetime
+
+class AwayResponse(BaseModel):
+    away: List[AwayEntry]
+    count: int
+    start: datetime
+    end: datetime
+
+# Selectable list fields, in response order
+LEAVE_REQUEST_FIELDS = {
+    "id": LeaveRequest.id,
+    "user_id": LeaveRequest.user_id,
+    "user_name": User.name,
+    "user_email": User.email,
+    "request_type": LeaveRequest.request_type,
+    "start_date": LeaveRequest.start_date,
+    "end_date": LeaveRequest.end_date,
+    "start_datetime": LeaveRequest.start_datetime,
+    "end_datetime": LeaveRequest.end_datetime,
+    "reason": LeaveRequest.reason,
+    "status": LeaveRequest.status,
+    "reviewed_by": LeaveRequest.reviewed_by,
+    "reviewed_at": LeaveRequest.reviewed_at,
+    "created_at": LeaveRequest.created_at,
+    "updated_at": LeaveRequest.updated_at
+}
+USER_FIELDS = ("user_name", "user_email")
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Resolve a ?fields= value into an ordered list of field names (id is always included)"""
+    if not fields:
+        return list(LEAVE_REQUEST_FIELDS)
+
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - LEAVE_REQUEST_FIELDS.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    requested.add("id")
+    return [name for name in LEAVE_REQUEST_FIELDS if name in requested]
+
 router = APIRouter()
 
-async def send_leave_request_notification(request_id: int, status: str, reviewer_name: str, user_id: int, db: Session):
-    """Send WebSocket notification when leave request status changes"""
+def leave_requests_scope(user: dict) -> str:
+    """Response cache scope of a user's list: shared by all managers, per user otherwise"""
+    return "leave_requests:all" if user["role"] == "manager" else f"leave_requests:user:{user['id']}"
+
+class ListVersion(NamedTuple):
+    """Version of a cached list scope, read from the database so every worker agrees on it"""
+    last_change: Optional[int]
+    changes: int
+    users_through: Optional[datetime]
+    units_through: Optional[datetime]
+
+    def key(self) -> str:
+        return ":".join("" if part is None else str(part) for part in self)
+
+def leave_requests_version(db: Session, owner_id: Optional[int]) -> ListVersion:
+    """One query: the latest changes to owner_id's requests (everyone's with None) and user and unit updates.
+
+    Every write records a change in its transaction, so the last id moves
+    when it commits; counting the changes as well catches a transaction
+    that got a lower id but committed later. Renames show up in updated_at.
+    """
+    changes = select(func.max(LeaveRequestChange.id).label("last_change"), func.count(LeaveRequestChange.id).label("changes"))
+    if owner_id is None:
+        latest = select(func.max(LeaveRequestChange.id)).scalar_subquery()
+        changes = changes.where(LeaveRequestChange.id > func.coalesce(latest, 0) - LIST_VERSION_WINDOW)
+        users_through = select(func.max(User.updated_at)).scalar_subquery()
+        units_through = select(func.max(Unit.updated_at)).scalar_subquery()
+    else:
+        # Lists of one user only carry their own name
+        changes = changes.where(LeaveRequestChange.user_id == owner_id)
+        users_through = select(User.updated_at).where(User.id == owner_id).scalar_subquery()
+        units_through = null()
+    changes = changes.subquery()
+    row = db.execute(select(changes.c.last_change, changes.c.changes, users_through, units_through)).one()
+    return ListVersion(*row)
+
+def archived_since(since: Optional[date], today: Optional[date] = None) -> date:
+    """First period_end read from the archive: since, or January 1st INCLUDE_ARCHIVED_YEARS - 1 years ago"""
+    if since is not None:
+        return since
+    today = today or date.today()
+    return date(today.year - INCLUDE_ARCHIVED_YEARS + 1, 1, 1)
+
+def build_leave_request_list(db: Session, user: dict, selected: List[str], users: str, include_archived: bool = False,
+                             since: Optional[date] = None, version: Optional[ListVersion] = None) -> bytes:
+    """Serialized list response without authenticated_user.
+
+    The same bytes serve every manager, so the per-user part is appended by
+    the caller. Only requests ending on or after since are listed; archived
+    ones are only read (and appended) with include_archived, from
+    archived_since(since) on. With a version, names are at least as new as it.
+    """
+    is_manager = user["role"] == "manager"
+    if version is not None:
+        directory.catch_up(db, version.users_through, version.units_through)
+    
+    # In table mode user data is sent once per user instead of on every row
+    if users == "table":
+        selected = [name for name in selected if name not in USER_FIELDS]
+        if "user_id" not in selected:
+            selected.insert(1, "user_id")
+    
+    # Only leave_requests columns are selected; names and emails come from the user directory
+    columns = [name for name in selected if name not in USER_FIELDS]
+    inline_users = len(columns) < len(selected)
+    if inline_users and "user_id" not in columns:
+        columns.append("user_id")
+    query = db.query(*[LEAVE_REQUEST_FIELDS[name] for name in columns])
+    archive_query = db.query(*[getattr(LeaveRequestArchive, name) for name in columns])
+    
+    # Filter based on user role
+    if is_manager:
+        # Managers can see all leave requests with user information
+        message = "All leave requests retrieved (manager view)"
+    else:
+        # Regular users can only see their own leave requests with user information
+        query = query.filter(LeaveRequest.user_id == user["id"])
+        archive_query = archive_query.filter(LeaveRequestArchive.user_id == user["id"])
+        message = "Your leave requests retrieved (user view)"
+    
+    if since is not None:
+        query = query.filter(PERIOD_END >= since)
+    if include_archived:
+        # period_end is the archive's partitioning key, so older partitions are pruned
+        query = query.union_all(archive_query.filter(LeaveRequestArchive.period_end >= archived_since(since)))
+    
+    rows = query.all()
+    owners = {}
+    if "user_id" in columns:
+        user_index = columns.index("user_id")
+        owners = directory.get_users({row[user_index] for row in rows}, db)
+    
+    # Rows are handed to orjson as-is: dates, datetimes and enums are encoded natively
+    if inline_users:
+        result = []
+        for row in rows:
+            item = dict(zip(columns, row))
+            owner = owners.get(item["user_id"])
+            item["user_name"] = owner.name if owner else None
+            item["user_email"] = owner.email if owner else None
+            result.append({name: item[name] for name in selected})
+    else:
+        result = [dict(zip(columns, row)) for row in rows]
+    
+    content = {
+        "leave_requests": result, 
+        "count": len(result),
+        "message": message
+    }
+    
+    if users == "table":
+        content["users"] = {user_id: {"name": owner.name, "email": owner.email} for user_id, owner in owners.items()}
+    
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+def leave_request_response(leave_request, message: str) -> dict:
+    """Response body of a created or reviewed leave request"""
+    response_data = {
+        "id": leave_request.id,
+        "user_id": leave_request.user_id,
+        "request_type": leave_request.request_type,
+        "reason": leave_request.reason,
+        "status": leave_request.status,
+        "reviewed_by": leave_request.reviewed_by,
+        "reviewed_at": leave_request.reviewed_at.isoformat() if leave_request.reviewed_at else None,
+        "created_at": leave_request.created_at.isoformat(),
+        "updated_at": leave_request.updated_at.isoformat(),
+        "message": message
+    }
+    
+    # Add type-specific fields to response
+    if leave_request.request_type == RequestTypeEnum.timeoff:
+        response_data.update({
+            "start_date": leave_request.start_date.isoformat(),
+            "end_date": leave_request.end_date.isoformat()
+        })
+    else:  # permission
+        response_data.update({
+            "start_datetime": leave_request.start_datetime.isoformat(),
+            "end_datetime": leave_request.end_datetime.isoformat()
+        })
+    return response_data
+
+@router.get("/leave_requests", response_model=LeaveRequestListResponse, response_class=ORJSONResponse)
+def get_leave_requests(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma separated list of fields to return"),
+    users: str = Query("inline", pattern="^(inline|table)$", description="inline: user_name/user_email on every row, table: a users map keyed by user_id"),
+    include_archived: bool = Query(False, description="Also return reviewed requests from past years, moved to the archive"),
+    since: Optional[date] = Query(None, description="Only requests ending on or after this day; without it, include_archived reads the last INCLUDE_ARCHIVED_YEARS years"),
+    db: Session = Depends(get_read_db)
+):
+    """Get leave requests based on user role: managers see all, users see only their own"""
     try:
-        # Get the leave request details
-        leave_request = db.query(LeaveRequest).filter(LeaveRequest.id == request_id).first()
-        if not leave_request:
-            return
-        
-        # Get user information
-        user = db.query(User).filter(User.id == leave_request.user_id).first()
+        # Access authenticated user from middleware
+        user = request.state.user
         if not user:
-            return
+            raise HTTPException(status_code=401, detail="Authentication required")
         
-        # Prepare notification data
-        notification_data = {
-            "request_id": request_id,
-            "request_type": leave_request.request_type,
-            "status": status,
-            "reviewer_name": reviewer_name,
-            "timestamp": datetime.utcnow().isoformat(),
-            "details": {
-                "start_date": leave_request.start_date.isoformat() if leave_request.start_date else None,
-                "end_date": leave_request.end_date.isoformat() if leave_request.end_date else None,
-                "start_datetime": leave_request.start_datetime.isoformat() if leave_request.start_datetime else None,
-                "end_datetime": leave_request.end_datetime.isoformat() if leave_request.end_datetime else None,
-                "reason": leave_request.reason
-            }
-        }
+        selected = parse_fields(fields)
+        archive = archived_since(since) if include_archived else ""
+        variant = f"{','.join(selected)}|{users}|{since or ''}|{archive}"
         
-        # Send notification only to the request owner
-        await manager.send_notification_to_user(
-            leave_request.user_id,
-            "leave_request_status_changed",
-            notification_data
+        # The version is read on every request; the list and the version come from the same session
+        version = leave_requests_version(db, None if user["role"] == "manager" else user["id"])
+        
+        # Answer conditional GETs before the list is read or serialized
+        etag = compute_etag("leave_requests", version.key(), variant, user["id"], user["name"], user["email"], user["role"])
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+        
+        body = response_cache.get_or_compute(
+            leave_requests_scope(user),
+            version.key(),
+            variant,
+            lambda: build_leave_request_list(db, user, selected, users, include_archived, since, version)
         )
+        authenticated_user = orjson.dumps({
+            "id": user["id"],
+            "name": user["name"],
+            "email": user["email"],
+            "role": user["role"]
+        })
+        # Splice the per-user field into the shared body instead of re-serializing the rows
+        content = body[:-1] + b',"authenticated_user":' + authenticated_user + b"}"
         
+        return Response(content, media_type="application/json", headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+        
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error sending notification: {e}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-async def send_new_request_notification(request_id: int, user_name: str, user_id: int, request_type: str, db: Session):
-    """Send WebSocket notification when a new leave request is created"""
+@router.get("/leave_requests/search", response_model=LeaveRequestSearchResponse, response_class=ORJSONResponse)
+def search_leave_requests(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to look for in reasons and requester names"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_read_db)
+):
+    """Full-text search over leave requests, ranked; managers search all, users only their own"""
     try:
-        # Get the leave request details
-        leave_request = db.query(LeaveRequest).filter(LeaveRequest.id == request_id).first()
-        if not leave_request:
-            return
+        # Access authenticated user from middleware
+        user = request.state.user
+        if not user:
+            raise HTTPException(status_code=401, detail="Authentication required")
         
-        # Prepare notification data
-        notification_data = {
-            "request_id": request_id,
-            "request_type": request_type,
-            "user_name": user_name,
-            "user_id": user_id,
-            "timestamp": datetime.utcnow().isoformat(),
-            "details": {
-                "start_date": leave_request.start_date.isoformat() if leave_request.start_date else None,
-                "end_date": leave_request.end_date.isoformat() if leave_request.end_date else None,
-                "start_datetime": leave_request.start_datetime.isoformat() if leave_request.start_datetime else None,
-                "end_datetime": leave_request.end_datetime.isoformat() if leave_request.end_datetime else None,
-                "reason": leave_request.reason
-            }
-        }
+        owner_id = None if user["role"] == "manager" else user["id"]
         
-        # Send notification to all managers about the new request
-        await manager.broadcast_to_managers({
-            "type": "manager_notification",
-            "notification_type": "new_leave_request",
-            "data": notification_data
-        })
+        # Results only change with the requests and names the list version covers; answer repeats before searching
+        version = leave_requests_version(db, owner_id)
+        etag = compute_etag("leave_requests_search", version.key(), q, limit, offset, owner_id)
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+        set_etag_headers(response, etag)
+        
+        # One extra match tells whether there is a next page
+        matches = search_leave_request_ids(db, q, owner_id, limit + 1, offset)
+        next_offset = offset + limit if len(matches) > limit else None
+        scores = dict(matches[:limit])
         
-        print(f"Sent new request notification to managers: {notification_data}")
+        columns = [name for name in LEAVE_REQUEST_FIELDS if name not in USER_FIELDS]
+        rows = {}
+        if scores:
+            query = db.query(*[LEAVE_REQUEST_FIELDS[name] for name in columns]).filter(LeaveRequest.id.in_(scores))
+            rows = {row.id: dict(zip(columns, row)) for row in query}
+        owners = directory.get_users({item["user_id"] for item in rows.values()}, db)
+        
+        result = []
+        for leave_request_id, score in scores.items():
+            item = rows.get(leave_request_id)
+            if item is None:
+                # Archived or deleted between the two queries
+                continue
+            owner = owners.get(item["user_id"])
+            item["user_name"] = owner.name if owner else None
+            item["user_email"] = owner.email if owner else None
+            item["score"] = score
+            result.append(item)
+        
+        return {
+            "leave_requests": result,
+            "count": len(result),
+            "limit": limit,
+            "offset": offset,
+            "next_offset": next_offset
+        }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error sending new request notification: {e}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-@router.get("/leave_requests")
-def get_leave_requests(request: Request, db: Session = Depends(get_db)):
-    """Get leave requests based on user role: managers see all, users see only their own"""
+@router.get("/leave_requests/away", response_model=AwayResponse, response_class=ORJSONResponse)
+def get_away(
+    request: Request,
+    response: Response,
+    start: datetime = Query(..., description="Start of the period (inclusive)"),
+    end: datetime = Query(..., description="End of the period (exclusive)"),
+    include_pending: bool = Query(False, description="Also count requests not reviewed yet"),
+    db: Session = Depends(get_read_db)
+):
+    """Who is away during [start, end): approved requests overlapping the period, by start time"""
     try:
         # Access authenticated user from middleware
         user = request.state.user
         if not user:
             raise HTTPException(status_code=401, detail="Authentication required")
         
-        # Filter based on user role
-        if user["role"] == "manager":
-            # Managers can see all leave requests with user information
-            leave_requests = db.query(LeaveRequest, User).join(User, LeaveRequest.user_id == User.id).all()
-            message = "All leave requests retrieved (manager view)"
-        else:
-            # Regular users can only see their own leave requests with user information
-            leave_requests = db.query(LeaveRequest, User).join(User, LeaveRequest.user_id == User.id).filter(LeaveRequest.user_id == user["id"]).all()
-            message = "Your leave requests retrieved (user view)"
+        if end <= start:
+            raise HTTPException(status_code=400, detail="end must be after start")
         
-        # Convert to dictionary format
-        result = []
-        for request, user_info in leave_requests:
-            result.append({
-                "id": request.id,
-                "user_id": request.user_id,
-                "user_name": user_info.name,
-                "user_email": user_info.email,
-                "request_type": request.request_type,
-                "start_date": request.start_date.isoformat() if request.start_date else None,
-                "end_date": request.end_date.isoformat() if request.end_date else None,
-                "start_datetime": request.start_datetime.isoformat() if request.start_datetime else None,
-                "end_datetime": request.end_datetime.isoformat() if request.end_datetime else None,
-                "reason": request.reason,
-                "status": request.status,
-                "reviewed_by": request.reviewed_by,
-                "reviewed_at": request.reviewed_at.isoformat() if request.reviewed_at else None,
-                "created_at": request.created_at.isoformat() if request.created_at else None,
-                "updated_at": request.updated_at.isoformat() if request.updated_at else None
+        # Answer repeats of the same period before the range query
+        owner_id = None if user["role"] == "manager" else user["id"]
+        version = leave_requests_version(db, owner_id)
+        etag = compute_etag("leave_requests_away", version.key(), start.isoformat(), end.isoformat(), include_pending, owner_id)
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+        set_etag_headers(response, etag)
+        
+        statuses = [StatusEnum.approved, StatusEnum.pending] if include_pending else [StatusEnum.approved]
+        # One range query on the (ends_at, starts_at) index, whatever the request types
+        query = db.query(
+            LeaveRequest.id, LeaveRequest.user_id, LeaveRequest.request_type, LeaveRequest.status,
+            LeaveRequest.starts_at, LeaveRequest.ends_at
+        ).filter(
+            LeaveRequest.ends_at > start,
+            LeaveRequest.starts_at < end,
+            LeaveRequest.status.in_(statuses)
+        )
+        # Same visibility as the list: users only see their own requests
+        if owner_id is not None:
+            query = query.filter(LeaveRequest.user_id == owner_id)
+        rows = query.order_by(LeaveRequest.starts_at, LeaveRequest.id).all()
+        owners = directory.get_users({row.user_id for row in rows}, db)
+        
+        away = []
+        for row in rows:
+            owner = owners.get(row.user_id)
+            away.append({
+                "leave_request_id": row.id,
+                "user_id": row.user_id,
+                "user_name": owner.name if owner else None,
+                "request_type": row.request_type,
+                "status": row.status,
+                "starts_at": row.starts_at,
+                "ends_at": row.ends_at
             })
         
-        return {
-            "leave_requests": result, 
-            "count": len(result),
-            "message": message,
-            "authenticated_user": {
-                "id": user["id"],
-                "name": user["name"],
-                "email": user["email"],
-                "role": user["role"]
-            }
-        }
+        return {"away": away, "count": len(away), "start": start, "end": end}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -206,46 +508,14 @@ async def create_leave_request(request: Request, leave_data: CreateLeaveRequest,
                 status=StatusEnum.pending
             )
         
+        # The request's INSERT and its change feed entry commit together; nothing is read back
         db.add(new_leave_request)
+        db.flush()
+        record_change(db, new_leave_request, "created")
         db.commit()
-        db.refresh(new_leave_request)
-        
-        # Return the created leave request
-        response_data = {
-            "id": new_leave_request.id,
-            "user_id": new_leave_request.user_id,
-            "request_type": new_leave_request.request_type,
-            "reason": new_leave_request.reason,
-            "status": new_leave_request.status,
-            "reviewed_by": new_leave_request.reviewed_by,
-            "reviewed_at": new_leave_request.reviewed_at.isoformat() if new_leave_request.reviewed_at else None,
-            "created_at": new_leave_request.created_at.isoformat(),
-            "updated_at": new_leave_request.updated_at.isoformat(),
-            "message": f"{leave_data.request_type.title()} request created successfully"
-        }
-        
-        # Add type-specific fields to response
-        if leave_data.request_type == RequestTypeEnum.timeoff:
-            response_data.update({
-                "start_date": new_leave_request.start_date.isoformat(),
-                "end_date": new_leave_request.end_date.isoformat()
-            })
-        else:  # permission
-            response_data.update({
-                "start_datetime": new_leave_request.start_datetime.isoformat(),
-                "end_datetime": new_leave_request.end_datetime.isoformat()
-            })
         
-        # Send WebSocket notification to managers about new request creation
-        await send_new_request_notification(
-            request_id=new_leave_request.id,
-            user_name=user["name"],
-            user_id=user["id"],
-            request_type=leave_data.request_type,
-            db=db
-        )
-        
-        return response_data
+        # Connected managers are notified from the change feed, on whichever worker they're connected to
+        return leave_request_response(new_leave_request, f"{leave_data.request_type.title()} request created successfully")
         
     except HTTPException:
         raise
@@ -266,58 +536,38 @@ async def update_leave_request_status(request_id: int, request: Request, status_
         if user["role"] != "manager":
             raise HTTPException(status_code=403, detail="Only managers can update leave request status")
         
-        # Find the leave request
-        leave_request = db.query(LeaveRequest).filter(LeaveRequest.id == request_id).first()
-        if not leave_request:
-            raise HTTPException(status_code=404, detail="Leave request not found")
-        
-        # Check if request is already processed
-        if leave_request.status != StatusEnum.pending:
-            raise HTTPException(status_code=400, detail=f"Leave request is already {leave_request.status}")
+        # Transition only a pending request, atomically: of two managers acting at once, one wins
+        now = datetime.now()
+        transition = (
+            update(LeaveRequest)
+            .where(LeaveRequest.id == request_id, LeaveRequest.status == StatusEnum.pending)
+            .values(status=status_data.status, reviewed_by=user["id"], reviewed_at=now, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if db.get_bind().dialect.update_returning:
+            leave_request = db.execute(transition.returning(*LeaveRequest.__table__.c)).first()
+        else:
+            # No UPDATE ... RETURNING (MySQL): read the row back under the lock the UPDATE holds
+            updated = db.execute(transition).rowcount
+            leave_request = db.execute(
+                select(*LeaveRequest.__table__.c).where(LeaveRequest.id == request_id)
+            ).first() if updated else None
         
-        # Update the status
-        leave_request.status = status_data.status
-        leave_request.reviewed_by = user["id"]
-        leave_request.reviewed_at = datetime.now()
-        leave_request.updated_at = datetime.now()
+        if leave_request is None:
+            db.rollback()
+            current = db.query(LeaveRequest.status).filter(LeaveRequest.id == request_id).first()
+            if current is None:
+                # Only reviewed requests are archived
+                current = db.query(LeaveRequestArchive.status).filter(LeaveRequestArchive.id == request_id).first()
+            if current is None:
+                raise HTTPException(status_code=404, detail="Leave request not found")
+            raise HTTPException(status_code=400, detail=f"Leave request is already {current.status}")
         
+        record_change(db, leave_request, "status_changed")
         db.commit()
-        db.refresh(leave_request)
-        
-        # Send WebSocket notification
-        await send_leave_request_notification(
-            request_id=request_id,
-            status=status_data.status,
-            reviewer_name=user["name"],
-            user_id=user["id"],
-            db=db
-        )
         
-        # Return the updated leave request
-        response_data = {
-            "id": leave_request.id,
-            "user_id": leave_request.user_id,
-            "request_type": leave_request.request_type,
-            "reason": leave_request.reason,
-            "status": leave_request.status,
-            "reviewed_by": leave_request.reviewed_by,
-            "reviewed_at": leave_request.reviewed_at.isoformat() if leave_request.reviewed_at else None,
-            "created_at": leave_request.created_at.isoformat(),
-            "updated_at": leave_request.updated_at.isoformat(),
-            "message": f"Leave request {status_data.status} successfully"
-        }
-        
-        # Add type-specific fields to response
-        if leave_request.request_type == RequestTypeEnum.timeoff:
-            response_data.update({
-                "start_date": leave_request.start_date.isoformat(),
-                "end_date": leave_request.end_date.isoformat()
-            })
-        else:  # permission
-            response_data.update({
-                "start_datetime": leave_request.start_datetime.isoformat(),
-                "end_datetime": leave_request.end_datetime.isoformat()
-            })
+        # The owner is notified from the change feed; return the updated leave request
+        response_data = leave_request_response(leave_request, f"Leave request {status_data.status} successfully")
         
         return response_data
         
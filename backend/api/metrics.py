@@ -0,0 +1,57 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from metrics import registry, Counter, Gauge
+from response_cache import response_cache
+from websocket_manager import manager
+import anyio.to_thread
+import os
+import rate_limit
+
+router = APIRouter()
+
+# Optional bearer token required to scrape /metrics
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+def websocket_connections_by_role():
+    counts = {}
+    for info in list(manager.user_info.values()):
+        role = getattr(info.get("role"), "value", info.get("role"))
+        counts[(role,)] = counts.get((role,), 0) + 1
+    return counts
+
+def throttle_counters():
+    return {
+        (name, outcome): count
+        for name, stats in rate_limit.get_stats().items()
+        for outcome, count in stats.items()
+    }
+
+def response_cache_counters():
+    return {(result,): count for result, count in response_cache.get_stats().items()}
+
+registry.register(Gauge(
+    "websocket_connections", "Open WebSocket connections by role", ("role",), callback=websocket_connections_by_role
+))
+# Running totals since the worker started, so rate() and increase() apply
+registry.register(Counter(
+    "response_cache_requests_total", "Response cache lookups by result (coalesced: waited for a concurrent miss)", ("result",), callback=response_cache_counters
+))
+registry.register(Counter(
+    "auth_throttle_requests_total", "Login/registration throttling decisions", ("limiter", "outcome"), callback=throttle_counters
+))
+# Sync endpoints and bcrypt run in the anyio threadpool; waiting tasks mean it is saturated
+threadpool_busy = registry.register(Gauge("threadpool_busy_threads", "Threadpool threads currently running sync work"))
+threadpool_waiting = registry.register(Gauge("threadpool_waiting_tasks", "Tasks queued for a threadpool thread"))
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(request: Request):
+    """Prometheus text exposition of this worker's metrics"""
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    
+    # The threadpool limiter is only reachable from the event loop, so sample it here
+    statistics = anyio.to_thread.current_default_thread_limiter().statistics()
+    threadpool_busy.set(statistics.borrowed_tokens)
+    threadpool_waiting.set(statistics.tasks_waiting)
+    
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,18 +1,30 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
+from sqlalchemy.orm import Session
+from database import get_read_db
+from directory import directory
+from etags import compute_etag, etag_matches, not_modified_response, set_etag_headers
 
 router = APIRouter()
 
 @router.get("/profile")
-def get_current_user_profile(request: Request):
+def get_current_user_profile(request: Request, response: Response, db: Session = Depends(get_read_db)):
     """Get current authenticated user profile information"""
     user = request.state.user
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
+    # The profile is the authenticated user loaded by the middleware, plus its unit from the directory
+    unit_name = directory.get_unit_name(user["unit_id"], db)
+    etag = compute_etag("profile", user["id"], user["name"], user["email"], user["role"], user["unit_id"], unit_name)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    set_etag_headers(response, etag)
+    
     return {
         "id": user["id"],
         "name": user["name"],
         "email": user["email"],
         "role": user["role"],
-        "unit_id": user["unit_id"]
+        "unit_id": user["unit_id"],
+        "unit_name": unit_name
     }
@@ -0,0 +1,173 @@
+from fastapi import APIRouter, HTTPException, Request, Depends, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field, field_validator
+from datetime import datetime
+from typing import List, Optional
+from database import get_db
+from models.leave_requests import LeaveRequestChange, WebhookDelivery, WebhookSubscription
+from webhooks import WEBHOOK_EVENT_TYPES
+import secrets
+
+router = APIRouter()
+
+class CreateWebhookSubscription(BaseModel):
+    url: str = Field(..., max_length=500)
+    event_types: List[str] = list(WEBHOOK_EVENT_TYPES)
+    max_concurrency: int = Field(2, ge=1, le=20)
+
+    @field_validator("url")
+    @classmethod
+    def check_url(cls, url: str) -> str:
+        if not url.startswith(("http://", "https://")):
+            raise ValueError("url must be http(s)")
+        return url
+
+    @field_validator("event_types")
+    @classmethod
+    def check_event_types(cls, event_types: List[str]) -> List[str]:
+        unknown = set(event_types) - set(WEBHOOK_EVENT_TYPES)
+        if unknown or not event_types:
+            raise ValueError(f"event_types must be a non-empty subset of {', '.join(WEBHOOK_EVENT_TYPES)}")
+        return event_types
+
+def require_manager(request: Request) -> dict:
+    # Access authenticated user from middleware
+    user = request.state.user
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if user["role"] != "manager":
+        raise HTTPException(status_code=403, detail="Only managers can manage webhooks")
+    return user
+
+def subscription_response(subscription: WebhookSubscription, counts: dict) -> dict:
+    return {
+        "id": subscription.id,
+        "url": subscription.url,
+        "event_types": subscription.event_types.split(","),
+        "max_concurrency": subscription.max_concurrency,
+        "active": subscription.active,
+        "created_at": subscription.created_at.isoformat() if subscription.created_at else None,
+        "pending": counts.get("pending", 0),
+        "dead": counts.get("dead", 0)
+    }
+
+def get_subscription(db: Session, subscription_id: int) -> WebhookSubscription:
+    subscription = db.get(WebhookSubscription, subscription_id)
+    if subscription is None:
+        raise HTTPException(status_code=404, detail="Webhook subscription not found")
+    return subscription
+
+@router.post("/webhooks")
+def create_webhook_subscription(request: Request, data: CreateWebhookSubscription, db: Session = Depends(get_db)):
+    """Subscribe an endpoint to leave request changes (manager only); the secret is only shown here"""
+    try:
+        user = require_manager(request)
+
+        # Deliver changes from now on, not the whole history
+        latest = db.query(func.max(LeaveRequestChange.id)).scalar() or 0
+        subscription = WebhookSubscription(
+            url=data.url,
+            secret=secrets.token_hex(32),
+            event_types=",".join(data.event_types),
+            max_concurrency=data.max_concurrency,
+            active=True,
+            last_change_id=latest,
+            created_by=user["id"]
+        )
+        db.add(subscription)
+        db.commit()
+
+        response_data = subscription_response(subscription, {})
+        response_data["secret"] = subscription.secret
+        return response_data
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to create webhook subscription: {str(e)}")
+
+@router.get("/webhooks")
+def list_webhook_subscriptions(request: Request, db: Session = Depends(get_db)):
+    """Subscriptions with their pending and dead-lettered delivery counts (manager only)"""
+    try:
+        require_manager(request)
+
+        counts = {}
+        for subscription_id, status, count in db.query(
+            WebhookDelivery.subscription_id, WebhookDelivery.status, func.count()
+        ).filter(WebhookDelivery.status != "delivered").group_by(WebhookDelivery.subscription_id, WebhookDelivery.status):
+            counts.setdefault(subscription_id, {})[status] = count
+
+        subscriptions = db.query(WebhookSubscription).order_by(WebhookSubscription.id).all()
+        return {"webhooks": [subscription_response(subscription, counts.get(subscription.id, {})) for subscription in subscriptions]}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.delete("/webhooks/{subscription_id}")
+def deactivate_webhook_subscription(subscription_id: int, request: Request, db: Session = Depends(get_db)):
+    """Stop delivering to a subscription; its delivery history is kept (manager only)"""
+    try:
+        require_manager(request)
+
+        subscription = get_subscription(db, subscription_id)
+        subscription.active = False
+        db.commit()
+        return {"message": "Webhook subscription deactivated"}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to deactivate webhook subscription: {str(e)}")
+
+@router.get("/webhooks/{subscription_id}/deliveries")
+def list_webhook_deliveries(
+    subscription_id: int,
+    request: Request,
+    status: Optional[str] = Query(None, pattern="^(pending|delivered|dead)$"),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """Latest deliveries of a subscription, e.g. ?status=dead for the dead letters (manager only)"""
+    try:
+        require_manager(request)
+        get_subscription(db, subscription_id)
+
+        query = db.query(
+            WebhookDelivery.id, WebhookDelivery.change_id, WebhookDelivery.status, WebhookDelivery.attempts,
+            WebhookDelivery.next_attempt_at, WebhookDelivery.last_error, WebhookDelivery.delivered_at, WebhookDelivery.created_at
+        ).filter(WebhookDelivery.subscription_id == subscription_id)
+        if status:
+            query = query.filter(WebhookDelivery.status == status)
+        deliveries = [row._asdict() for row in query.order_by(WebhookDelivery.id.desc()).limit(limit)]
+        return {"deliveries": deliveries, "count": len(deliveries)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.post("/webhooks/{subscription_id}/deliveries/retry")
+def retry_dead_webhook_deliveries(subscription_id: int, request: Request, db: Session = Depends(get_db)):
+    """Queue a subscription's dead-lettered deliveries again, e.g. after its endpoint is fixed (manager only)"""
+    try:
+        require_manager(request)
+        get_subscription(db, subscription_id)
+
+        requeued = db.query(WebhookDelivery).filter(
+            WebhookDelivery.subscription_id == subscription_id,
+            WebhookDelivery.status == "dead"
+        ).update({"status": "pending", "attempts": 0, "next_attempt_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        return {"requeued": requeued}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to retry webhook deliveries: {str(e)}")
@@ -1,7 +1,11 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 from websocket_manager import manager
+from logging_setup import user_id_var
 from datetime import datetime
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -15,6 +19,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str = Query(...)):
         
         if user_id is None:
             return  # Connection failed, already closed by manager
+        user_id_var.set(user_id)
         
         # Keep the connection alive and handle incoming messages
         while True:
@@ -23,6 +28,26 @@ async def websocket_endpoint(websocket: WebSocket, token: str = Query(...)):
                 data = await websocket.receive_text()
                 message = json.loads(data)
                 
+                # Refresh the connection's credentials without reconnecting
+                if message.get("type") == "authenticate":
+                    error = manager.reauthenticate(user_id, message.get("token", ""))
+                    if error:
+                        await manager.send_personal_message({
+                            "type": "error",
+                            "message": f"Authentication failed: {error}"
+                        }, user_id)
+                    else:
+                        await manager.send_personal_message({
+                            "type": "authenticated",
+                            "expires_at": manager.token_expires_at.get(user_id)
+                        }, user_id)
+                    continue
+                
+                # Connections whose token expired must re-authenticate before anything else
+                if manager.is_token_expired(user_id):
+                    await manager.close_expired(user_id)
+                    return
+                
                 # Handle different message types
                 if message.get("type") == "ping":
                     await manager.send_personal_message({
@@ -60,11 +85,11 @@ async def websocket_endpoint(websocket: WebSocket, token: str = Query(...)):
     except WebSocketDisconnect:
         if user_id:
             manager.disconnect(user_id)
-            print(f"User {user_id} disconnected")
-    except Exception as e:
+            logger.info("WebSocket disconnected")
+    except Exception:
         if user_id:
             manager.disconnect(user_id)
-        print(f"WebSocket error: {e}")
+        logger.exception("WebSocket error")
 
 @router.get("/ws/status")
 async def websocket_status():
@@ -0,0 +1,145 @@
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event
+import asyncio
+import logging
+import os
+from database import SessionLocal, ReadSessionLocal
+from models.leave_requests import User
+
+logger = logging.getLogger(__name__)
+
+# Authentication mode:
+# - "database": every request loads the user row to check it still exists and is validated
+# - "stateless": tokens carrying claims are verified against an in-memory map of token versions
+AUTH_MODE = os.getenv("AUTH_MODE", "stateless")
+TOKEN_VERSION_REFRESH_SECONDS = float(os.getenv("TOKEN_VERSION_REFRESH_SECONDS", "5"))
+
+def token_claims(user: User) -> dict:
+    """Claims embedded in access tokens, enough to authenticate without a database lookup"""
+    return {
+        "sub": user.email,
+        "user_id": user.id,
+        "name": user.name,
+        "role": user.role.value if hasattr(user.role, "value") else user.role,
+        "unit_id": user.unit_id,
+        "token_version": user.token_version or 0
+    }
+
+def lookup_with_primary_fallback(session_factory, lookup, accept=lambda result: result is not None):
+    """Run lookup(db) in a session from session_factory.
+
+    A result rejected on a replica (say, an account confirmed a moment ago)
+    is re-checked on the primary before the request is refused.
+    """
+    db = session_factory()
+    try:
+        result = lookup(db)
+        if accept(result) or not db.info.get("replica"):
+            return result
+    finally:
+        db.close()
+
+    db = SessionLocal()
+    try:
+        return lookup(db)
+    finally:
+        db.close()
+
+class TokenVersionCache:
+    """Process-wide map of validated user id -> current token version.
+
+    Reloaded in the background every TOKEN_VERSION_REFRESH_SECONDS, so changes
+    made by other workers (or directly in the database) apply within seconds.
+    Users missing from the map are looked up once on demand.
+    """
+
+    def __init__(self):
+        self.versions: Dict[int, int] = {}
+
+    def load(self, session_factory=SessionLocal):
+        """Replace the map with the token versions of all validated users"""
+        db = session_factory()
+        try:
+            rows = db.query(User.id, User.token_version).filter(User.validated == True).all()
+        finally:
+            db.close()
+        self.versions = {user_id: version or 0 for user_id, version in rows}
+
+    def current(self, user_id: int, session_factory=SessionLocal) -> Optional[int]:
+        """Current token version of a validated user, or None if the user is unknown or not validated"""
+        version = self.versions.get(user_id)
+        if version is not None:
+            return version
+
+        row = lookup_with_primary_fallback(
+            session_factory,
+            lambda db: db.query(User.token_version).filter(User.id == user_id, User.validated == True).first()
+        )
+        if row is None:
+            return None
+        self.versions[user_id] = row[0] or 0
+        return self.versions[user_id]
+
+    def invalidate(self, user_id: int):
+        """Forget a user so the next request re-reads its token version"""
+        self.versions.pop(user_id, None)
+
+    def clear(self):
+        self.versions = {}
+
+    async def run(self):
+        """Background refresh loop, started on application startup in stateless mode"""
+        while True:
+            try:
+                await asyncio.to_thread(self.load)
+            except Exception as e:
+                logger.exception("Error refreshing token versions")
+            await asyncio.sleep(TOKEN_VERSION_REFRESH_SECONDS)
+
+# Global token version cache instance
+token_versions = TokenVersionCache()
+
+def authenticate_payload(payload: dict, session_factory=ReadSessionLocal, mode: str = AUTH_MODE) -> Tuple[Optional[dict], Optional[str]]:
+    """Resolve a decoded JWT payload to the authenticated user dict.
+
+    Returns (user, None) on success or (None, error detail) otherwise. Tokens
+    issued before claims were added always take the database path.
+    """
+    user_id = payload.get("user_id")
+    email = payload.get("sub")
+
+    if mode == "stateless" and "token_version" in payload:
+        current_version = token_versions.current(user_id, session_factory)
+        if current_version is None:
+            return None, "User not found or not validated"
+        if payload["token_version"] != current_version:
+            return None, "Token has been revoked"
+        return {
+            "id": user_id,
+            "email": email,
+            "name": payload.get("name"),
+            "role": payload.get("role"),
+            "unit_id": payload.get("unit_id")
+        }, None
+
+    user = lookup_with_primary_fallback(
+        session_factory,
+        lambda db: db.query(User).filter(User.id == user_id, User.email == email).first(),
+        accept=lambda user: user is not None and user.validated
+    )
+    if not user:
+        return None, "User not found"
+    if not user.validated:
+        return None, "Account not validated"
+    return {
+        "id": user.id,
+        "email": user.email,
+        "name": user.name,
+        "role": user.role,
+        "unit_id": user.unit_id
+    }, None
+
+@event.listens_for(User, "after_update")
+def forget_updated_user(mapper, connection, target):
+    """Drop the cached version as soon as this process changes a user"""
+    token_versions.invalidate(target.id)
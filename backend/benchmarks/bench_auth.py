@@ -0,0 +1,79 @@
+"""Authentication path benchmark: database lookup vs stateless claims.
+
+Serves GET /profile through AuthMiddleware in both modes and reports
+requests/sec. Uses a throwaway SQLite file by default; point --database-url
+at MySQL to include real network round trips in the database mode.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_auth --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from api.authentication import create_access_token
+from api.profile import router as profile_router
+from auth_tokens import token_claims, token_versions
+from middleware.auth import AuthMiddleware
+from models.leave_requests import Base, User
+
+def build_app(mode: str, session_factory) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(AuthMiddleware, session_factory=session_factory, mode=mode)
+    app.include_router(profile_router)
+    return app
+
+async def run(app: FastAPI, headers: dict, count: int) -> float:
+    """Return requests/sec over count sequential in-process requests"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(50):
+            await client.get("/profile", headers=headers)
+        started = time.perf_counter()
+        for _ in range(count):
+            response = await client.get("/profile", headers=headers)
+            assert response.status_code == 200, response.text
+        return count / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        path = os.path.join(tempfile.mkdtemp(), "bench_auth.db")
+        database_url = f"sqlite:///{path}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+
+    db = session_factory()
+    user = db.query(User).filter(User.email == "bench-auth@example.com").first()
+    if not user:
+        user = User(name="Bench User", email="bench-auth@example.com", role="user", validated=True)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+    headers = {"Authorization": f"Bearer {create_access_token(data=token_claims(user))}"}
+    db.close()
+
+    token_versions.clear()
+    results = {
+        "database": asyncio.run(run(build_app("database", session_factory), headers, args.requests)),
+        "stateless": asyncio.run(run(build_app("stateless", session_factory), headers, args.requests))
+    }
+    print(f"GET /profile, {args.requests} requests, {engine.dialect.name}")
+    for mode, rps in results.items():
+        print(f"  {mode:10} {rps:8.0f} req/s  x{rps / results['database']:4.2f}")
+
+if __name__ == "__main__":
+    main()
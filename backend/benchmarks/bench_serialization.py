@@ -0,0 +1,121 @@
+"""Serialization benchmark for GET /leave_requests responses.
+
+Compares the previous hand-built dict + jsonable_encoder path against the
+orjson path, with users inline and in a side table, on synthetic rows.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_serialization --rows 10000 --users 500
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from api.leave_requests import LEAVE_REQUEST_FIELDS, USER_FIELDS
+from models.leave_requests import RequestTypeEnum, StatusEnum
+
+def make_rows(count: int, user_count: int, seed: int = 42) -> list:
+    """Build tuples shaped like the full-column list query result"""
+    rng = random.Random(seed)
+    users = [(f"User {i}", f"user{i}@example.com") for i in range(user_count)]
+    base = datetime(2025, 1, 1, 9, 0, 0)
+    rows = []
+    for i in range(count):
+        user_id = rng.randrange(user_count)
+        name, email = users[user_id]
+        created = base + timedelta(minutes=rng.randrange(500000), microseconds=rng.randrange(1000000))
+        reviewed = rng.random() < 0.7
+        if rng.random() < 0.6:
+            start = created.date() + timedelta(days=rng.randrange(1, 60))
+            dates = (RequestTypeEnum.timeoff, start, start + timedelta(days=rng.randrange(1, 10)), None, None)
+        else:
+            start = created + timedelta(days=rng.randrange(1, 60))
+            dates = (RequestTypeEnum.permission, None, None, start, start + timedelta(hours=rng.randrange(1, 5)))
+        rows.append((
+            i + 1, user_id + 1, name, email, *dates,
+            "Family reasons" if rng.random() < 0.5 else None,
+            rng.choice([StatusEnum.approved, StatusEnum.rejected]) if reviewed else StatusEnum.pending,
+            1 if reviewed else None,
+            created + timedelta(days=1) if reviewed else None,
+            created,
+            created + timedelta(days=1) if reviewed else created
+        ))
+    return rows
+
+def legacy_payload(rows: list) -> bytes:
+    """Previous path: per-row dict with isoformat() calls, then jsonable_encoder + json.dumps"""
+    result = []
+    for (id, user_id, user_name, user_email, request_type, start_date, end_date, start_datetime,
+         end_datetime, reason, status, reviewed_by, reviewed_at, created_at, updated_at) in rows:
+        result.append({
+            "id": id,
+            "user_id": user_id,
+            "user_name": user_name,
+            "user_email": user_email,
+            "request_type": request_type,
+            "start_date": start_date.isoformat() if start_date else None,
+            "end_date": end_date.isoformat() if end_date else None,
+            "start_datetime": start_datetime.isoformat() if start_datetime else None,
+            "end_datetime": end_datetime.isoformat() if end_datetime else None,
+            "reason": reason,
+            "status": status,
+            "reviewed_by": reviewed_by,
+            "reviewed_at": reviewed_at.isoformat() if reviewed_at else None,
+            "created_at": created_at.isoformat() if created_at else None,
+            "updated_at": updated_at.isoformat() if updated_at else None
+        })
+    content = jsonable_encoder({"leave_requests": result, "count": len(result)})
+    # Same settings as starlette's JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def orjson_payload(rows: list) -> bytes:
+    """New inline path: zip the selected columns and let orjson encode them"""
+    names = list(LEAVE_REQUEST_FIELDS)
+    result = [dict(zip(names, row)) for row in rows]
+    return orjson.dumps({"leave_requests": result, "count": len(result)}, option=orjson.OPT_NON_STR_KEYS)
+
+def orjson_table_payload(rows: list) -> bytes:
+    """New side table path: rows without user columns plus one users map"""
+    names = [name for name in LEAVE_REQUEST_FIELDS if name not in USER_FIELDS]
+    result = []
+    users = {}
+    for row in rows:
+        users[row[1]] = {"name": row[2], "email": row[3]}
+        result.append(dict(zip(names, row[:2] + row[4:])))
+    return orjson.dumps({"leave_requests": result, "count": len(result), "users": users}, option=orjson.OPT_NON_STR_KEYS)
+
+def measure(fn, rows: list, repeat: int) -> tuple:
+    """Return (best seconds, payload size) over repeat runs"""
+    best = float("inf")
+    payload = b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        payload = fn(rows)
+        best = min(best, time.perf_counter() - started)
+    return best, len(payload)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, args.users)
+    results = {
+        "legacy (dict + jsonable_encoder)": measure(legacy_payload, rows, args.repeat),
+        "orjson, users inline": measure(orjson_payload, rows, args.repeat),
+        "orjson, users table": measure(orjson_table_payload, rows, args.repeat)
+    }
+
+    baseline = results["legacy (dict + jsonable_encoder)"][0]
+    print(f"{args.rows} rows, {args.users} users, best of {args.repeat}")
+    for label, (seconds, size) in results.items():
+        print(f"  {label:34} {seconds * 1000:8.1f} ms  {size / 1024:8.1f} KiB  x{baseline / seconds:5.1f}")
+
+if __name__ == "__main__":
+    main()
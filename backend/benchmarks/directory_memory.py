@@ -0,0 +1,41 @@
+"""Memory used by the user directory, measured with tracemalloc.
+
+Fills a Directory with generated users (the same names and emails as
+benchmarks.generate_data) and reports the allocated bytes per 10k users.
+
+Usage (from the backend directory):
+    python -m benchmarks.directory_memory --users 100000
+"""
+import argparse
+import random
+import tracemalloc
+from datetime import datetime
+from benchmarks.generate_data import generate_users
+from directory import Directory, DirectoryUser
+
+def measure(users: int, seed: int = 42) -> int:
+    """Bytes allocated by a directory holding `users` users"""
+    rows = generate_users(random.Random(seed), users, max(1, users // 250), datetime(2025, 1, 1), 3)
+    tracemalloc.start()
+    started = tracemalloc.get_traced_memory()[0]
+    directory = Directory()
+    # Names and emails decoded afresh, as a database driver hands them over
+    directory.users = {
+        row[0]: DirectoryUser(row[1].encode().decode(), row[2].encode().decode(), row[5], row[6])
+        for row in rows
+    }
+    used = tracemalloc.get_traced_memory()[0] - started
+    tracemalloc.stop()
+    return used
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    used = measure(args.users, args.seed)
+    print(f"{args.users} users: {used / 1024 / 1024:.2f} MiB, {used / args.users * 10000 / 1024 / 1024:.2f} MiB per 10k users")
+
+if __name__ == "__main__":
+    main()
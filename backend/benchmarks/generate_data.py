@@ -0,0 +1,324 @@
+"""Synthetic data generator for load testing.
+
+Generates units, users and leave requests with realistic distributions:
+uneven unit sizes, a few managers per unit, some Google and unvalidated
+accounts, busy and quiet requesters, summer/Christmas seasonality for
+timeoff, working-hours permissions, lead times, approval ratios depending
+on whether the leave is past or upcoming, and reviewers from the
+requester's unit. Output is deterministic for a given --seed.
+
+All local accounts share the password "password" through one precomputed
+bcrypt hash. Rows go in through multi-row INSERTs (DBAPI executemany, which
+PyMySQL batches into multi-row statements), or LOAD DATA LOCAL INFILE on
+MySQL with --method load-data.
+
+Usage (from the backend directory):
+    python -m benchmarks.generate_data --database-url sqlite:///load.db --users 5000 --leave-requests 1000000
+    python -m benchmarks.generate_data --database-url mysql+pymysql://... --method load-data --reset
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+
+# bcrypt hash of "password", as for the admin account in data/migrations
+PASSWORD_HASH = "$2b$12$iDrs7S9nqjA0d/zeocrMLe0RIrY8utFgGxJZ1w1p7PN7HlUZQ31aO"
+
+FIRST_NAMES = (
+    "Marco", "Giulia", "Luca", "Francesca", "Alessandro", "Chiara", "Matteo", "Sara", "Andrea", "Elena",
+    "James", "Emma", "Oliver", "Sophie", "Daniel", "Laura", "Thomas", "Anna", "Paolo", "Martina",
+    "David", "Maria", "Stefano", "Valentina", "Michael", "Alice", "Roberto", "Federica", "Simone", "Giorgia"
+)
+LAST_NAMES = (
+    "Rossi", "Russo", "Ferrari", "Esposito", "Bianchi", "Romano", "Colombo", "Ricci", "Marino", "Greco",
+    "Smith", "Johnson", "Brown", "Taylor", "Wilson", "Davies", "Evans", "Walker", "Bruno", "Gallo",
+    "Conti", "De Luca", "Costa", "Giordano", "Mancini", "Rizzo", "Lombardi", "Moretti", "Barbieri", "Fontana"
+)
+DEPARTMENTS = ("Engineering", "Sales", "Marketing", "Finance", "Operations", "Support", "HR", "Legal", "Logistics", "Research")
+
+TIMEOFF_REASONS = ("Vacation", "Summer holidays", "Christmas holidays", "Family reasons", "Wedding", "Moving house", "Trip abroad")
+PERMISSION_REASONS = ("Medical appointment", "Dentist", "Bank appointment", "School meeting", "Personal errand", "Car service")
+
+# Relative chance of a timeoff starting in each month (January first): peaks in August and December
+MONTH_WEIGHTS = (5, 4, 5, 6, 6, 8, 14, 16, 7, 6, 6, 17)
+# Working days of a timeoff and how common each length is
+TIMEOFF_DAYS = (1, 2, 3, 5, 10, 15)
+TIMEOFF_DAYS_WEIGHTS = (34, 18, 14, 20, 10, 4)
+
+UNIT_COLUMNS = ("id", "name")
+USER_COLUMNS = (
+    "id", "name", "email", "password_hash", "auth_provider", "role", "unit_id",
+    "validated", "token_version", "created_at", "updated_at"
+)
+LEAVE_REQUEST_COLUMNS = (
+    "id", "user_id", "request_type", "start_date", "end_date", "start_datetime", "end_datetime",
+    "reason", "status", "reviewed_by", "reviewed_at", "created_at", "updated_at", "starts_at", "ends_at"
+)
+
+def generate_units(rng: random.Random, count: int) -> list:
+    return [(i, f"{DEPARTMENTS[(i - 1) % len(DEPARTMENTS)]} {(i - 1) // len(DEPARTMENTS) + 1}") for i in range(1, count + 1)]
+
+def generate_users(rng: random.Random, count: int, unit_count: int, now: datetime, years: int) -> list:
+    """Users with uneven unit sizes; the first user of each unit and ~3% of the rest are managers"""
+    unit_weights = [rng.uniform(0.5, 3.0) for _ in range(unit_count)]
+    unit_ids = rng.choices(range(1, unit_count + 1), weights=unit_weights, k=count)
+    rows = []
+    for i in range(1, count + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        unit_id = i if i <= unit_count else unit_ids[i - 1]
+        google = rng.random() < 0.15
+        created = now - timedelta(days=rng.randrange(years * 365), seconds=rng.randrange(86400))
+        rows.append((
+            i,
+            f"{first} {last}",
+            f"{first}.{last}.{i}@example.com".lower().replace(" ", ""),
+            None if google else PASSWORD_HASH,
+            "google" if google else "local",
+            "manager" if i <= unit_count or rng.random() < 0.03 else "user",
+            unit_id,
+            rng.random() < 0.97,
+            0,
+            created,
+            created
+        ))
+    return rows
+
+def next_weekday(day: date) -> date:
+    weekday = day.weekday()
+    return day + timedelta(days=7 - weekday) if weekday >= 5 else day
+
+def generate_leave_requests(rng: random.Random, count: int, users: list, now: datetime, years: int, first_id: int = 1):
+    """Yield leave request rows; requests cover `years` back and six months ahead of now"""
+    requesters = [row for row in users if row[7]]
+    # Log-normal activity: a few people file many requests, most file a handful
+    activity = [rng.lognormvariate(0, 0.8) for _ in requesters]
+    cumulative = []
+    total = 0.0
+    for weight in activity:
+        total += weight
+        cumulative.append(total)
+
+    managers_by_unit = {}
+    for row in users:
+        if row[5] == "manager" and row[7]:
+            managers_by_unit.setdefault(row[6], []).append(row[0])
+    all_managers = [manager_id for ids in managers_by_unit.values() for manager_id in ids]
+
+    first_year = now.year - years + 1
+    last_day = (now + timedelta(days=182)).date()
+    span_days = (last_day - date(first_year, 1, 1)).days
+    months = list(range(1, 13))
+
+    for offset in range(count):
+        user = requesters[min(len(requesters) - 1, bisect_left(cumulative, rng.random() * total))]
+        user_id, unit_id = user[0], user[6]
+
+        if rng.random() < 0.65:
+            request_type = "timeoff"
+            year = rng.randint(first_year, last_day.year)
+            month = rng.choices(months, weights=MONTH_WEIGHTS)[0]
+            start = next_weekday(date(year, month, rng.randint(1, 28)))
+            if start > last_day:
+                start = next_weekday(date(first_year, month, rng.randint(1, 28)))
+            days = rng.choices(TIMEOFF_DAYS, weights=TIMEOFF_DAYS_WEIGHTS)[0]
+            # Working days to calendar days: every full week adds a weekend
+            end = start + timedelta(days=days + 2 * ((start.weekday() + days - 1) // 5))
+            start_date, end_date, start_datetime, end_datetime = start, end, None, None
+            starts = datetime(start.year, start.month, start.day, 9)
+            reason = rng.choice(TIMEOFF_REASONS)
+        else:
+            request_type = "permission"
+            day = next_weekday(date(first_year, 1, 1) + timedelta(days=rng.randrange(span_days)))
+            starts = datetime(day.year, day.month, day.day, rng.randint(8, 16), rng.choice((0, 15, 30, 45)))
+            start_date, end_date = None, None
+            start_datetime, end_datetime = starts, starts + timedelta(hours=rng.randint(1, 4))
+            reason = rng.choice(PERMISSION_REASONS)
+
+        # Most requests are filed one to four weeks ahead, a few months or hours ahead
+        lead = timedelta(hours=min(24 * 120, max(2.0, rng.expovariate(1 / (24 * 14)))))
+        created = starts - lead
+        if created > now:
+            created = now - timedelta(seconds=rng.randrange(7 * 86400))
+
+        roll = rng.random()
+        if starts > now:
+            status = "pending" if roll < 0.45 else "approved" if roll < 0.95 else "rejected"
+        else:
+            status = "approved" if roll < 0.85 else "rejected" if roll < 0.95 else "pending"
+
+        if status == "pending":
+            reviewed_by, reviewed_at = None, None
+        else:
+            reviewers = managers_by_unit.get(unit_id) or all_managers
+            reviewed_by = rng.choice(reviewers)
+            reviewed_at = min(now, created + timedelta(minutes=rng.randint(30, 3 * 24 * 60)))
+
+        # Same interval the model derives on write: timeoff runs until the start of end_date
+        if request_type == "timeoff":
+            starts_at, ends_at = datetime.combine(start_date, datetime.min.time()), datetime.combine(end_date, datetime.min.time())
+        else:
+            starts_at, ends_at = start_datetime, end_datetime
+
+        yield (
+            first_id + offset, user_id, request_type, start_date, end_date, start_datetime, end_datetime,
+            reason if rng.random() < 0.7 else None, status, reviewed_by, reviewed_at,
+            created, reviewed_at or created, starts_at, ends_at
+        )
+
+def batched(rows, size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def prepare_connection(engine, cursor):
+    """Relax durability and constraint checks for the bulk load session"""
+    if engine.dialect.name == "sqlite":
+        cursor.execute("PRAGMA synchronous = OFF")
+        cursor.execute("PRAGMA journal_mode = MEMORY")
+    elif engine.dialect.name == "mysql":
+        cursor.execute("SET foreign_key_checks = 0")
+        cursor.execute("SET unique_checks = 0")
+
+def insert_rows(engine, table: str, columns: tuple, rows, batch_size: int) -> int:
+    """Insert rows with DBAPI executemany in batches; PyMySQL rewrites these into multi-row INSERTs"""
+    marker = "?" if engine.dialect.paramstyle == "qmark" else "%s"
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([marker] * len(columns))})"
+    inserted = 0
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        prepare_connection(engine, cursor)
+        for batch in batched(rows, batch_size):
+            cursor.executemany(sql, batch)
+            inserted += len(batch)
+        connection.commit()
+    finally:
+        connection.close()
+    return inserted
+
+def tsv_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if value is True or value is False:
+        return "1" if value else "0"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+def load_data_rows(engine, table: str, columns: tuple, rows, batch_size: int) -> int:
+    """Write rows to a temporary TSV file and LOAD DATA LOCAL INFILE it (MySQL only)"""
+    inserted = 0
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        prepare_connection(engine, cursor)
+        for batch in batched(rows, batch_size):
+            with tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False, encoding="utf-8") as f:
+                for row in batch:
+                    f.write("\t".join(tsv_value(value) for value in row) + "\n")
+                path = f.name
+            try:
+                cursor.execute(
+                    f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE {table} "
+                    f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({', '.join(columns)})"
+                )
+            finally:
+                os.unlink(path)
+            inserted += len(batch)
+        connection.commit()
+    finally:
+        connection.close()
+    return inserted
+
+def generate(engine, units: int, users: int, leave_requests: int, seed: int = 42, years: int = 3,
+             method: str = "insert", batch_size: int = 10000, reset: bool = False, verbose: bool = True,
+             now: datetime = None) -> dict:
+    """Generate the dataset into engine's database; refuses to mix with existing rows unless reset.
+
+    Dates are relative to now (default: today at midnight), so the same seed
+    and now give identical rows.
+    """
+    from sqlalchemy import text
+    from models.leave_requests import Base
+
+    if reset:
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    if not reset:
+        with engine.connect() as conn:
+            if conn.execute(text("SELECT COUNT(*) FROM users")).scalar():
+                raise RuntimeError("The database already contains users; pass reset=True (--reset) to replace them")
+
+    load = load_data_rows if method == "load-data" else insert_rows
+    rng = random.Random(seed)
+    now = now or datetime.combine(date.today(), datetime.min.time())
+    counts = {}
+
+    started = time.perf_counter()
+    counts["units"] = load(engine, "units", UNIT_COLUMNS, generate_units(rng, units), batch_size)
+    user_rows = generate_users(rng, users, units, now, years)
+    counts["users"] = load(engine, "users", USER_COLUMNS, user_rows, batch_size)
+
+    def progress(rows):
+        for index, row in enumerate(rows, 1):
+            if verbose and index % 100000 == 0:
+                elapsed = time.perf_counter() - started
+                print(f"  {index} leave requests ({index / elapsed:.0f} rows/s)")
+            yield row
+
+    counts["leave_requests"] = load(
+        engine, "leave_requests", LEAVE_REQUEST_COLUMNS,
+        progress(generate_leave_requests(rng, leave_requests, user_rows, now, years)),
+        batch_size
+    )
+    counts["seconds"] = round(time.perf_counter() - started, 1)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="Defaults to $DATABASE_URL")
+    parser.add_argument("--units", type=int, default=20)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--leave-requests", type=int, default=1000000)
+    parser.add_argument("--years", type=int, default=3, help="Years of history before the six upcoming months")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--method", choices=("insert", "load-data"), default="insert")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate all tables first")
+    parser.add_argument("--now", type=date.fromisoformat, default=None, help="Date the data is relative to (default: today)")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+    if args.units > args.users:
+        parser.error("--units cannot exceed --users: every unit gets a manager")
+
+    from sqlalchemy import create_engine
+    connect_args = {"local_infile": True} if args.method == "load-data" else {}
+    engine = create_engine(args.database_url, connect_args=connect_args)
+    if args.method == "load-data" and engine.dialect.name != "mysql":
+        parser.error("--method load-data requires MySQL")
+
+    try:
+        counts = generate(
+            engine, args.units, args.users, args.leave_requests, args.seed, args.years,
+            args.method, args.batch_size, args.reset,
+            now=datetime.combine(args.now, datetime.min.time()) if args.now else None
+        )
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    print(f"Generated {counts['units']} units, {counts['users']} users and {counts['leave_requests']} leave requests in {counts['seconds']}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Cold start report: what building the app imports, and how long a fresh
+server takes to answer its first request.
+
+Runs `python -X importtime` in a fresh interpreter, so the numbers don't
+depend on what the calling process already imported.
+
+Usage (from the backend directory):
+    python -m benchmarks.import_time                  # slowest imports of `main.app`
+    python -m benchmarks.import_time --top 30 --statement "import api.leave_requests"
+    python -m benchmarks.import_time --serve          # also time uvicorn's first response
+
+Exits with status 1 when the statement imports any of DEFERRED_MODULES.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Building the app must not import these; they load on first use (the profiler with PROFILING_SECRET)
+DEFERRED_MODULES = ("requests", "pymysql", "profiling")
+
+def import_times(statement: str = "import main; main.app", env: dict = None) -> list:
+    """[(module, self µs, cumulative µs)] for every module the statement imports, in import order"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{statement!r} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+def deferred_imports(entries: list, deferred=DEFERRED_MODULES) -> list:
+    """The deferred modules (or their submodules) present in an import_times() result"""
+    imported = {name for name, _, _ in entries}
+    return [module for module in deferred if any(name == module or name.startswith(module + ".") for name in imported)]
+
+def format_report(entries: list, top: int = 15) -> str:
+    total = sum(self_us for _, self_us, _ in entries)
+    lines = [f"{len(entries)} modules, {total / 1000:.1f} ms total", f"  {'self ms':>8} {'cumul ms':>9}  module"]
+    for name, self_us, cumulative_us in sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]:
+        lines.append(f"  {self_us / 1000:8.1f} {cumulative_us / 1000:9.1f}  {name}")
+    return "\n".join(lines)
+
+def time_to_first_response(path: str = "/health", timeout: float = 30.0, env: dict = None) -> float:
+    """Seconds from launching uvicorn until it answers path"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1):
+                    return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError(f"No response from {path} within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--statement", default="import main; main.app", help="Code to run under -X importtime")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list, by self time")
+    parser.add_argument("--serve", action="store_true", help="Also time a fresh uvicorn's first /health response")
+    parser.add_argument("--runs", type=int, default=5, help="Server launches to take the median of with --serve")
+    args = parser.parse_args()
+
+    entries = import_times(args.statement)
+    print(format_report(entries, args.top))
+
+    if args.serve:
+        timings = sorted(time_to_first_response() for _ in range(args.runs))
+        print(f"Time to first response: {timings[len(timings) // 2] * 1000:.0f} ms (median of {args.runs})")
+
+    deferred = deferred_imports(entries)
+    if deferred:
+        print(f"Imported modules that should load on first use: {', '.join(deferred)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
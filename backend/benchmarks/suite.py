@@ -0,0 +1,296 @@
+"""Benchmark suite for the API hot paths.
+
+Seeds a dataset with benchmarks.generate_data into a local database (once;
+reused on later runs), then drives the full application in-process over
+httpx's ASGI transport and records throughput and latency percentiles per
+scenario to JSON:
+
+    login, profile, manager_list, user_list, create, status_update, notification_fanout
+
+Fake manager WebSocket connections stay registered for the whole run;
+notification_fanout measures pushing one notification to all of them.
+
+Usage (from the backend directory):
+    python -m benchmarks.suite run --users 5000 --leave-requests 1000000 --output results.json
+    python -m benchmarks.suite run --baseline baseline.json
+    python -m benchmarks.suite compare baseline.json results.json --threshold 0.15
+
+compare (and run --baseline) exits with status 1 when a scenario's throughput
+drops, or its p90 latency grows, by more than the threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+SCENARIOS = ("login", "profile", "manager_list", "user_list", "create", "status_update", "notification_fanout")
+
+# Share of --requests run by the slow scenarios: every login is a bcrypt verify,
+# and every manager list returns the whole table
+REQUEST_SHARE = {"login": 0.25, "manager_list": 0.05}
+
+# Password of every generated local account
+BENCH_PASSWORD = "password"
+
+def configure_environment(database_url: str):
+    """Point the application at the benchmark database; must run before importing it"""
+    os.environ["DATABASE_URL"] = database_url
+    # Throttling would reject the repeated logins of the login scenario
+    for name in ("LOGIN_IP_LIMIT", "LOGIN_EMAIL_LIMIT", "REGISTER_IP_LIMIT", "REGISTER_EMAIL_LIMIT"):
+        os.environ[name] = "1000000000/1"
+
+class FakeWebSocket:
+    """Stands in for a browser connection; sending only costs the serialization"""
+
+    async def send_text(self, text: str):
+        pass
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(latencies: list, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "throughput": round(len(ordered) / elapsed, 2),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p90_ms": round(percentile(ordered, 0.90) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3)
+    }
+
+async def measure(calls: list, concurrency: int) -> dict:
+    """Run the zero-argument coroutine functions with bounded concurrency and time each one"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed_call(call):
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed_call(call) for call in calls))
+    return summarize(latencies, time.perf_counter() - started)
+
+def expect(response, status_code: int = 200):
+    if response.status_code != status_code:
+        raise RuntimeError(f"{response.request.method} {response.request.url.path}: {response.status_code} {response.text[:200]}")
+
+async def run_scenarios(args, session_factory) -> dict:
+    import httpx
+    from main import app
+    from api.authentication import create_access_token
+    from auth_tokens import token_claims
+    from models.leave_requests import User, LeaveRequest, StatusEnum
+    from websocket_manager import manager
+
+    rng = random.Random(args.seed)
+    db = session_factory()
+    try:
+        managers = db.query(User).filter(User.role == "manager", User.validated == True).limit(100).all()
+        users = db.query(User).filter(User.role == "user", User.validated == True).limit(1000).all()
+        manager_headers = [{"Authorization": f"Bearer {create_access_token(token_claims(user))}"} for user in managers]
+        user_headers = [{"Authorization": f"Bearer {create_access_token(token_claims(user))}"} for user in users]
+        user_emails = [user.email for user in users if user.auth_provider == "local"]
+        pending_ids = [
+            row[0] for row in db.query(LeaveRequest.id)
+            .filter(LeaveRequest.status == StatusEnum.pending)
+            .order_by(LeaveRequest.id.desc())
+            .limit(args.requests)
+        ]
+    finally:
+        db.close()
+
+    for i in range(args.connections):
+        connection_id = -(i + 1)
+        manager.active_connections[connection_id] = FakeWebSocket()
+        manager.user_info[connection_id] = {"name": f"Bench Manager {i}", "email": f"bench-ws-{i}@example.com", "role": "manager"}
+
+    def count(name: str) -> int:
+        return max(2, int(args.requests * REQUEST_SHARE.get(name, 1)))
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login():
+            response = await client.post("/login", json={"email": rng.choice(user_emails), "password": BENCH_PASSWORD})
+            expect(response)
+
+        async def profile():
+            expect(await client.get("/profile", headers=rng.choice(user_headers)))
+
+        async def manager_list():
+            expect(await client.get("/leave_requests", headers=rng.choice(manager_headers)))
+
+        async def user_list():
+            expect(await client.get("/leave_requests", headers=rng.choice(user_headers)))
+
+        async def create():
+            start = date.today() + timedelta(days=rng.randrange(1, 365))
+            response = await client.post("/leave_requests", headers=rng.choice(user_headers), json={
+                "request_type": "timeoff",
+                "start_date": start.isoformat(),
+                "end_date": (start + timedelta(days=rng.randrange(1, 10))).isoformat(),
+                "reason": "Bench request"
+            })
+            expect(response)
+
+        pending = iter(pending_ids)
+
+        async def status_update():
+            response = await client.put(
+                f"/leave_requests/{next(pending)}/status",
+                headers=rng.choice(manager_headers),
+                json={"status": rng.choice(("approved", "rejected"))}
+            )
+            expect(response)
+
+        notification = {
+            "type": "new_leave_request",
+            "data": {"request_id": 1, "user_name": "Bench User", "request_type": "timeoff", "timestamp": datetime.utcnow().isoformat()}
+        }
+
+        async def notification_fanout():
+            await manager.broadcast_to_managers(notification)
+
+        scenarios = {
+            "login": login,
+            "profile": profile,
+            "manager_list": manager_list,
+            "user_list": user_list,
+            "create": create,
+            "status_update": status_update,
+            "notification_fanout": notification_fanout
+        }
+        for name in args.scenarios:
+            calls = [scenarios[name]] * count(name)
+            if name == "status_update":
+                calls = calls[:len(pending_ids)]
+            # Warm-up pass, so the first measured requests don't pay for lazy imports and caches
+            if name not in ("status_update", "login"):
+                await measure(calls[:min(10, len(calls))], args.concurrency)
+            results[name] = await measure(calls, args.concurrency)
+            print(f"  {name:20} {results[name]['throughput']:9.1f} req/s  p50 {results[name]['p50_ms']:8.2f} ms  p90 {results[name]['p90_ms']:8.2f} ms  p99 {results[name]['p99_ms']:8.2f} ms")
+
+    for i in range(args.connections):
+        manager.disconnect(-(i + 1))
+    return results
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Return a description of each scenario that regressed beyond threshold"""
+    regressions = []
+    for name, before in baseline["results"].items():
+        after = current["results"].get(name)
+        if after is None:
+            continue
+        if after["throughput"] < before["throughput"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput']} -> {after['throughput']} req/s")
+        if after["p90_ms"] > before["p90_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p90 {before['p90_ms']} -> {after['p90_ms']} ms")
+    return regressions
+
+def report_comparison(baseline: dict, current: dict, threshold: float) -> int:
+    regressions = compare(baseline, current, threshold)
+    if regressions:
+        print(f"Regressions beyond {threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"No regressions beyond {threshold:.0%}")
+    return 0
+
+def run(args) -> int:
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'timeoff_bench.db')}"
+    configure_environment(database_url)
+
+    from sqlalchemy import func
+    from benchmarks.generate_data import generate
+    from database import engine, SessionLocal
+    from models.leave_requests import User, LeaveRequest
+
+    db = SessionLocal()
+    try:
+        seeded = (db.query(func.count(User.id)).scalar(), db.query(func.count(LeaveRequest.id)).scalar())
+    except Exception:
+        seeded = (0, 0)
+    finally:
+        db.close()
+
+    if args.reseed or seeded[0] < args.users or seeded[1] < args.leave_requests:
+        print(f"Seeding {args.users} users and {args.leave_requests} leave requests into {engine.dialect.name}...")
+        started = time.perf_counter()
+        generate(engine, max(1, args.users // 250), args.users, args.leave_requests, args.seed, reset=True, verbose=False)
+        print(f"  seeded in {time.perf_counter() - started:.1f}s")
+
+    print(f"Running {', '.join(args.scenarios)} at concurrency {args.concurrency}")
+    results = asyncio.run(run_scenarios(args, SessionLocal))
+
+    current = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "database": engine.dialect.name,
+            "python": platform.python_version(),
+            "users": args.users,
+            "leave_requests": args.leave_requests,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "connections": args.connections,
+            "seed": args.seed
+        },
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            return report_comparison(json.load(f), current, args.threshold)
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Seed if needed, run the scenarios and write results")
+    run_parser.add_argument("--database-url", default=None, help="Defaults to a SQLite file in the temp directory")
+    run_parser.add_argument("--users", type=int, default=5000)
+    run_parser.add_argument("--leave-requests", type=int, default=100000)
+    run_parser.add_argument("--reseed", action="store_true", help="Drop and re-seed even if the dataset is present")
+    run_parser.add_argument("--requests", type=int, default=200, help="Requests per scenario (login and manager_list run fewer)")
+    run_parser.add_argument("--concurrency", type=int, default=10)
+    run_parser.add_argument("--connections", type=int, default=100, help="Fake manager WebSocket connections")
+    run_parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--output", default="benchmark-results.json")
+    run_parser.add_argument("--baseline", default=None, help="Compare against this results file after the run")
+    run_parser.add_argument("--threshold", type=float, default=0.15)
+
+    compare_parser = commands.add_parser("compare", help="Compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.15)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(run(args))
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    sys.exit(report_comparison(baseline, current, args.threshold))
+
+if __name__ == "__main__":
+    main()
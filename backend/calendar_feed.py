@@ -0,0 +1,120 @@
+"""iCalendar (.ics) feeds of approved leave, per user and per unit.
+
+Calendar apps poll feeds every few minutes, so a feed is rendered once per
+change: the body is kept in the response cache under the scope of the
+leave request list it is drawn from (a user's own list, or the shared
+manager list for a unit), so the writes that invalidate those lists
+invalidate the feeds too. Feed URLs carry
+a secret token instead of a bearer header; token checks are cached in
+process for CALENDAR_TOKEN_CACHE_SECONDS, which is also how long a revoked
+token may keep working on other workers.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+import hashlib
+import os
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from models.leave_requests import CalendarFeedToken
+
+CALENDAR_TOKEN_CACHE_SECONDS = float(os.getenv("CALENDAR_TOKEN_CACHE_SECONDS", "60"))
+# Suggested poll interval for clients that honour it (RFC 7986 REFRESH-INTERVAL)
+CALENDAR_REFRESH_INTERVAL = os.getenv("CALENDAR_REFRESH_INTERVAL", "PT15M")
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class FeedTokenCache:
+    """Recently checked feed tokens (valid or not), keyed by their hash"""
+
+    def __init__(self, ttl: float = CALENDAR_TOKEN_CACHE_SECONDS):
+        self.ttl = ttl
+        self.entries: Dict[str, Tuple[Optional[Tuple[str, int]], float]] = {}
+        self.lock = threading.Lock()
+
+    def check(self, kind: str, subject_id: int, token: str, db: Session) -> bool:
+        """Whether token opens the given feed; at most one primary key lookup per TTL"""
+        token_hash = hash_token(token)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(token_hash)
+        if entry is None or entry[1] <= now:
+            row = db.query(CalendarFeedToken.kind, CalendarFeedToken.subject_id).filter(
+                CalendarFeedToken.token_hash == token_hash
+            ).first()
+            entry = (tuple(row) if row else None, now + self.ttl)
+            with self.lock:
+                self.entries[token_hash] = entry
+        return entry[0] == (kind, subject_id)
+
+    def put(self, token_hash: str, kind: str, subject_id: int):
+        with self.lock:
+            self.entries[token_hash] = ((kind, subject_id), time.monotonic() + self.ttl)
+
+    def forget(self, kind: str, subject_id: int):
+        """Drop a feed's tokens from this process, after they were revoked"""
+        with self.lock:
+            self.entries = {key: entry for key, entry in self.entries.items() if entry[0] != (kind, subject_id)}
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+# Global token cache instance
+feed_tokens = FeedTokenCache()
+
+def escape_text(value: str) -> str:
+    """Escape a TEXT property value (RFC 5545 3.3.11)"""
+    return (value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+def fold(line: str) -> bytes:
+    """Fold a content line into 75-octet pieces without splitting a UTF-8 character (RFC 5545 3.1)"""
+    data = line.encode()
+    pieces = []
+    limit = 75
+    while len(data) > limit:
+        cut = limit
+        # Back off to the start of a multi-byte character
+        while data[cut] & 0xC0 == 0x80:
+            cut -= 1
+        pieces.append(data[:cut])
+        data = data[cut:]
+        limit = 74  # Continuation lines start with a space
+    pieces.append(data)
+    return b"\r\n ".join(pieces) + b"\r\n"
+
+def format_utc(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+def event_lines(uid: str, stamp: datetime, summary: str, start, end, description: Optional[str] = None) -> list:
+    # Dates make all-day events (end date exclusive, like end_date); datetimes are floating local times
+    if isinstance(start, datetime):
+        times = [f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}", f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}"]
+    else:
+        times = [f"DTSTART;VALUE=DATE:{start.strftime('%Y%m%d')}", f"DTEND;VALUE=DATE:{end.strftime('%Y%m%d')}"]
+    lines = ["BEGIN:VEVENT", f"UID:{uid}", f"DTSTAMP:{format_utc(stamp)}", *times, f"SUMMARY:{escape_text(summary)}"]
+    if description:
+        lines.append(f"DESCRIPTION:{escape_text(description)}")
+    lines += ["TRANSP:OPAQUE", "END:VEVENT"]
+    return lines
+
+def build_calendar(name: str, events: Iterable[list]) -> bytes:
+    """A VCALENDAR of the given event_lines() results"""
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Timeoff Manager//Leave calendar//EN",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(name)}",
+        f"REFRESH-INTERVAL;VALUE=DURATION:{CALENDAR_REFRESH_INTERVAL}",
+        f"X-PUBLISHED-TTL:{CALENDAR_REFRESH_INTERVAL}",
+    ]
+    for event in events:
+        lines += event
+    lines.append("END:VCALENDAR")
+    return b"".join(fold(line) for line in lines)
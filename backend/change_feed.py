@@ -0,0 +1,145 @@
+"""Change feed over leave_request_changes, for GET /changes and its SSE stream.
+
+Changes are written in the same transaction as the change itself, so the
+feed holds exactly the committed changes. Their ids are the cursor, but ids
+are assigned at INSERT and transactions commit in any order: a reader can
+see id 11 while id 10 is still uncommitted. Reading stops at such a gap
+until the change after it is CHANGE_FEED_GAP_GRACE_SECONDS old; a gap
+older than that belongs to a rolled back transaction and is skipped. A
+consumer that stores the cursor of the last change it applied therefore
+resumes without missing or repeating changes.
+"""
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
+import asyncio
+import os
+import time
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from health import health_monitor
+from models.leave_requests import LeaveRequestChange
+
+# Changes returned per request at most
+CHANGE_FEED_MAX_BATCH = int(os.getenv("CHANGE_FEED_MAX_BATCH", "500"))
+# How long a gap in the ids may still be an uncommitted transaction; keep it above the longest write transaction
+CHANGE_FEED_GAP_GRACE_SECONDS = float(os.getenv("CHANGE_FEED_GAP_GRACE_SECONDS", "10"))
+# Longest ?wait= of a long-poll request
+CHANGE_FEED_MAX_WAIT = float(os.getenv("CHANGE_FEED_MAX_WAIT", "30"))
+# Waiting readers recheck the database this often, picking up changes committed by other workers
+CHANGE_FEED_POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "1"))
+# Idle SSE streams send a comment this often, so proxies keep them open
+CHANGE_FEED_HEARTBEAT_SECONDS = float(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", "15"))
+
+# Leave request attributes stored with every change
+PAYLOAD_FIELDS = (
+    "id", "user_id", "request_type", "start_date", "end_date", "start_datetime", "end_datetime",
+    "reason", "status", "reviewed_by", "reviewed_at", "created_at", "updated_at"
+)
+
+def record_change(db: Session, leave_request, change_type: str):
+    """Add a change of leave_request (ORM object or returned row) to db's transaction"""
+    payload = {name: getattr(leave_request, name) for name in PAYLOAD_FIELDS}
+    db.add(LeaveRequestChange(
+        leave_request_id=leave_request.id,
+        user_id=leave_request.user_id,
+        change_type=change_type,
+        payload=orjson.dumps(payload).decode()
+    ))
+    db.info["leave_request_changes"] = True
+
+def read_changes(db: Session, since: int, limit: int, now: Optional[datetime] = None) -> Tuple[List[dict], int]:
+    """Committed changes after the since cursor, oldest first, and the cursor to continue from"""
+    now = now or datetime.utcnow()
+    settled = now - timedelta(seconds=CHANGE_FEED_GAP_GRACE_SECONDS)
+    rows = db.query(
+        LeaveRequestChange.id, LeaveRequestChange.change_type, LeaveRequestChange.leave_request_id,
+        LeaveRequestChange.user_id, LeaveRequestChange.payload, LeaveRequestChange.created_at
+    ).filter(LeaveRequestChange.id > since).order_by(LeaveRequestChange.id).limit(limit).all()
+
+    changes = []
+    cursor = since
+    for row in rows:
+        # A missing id before a recent change may still commit; don't move past it yet
+        if row.id != cursor + 1 and row.created_at > settled:
+            break
+        changes.append({
+            "cursor": row.id,
+            "type": row.change_type,
+            "leave_request_id": row.leave_request_id,
+            "user_id": row.user_id,
+            "created_at": row.created_at,
+            "leave_request": orjson.loads(row.payload)
+        })
+        cursor = row.id
+    return changes, cursor
+
+class ChangeSignal:
+    """Wakes readers waiting on this worker's event loop when a change commits here"""
+
+    def __init__(self):
+        self.loop = None
+        self.event = None
+
+    async def wait(self, timeout: float):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop, self.event = loop, asyncio.Event()
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def notify(self):
+        # Commits happen on the event loop and in the threadpool alike
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.wake()
+        else:
+            loop.call_soon_threadsafe(self.wake)
+
+    def wake(self):
+        event, self.event = self.event, asyncio.Event()
+        event.set()
+
+# Global signal instance
+change_signal = ChangeSignal()
+
+@event.listens_for(Session, "after_commit")
+def notify_change_readers(session):
+    if session.info.pop("leave_request_changes", False):
+        change_signal.notify()
+
+@event.listens_for(Session, "after_rollback")
+def discard_change_notification(session):
+    session.info.pop("leave_request_changes", None)
+
+def format_event(change: dict) -> bytes:
+    """A change as a Server-Sent Event; its id is the cursor, sent back as Last-Event-ID on reconnect"""
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (change["cursor"], change["type"].encode(), orjson.dumps(change))
+
+async def change_events(read_batch: Callable[[int], Awaitable[Tuple[List[dict], int]]], since: int,
+                        is_disconnected: Callable[[], Awaitable[bool]]):
+    """Server-Sent Events for every change after since, until the client leaves or the worker drains"""
+    cursor = since
+    last_sent = time.monotonic()
+    yield b"retry: 3000\n\n"
+    while not health_monitor.draining and not await is_disconnected():
+        changes, cursor = await read_batch(cursor)
+        if changes:
+            for change in changes:
+                yield format_event(change)
+            last_sent = time.monotonic()
+            continue
+        if time.monotonic() - last_sent >= CHANGE_FEED_HEARTBEAT_SECONDS:
+            yield b": keepalive\n\n"
+            last_sent = time.monotonic()
+        await change_signal.wait(CHANGE_FEED_POLL_SECONDS)
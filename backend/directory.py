@@ -0,0 +1,160 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from datetime import datetime
+from typing import Dict, Iterable, NamedTuple, Optional
+import asyncio
+import logging
+import os
+from database import ReadSessionLocal
+from models.leave_requests import User, Unit
+
+logger = logging.getLogger(__name__)
+
+# Full reload interval, picking up changes made by other workers or directly in the database
+DIRECTORY_REFRESH_SECONDS = float(os.getenv("DIRECTORY_REFRESH_SECONDS", "60"))
+
+class DirectoryUser(NamedTuple):
+    """The public attributes of a user; a tuple keeps 10k entries at a few MB"""
+    name: str
+    email: str
+    role: str
+    unit_id: Optional[int]
+
+def directory_entry(user: User) -> DirectoryUser:
+    role = user.role.value if hasattr(user.role, "value") else user.role
+    return DirectoryUser(user.name, user.email, role, user.unit_id)
+
+class Directory:
+    """Process-wide map of users and units.
+
+    Loaded in full on startup and every DIRECTORY_REFRESH_SECONDS, updated
+    on commit when this process inserts or updates a user, and filled on
+    demand (one query per batch of missing ids) in between. users_through
+    and units_through are the updated_at up to which changes made elsewhere
+    are known to be applied; see catch_up.
+    """
+
+    def __init__(self):
+        self.users: Dict[int, DirectoryUser] = {}
+        self.units: Dict[int, str] = {}
+        self.users_through: Optional[datetime] = None
+        self.units_through: Optional[datetime] = None
+
+    def load(self, session_factory=ReadSessionLocal):
+        """Replace both maps with the current users and units"""
+        db = session_factory()
+        try:
+            users = {}
+            users_through = None
+            for user_id, name, email, role, unit_id, updated_at in db.query(User.id, User.name, User.email, User.role, User.unit_id, User.updated_at):
+                users[user_id] = DirectoryUser(name, email, getattr(role, "value", role), unit_id)
+                if updated_at is not None and (users_through is None or updated_at > users_through):
+                    users_through = updated_at
+            units = {}
+            units_through = None
+            for unit_id, name, updated_at in db.query(Unit.id, Unit.name, Unit.updated_at):
+                units[unit_id] = name
+                if updated_at is not None and (units_through is None or updated_at > units_through):
+                    units_through = updated_at
+        finally:
+            db.close()
+        self.users, self.units = users, units
+        self.users_through, self.units_through = users_through, units_through
+
+    def catch_up(self, db: Session, users_through: Optional[datetime], units_through: Optional[datetime] = None):
+        """Apply user and unit changes up to the given updated_at that this process hasn't seen yet.
+
+        Cached lists are versioned by these watermarks, so a list filled
+        after catching up never carries a name changed on another worker.
+        """
+        if users_through is not None and (self.users_through is None or users_through > self.users_through):
+            if self.users_through is None:
+                # Nothing tells how old the entries are: drop them, they load again on demand
+                self.users = {}
+            else:
+                # >=: rows updated within the same timestamp may have committed after the last catch up
+                for user in db.query(User.id, User.name, User.email, User.role, User.unit_id).filter(User.updated_at >= self.users_through):
+                    self.users[user.id] = DirectoryUser(user.name, user.email, getattr(user.role, "value", user.role), user.unit_id)
+            self.users_through = users_through
+        if units_through is not None and (self.units_through is None or units_through > self.units_through):
+            if self.units_through is None:
+                self.units = {}
+            else:
+                self.units.update(db.query(Unit.id, Unit.name).filter(Unit.updated_at >= self.units_through).all())
+            self.units_through = units_through
+
+    def get_users(self, user_ids: Iterable[int], db: Session) -> Dict[int, DirectoryUser]:
+        """Entries for user_ids, loading any missing ones with db; unknown ids are left out"""
+        users = self.users
+        found = {}
+        missing = []
+        for user_id in set(user_ids):
+            entry = users.get(user_id)
+            if entry is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = entry
+        if missing:
+            for user in db.query(User.id, User.name, User.email, User.role, User.unit_id).filter(User.id.in_(missing)):
+                found[user.id] = users[user.id] = DirectoryUser(user.name, user.email, getattr(user.role, "value", user.role), user.unit_id)
+        return found
+
+    def get_user(self, user_id: int, db: Session) -> Optional[DirectoryUser]:
+        return self.get_users((user_id,), db).get(user_id)
+
+    def get_unit_name(self, unit_id: Optional[int], db: Session) -> Optional[str]:
+        if unit_id is None:
+            return None
+        name = self.units.get(unit_id)
+        if name is None:
+            unit = db.query(Unit.name).filter(Unit.id == unit_id).first()
+            if unit is not None:
+                name = self.units[unit_id] = unit.name
+        return name
+
+    def put_user(self, user_id: int, entry: DirectoryUser):
+        self.users[user_id] = entry
+
+    def clear(self):
+        self.users = {}
+        self.units = {}
+        self.users_through = self.units_through = None
+
+    async def run(self):
+        """Warm the directory on startup, then reload it periodically"""
+        while True:
+            try:
+                await asyncio.to_thread(self.load)
+            except Exception:
+                logger.exception("Error loading the user directory")
+            await asyncio.sleep(DIRECTORY_REFRESH_SECONDS)
+
+# Global directory instance
+directory = Directory()
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+def queue_directory_update(mapper, connection, target):
+    """Remember changed users on their session; applied only once the change commits"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("directory_updates", {})[target.id] = directory_entry(target)
+
+@event.listens_for(Unit, "after_insert")
+@event.listens_for(Unit, "after_update")
+def queue_unit_update(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("directory_units", {})[target.id] = target.name
+
+@event.listens_for(Session, "after_commit")
+def apply_directory_updates(session):
+    for user_id, entry in session.info.pop("directory_updates", {}).items():
+        directory.put_user(user_id, entry)
+    for unit_id, name in session.info.pop("directory_units", {}).items():
+        directory.units[unit_id] = name
+
+@event.listens_for(Session, "after_rollback")
+def discard_directory_updates(session):
+    session.info.pop("directory_updates", None)
+    session.info.pop("directory_units", None)
@@ -0,0 +1,39 @@
+from fastapi import Request, Response
+import hashlib
+
+# Responses carrying an ETag must always be revalidated by the browser, so a
+# stale list is never shown without asking the API first
+CACHE_CONTROL = "private, no-cache"
+
+def compute_etag(*parts) -> str:
+    """Build a strong ETag from the values that identify a response version"""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    digest = hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check whether the request's If-None-Match header matches the given ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    if header.strip() == "*":
+        return True
+
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        # Weak comparison is enough for GET revalidation (RFC 9110 13.1.2)
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def not_modified_response(etag: str) -> Response:
+    """Empty 304 response for a matching conditional GET"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+def set_etag_headers(response: Response, etag: str):
+    """Attach ETag and revalidation headers to a full response"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
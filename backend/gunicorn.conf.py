@@ -0,0 +1,74 @@
+"""Production server configuration: gunicorn managing uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Everything is configured from the environment. The app is preloaded once in
+the master and forked into the workers; each worker then replaces the
+database engine and restarts the logging thread it inherited. Send HUP for
+a graceful worker restart; with PRELOAD_APP=true new code needs a new
+master (USR2, then QUIT to the old one).
+"""
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# One worker per core by default: every worker pushes notifications from the change feed,
+# and read-your-writes pinning travels with the client in a cookie
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Load balancers whose X-Forwarded-For is trusted for the client address (see rate_limit.py)
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+
+# Recycle workers after a number of requests (jittered so they don't all restart together)
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+# ...or once their resident memory exceeds this many MiB (0 disables the check)
+WORKER_MAX_MEMORY_MB = int(os.getenv("WORKER_MAX_MEMORY_MB", "0"))
+WORKER_MEMORY_CHECK_SECONDS = float(os.getenv("WORKER_MEMORY_CHECK_SECONDS", "10"))
+
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+# In-flight requests get this long to finish on restart or shutdown
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+accesslog = os.getenv("ACCESS_LOG") or None
+
+def resident_memory_mb() -> float:
+    """Current RSS of this process from /proc (Linux), falling back to peak RSS"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def watch_memory(worker):
+    while True:
+        time.sleep(WORKER_MEMORY_CHECK_SECONDS)
+        memory = resident_memory_mb()
+        if memory > WORKER_MAX_MEMORY_MB:
+            worker.log.info("Worker %s uses %.0f MiB (limit %s MiB), restarting", worker.pid, memory, WORKER_MAX_MEMORY_MB)
+            # Same path as a graceful shutdown: finish in-flight requests, then the master replaces us
+            os.kill(worker.pid, signal.SIGTERM)
+            return
+
+def on_starting(server):
+    # One drain flag for all workers, cleared once per server start; workers inherit the variable
+    from health import health_monitor
+    health_monitor.reset_draining()
+    os.environ["DRAIN_FILE_MANAGED"] = "1"
+
+def post_fork(server, worker):
+    # Connections, locks and threads created in the master must not be shared by workers
+    import database
+    import logging_setup
+    database.recreate_engine()
+    logging_setup.reinit_after_fork()
+
+def post_worker_init(worker):
+    if WORKER_MAX_MEMORY_MB:
+        threading.Thread(target=watch_memory, args=(worker,), name="memory-watchdog", daemon=True).start()
@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import Callable, Optional
+from sqlalchemy import text
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import database
+from metrics import db_pool_waiting
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background database probes; /ready only reads the last result
+READINESS_PROBE_INTERVAL = float(os.getenv("READINESS_PROBE_INTERVAL", "2"))
+READINESS_PROBE_TIMEOUT = float(os.getenv("READINESS_PROBE_TIMEOUT", "2"))
+# Not ready when the event loop falls this far behind, or the pool is saturated with threads waiting
+READINESS_MAX_LOOP_LAG_MS = float(os.getenv("READINESS_MAX_LOOP_LAG_MS", "500"))
+READINESS_MAX_POOL_WAITING = int(os.getenv("READINESS_MAX_POOL_WAITING", "0"))
+# Draining flag shared by all workers of a server: POST /drain reaches one worker, every one must stop being ready
+DRAIN_FILE = os.getenv("DRAIN_FILE", os.path.join(tempfile.gettempdir(), "timeoff-manager.drain"))
+# Shared secret a pre-stop hook sends as X-Drain-Token to POST /drain; unset disables the endpoint
+DRAIN_TOKEN = os.getenv("DRAIN_TOKEN")
+
+class HealthMonitor:
+    """Dependency health of this worker, refreshed in the background.
+
+    Probing on every /ready hit would turn load balancer checks into
+    database load, so /ready reports the latest background results.
+    """
+
+    def __init__(self, engine_getter: Callable = lambda: database.engine, drain_file: str = DRAIN_FILE):
+        self.engine_getter = engine_getter
+        self.drain_file = drain_file
+        self.database_ok: Optional[bool] = None
+        self.database_error: Optional[str] = None
+        self.database_latency_ms: Optional[float] = None
+        self.database_checked_at: Optional[float] = None
+        self.loop_lag_ms = 0.0
+        self.draining = False
+
+    def probe_database(self, engine=None):
+        """Run SELECT 1 and record the outcome (blocking; run off the event loop)"""
+        started = time.perf_counter()
+        try:
+            with (engine or self.engine_getter()).connect() as connection:
+                connection.execute(text("SELECT 1"))
+            self.database_ok, self.database_error = True, None
+        except Exception as e:
+            if self.database_ok is not False:
+                logger.warning("Database probe failed", extra={"error": str(e)})
+            self.database_ok, self.database_error = False, str(e)
+        self.database_latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.database_checked_at = time.monotonic()
+
+    def pool_status(self) -> dict:
+        pool = self.engine_getter().pool
+        status = {"waiting": int(db_pool_waiting.values.get((), 0))}
+        if hasattr(pool, "size") and hasattr(pool, "checkedout"):
+            capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+            status["checked_out"] = pool.checkedout()
+            status["capacity"] = capacity
+            status["saturation"] = round(pool.checkedout() / capacity, 2) if capacity else None
+        return status
+
+    def status(self) -> dict:
+        """Readiness report; "ready" is False if any check fails"""
+        pool = self.pool_status()
+        draining = self.is_draining()
+        stale = (
+            self.database_checked_at is None
+            or time.monotonic() - self.database_checked_at > 3 * READINESS_PROBE_INTERVAL + READINESS_PROBE_TIMEOUT
+        )
+        checks = {
+            "draining": not draining,
+            "database": bool(self.database_ok) and not stale,
+            "pool": pool["waiting"] <= READINESS_MAX_POOL_WAITING,
+            "event_loop": self.loop_lag_ms <= READINESS_MAX_LOOP_LAG_MS
+        }
+        return {
+            "ready": all(checks.values()),
+            "checks": checks,
+            "draining": draining,
+            "database": {
+                "reachable": self.database_ok,
+                "error": self.database_error,
+                "latency_ms": self.database_latency_ms,
+                "stale": stale
+            },
+            "pool": pool,
+            # Informational: reads fall back to the primary when no replica is healthy
+            "replicas": database.replicas.status(),
+            "event_loop_lag_ms": round(self.loop_lag_ms, 1),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    def is_draining(self) -> bool:
+        # One stat per /ready; load balancers poll every few seconds
+        return self.draining or os.path.exists(self.drain_file)
+
+    def start_draining(self):
+        """Report not ready from now on, in every worker sharing the drain file"""
+        if not self.is_draining():
+            logger.info("Draining: /ready now reports not ready")
+        self.draining = True
+        try:
+            with open(self.drain_file, "w") as f:
+                f.write(str(os.getpid()))
+        except OSError as e:
+            logger.warning("Could not write the drain file, only this worker drains", extra={"error": str(e)})
+
+    def reset_draining(self):
+        """Clear a drain flag left by a previous run of the server (call once per server start)"""
+        self.draining = False
+        try:
+            os.remove(self.drain_file)
+        except FileNotFoundError:
+            pass
+
+    async def run_database_probe(self):
+        """Background loop probing the database"""
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.to_thread(self.probe_database), READINESS_PROBE_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.database_ok, self.database_error = False, "Probe timed out"
+                self.database_checked_at = time.monotonic()
+            await asyncio.sleep(READINESS_PROBE_INTERVAL)
+
+    async def run_loop_lag_probe(self, interval: float = 0.5):
+        """Background loop measuring how late the event loop wakes up a sleeping task"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag_ms = max(0.0, (loop.time() - started - interval) * 1000)
+
+# Global health monitor instance
+health_monitor = HealthMonitor()
@@ -0,0 +1 @@
+# Maintenance jobs package
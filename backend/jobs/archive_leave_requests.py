@@ -0,0 +1,72 @@
+"""Move reviewed leave requests from past years to leave_requests_archive.
+
+Rows are copied and deleted in small batches, each in its own short
+transaction, so the job never holds long locks on leave_requests; it is
+also how existing data is migrated after upgrades/004. Pending requests
+are never archived, so managers can still review them. Run it from cron
+or in a loop:
+
+    python -m jobs.archive_leave_requests                # single pass
+    python -m jobs.archive_leave_requests --every 86400  # pass every day
+"""
+import argparse
+import os
+import time
+from datetime import date
+
+from sqlalchemy import insert, select
+
+from change_feed import record_change
+from database import SessionLocal
+from jobs.purge_expired import purge_in_batches
+from models.leave_requests import LeaveRequest, LeaveRequestArchive, StatusEnum, PERIOD_END
+
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+# Requests that ended before January 1st this many years ago are archived (1: last year stays hot)
+ARCHIVE_AFTER_YEARS = int(os.getenv("ARCHIVE_AFTER_YEARS", "1"))
+
+ARCHIVED_COLUMNS = [column.name for column in LeaveRequest.__table__.c]
+
+def archive_cutoff(today: date = None, after_years: int = ARCHIVE_AFTER_YEARS) -> date:
+    today = today or date.today()
+    return date(today.year - after_years, 1, 1)
+
+def move_to_archive(db, ids: list):
+    """Copy the given leave requests to the archive and delete them, in the caller's transaction"""
+    # An "archived" change per request moves the version of the cached lists showing it, on every worker
+    for leave_request in db.execute(select(*LeaveRequest.__table__.c).where(LeaveRequest.id.in_(ids))):
+        record_change(db, leave_request, "archived")
+    db.execute(insert(LeaveRequestArchive).from_select(
+        ARCHIVED_COLUMNS + ["period_end"],
+        select(*LeaveRequest.__table__.c, PERIOD_END).where(LeaveRequest.id.in_(ids))
+    ))
+    db.query(LeaveRequest).filter(LeaveRequest.id.in_(ids)).delete(synchronize_session=False)
+
+def archive_leave_requests(session_factory=SessionLocal, cutoff: date = None,
+                           batch_size: int = ARCHIVE_BATCH_SIZE, pause: float = 0.05) -> int:
+    """Archive reviewed requests that ended before cutoff, oldest ids first"""
+    cutoff = cutoff or archive_cutoff()
+    return purge_in_batches(
+        session_factory,
+        lambda db: db.query(LeaveRequest.id).filter(
+            LeaveRequest.status != StatusEnum.pending,
+            PERIOD_END < cutoff
+        ).order_by(LeaveRequest.id),
+        move_to_archive,
+        batch_size,
+        pause
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--every", type=float, default=None, help="Repeat every N seconds instead of running once")
+    args = parser.parse_args()
+
+    while True:
+        print(f"Archived: {archive_leave_requests()}")
+        if args.every is None:
+            break
+        time.sleep(args.every)
+
+if __name__ == "__main__":
+    main()
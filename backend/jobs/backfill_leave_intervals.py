@@ -0,0 +1,55 @@
+"""Fill starts_at/ends_at of leave requests written before those columns existed.
+
+New and edited requests get them on write; this job backfills the rest
+after upgrades/006, in small batches with one short transaction each, and
+leaves updated_at untouched. Safe to rerun; it stops when nothing is left:
+
+    python -m jobs.backfill_leave_intervals
+"""
+import os
+
+from sqlalchemy import bindparam, or_, update
+
+from database import SessionLocal
+from jobs.purge_expired import purge_in_batches
+from models.leave_requests import LeaveRequest, leave_interval
+
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "1000"))
+
+leave_requests = LeaveRequest.__table__
+SET_INTERVAL = (
+    update(leave_requests)
+    .where(leave_requests.c.id == bindparam("row_id"))
+    # Assigning updated_at to itself keeps both the ORM onupdate and MySQL's ON UPDATE from firing
+    .values(starts_at=bindparam("row_starts_at"), ends_at=bindparam("row_ends_at"), updated_at=leave_requests.c.updated_at)
+)
+
+def set_intervals(db, ids: list):
+    rows = db.query(
+        LeaveRequest.id, LeaveRequest.start_date, LeaveRequest.end_date, LeaveRequest.start_datetime, LeaveRequest.end_datetime
+    ).filter(LeaveRequest.id.in_(ids))
+    params = []
+    for row in rows:
+        starts_at, ends_at = leave_interval(row.start_date, row.end_date, row.start_datetime, row.end_datetime)
+        params.append({"row_id": row.id, "row_starts_at": starts_at, "row_ends_at": ends_at})
+    db.execute(SET_INTERVAL, params)
+
+def backfill_leave_intervals(session_factory=SessionLocal, batch_size: int = BACKFILL_BATCH_SIZE, pause: float = 0.05) -> int:
+    """Set the interval of every request that has none yet"""
+    return purge_in_batches(
+        session_factory,
+        lambda db: db.query(LeaveRequest.id).filter(
+            LeaveRequest.starts_at.is_(None),
+            # Rows without any start can't be filled; skipping them lets the job finish
+            or_(LeaveRequest.start_date.isnot(None), LeaveRequest.start_datetime.isnot(None))
+        ).order_by(LeaveRequest.id),
+        set_intervals,
+        batch_size,
+        pause
+    )
+
+def main():
+    print(f"Backfilled: {backfill_leave_intervals()}")
+
+if __name__ == "__main__":
+    main()
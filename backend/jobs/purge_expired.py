@@ -0,0 +1,99 @@
+"""Purge expired confirmation tokens and stale unvalidated accounts.
+
+Deletes in small batches, each in its own short transaction, so the job
+never holds long locks on users. Run it from cron or in a loop:
+
+    python -m jobs.purge_expired                 # single pass
+    python -m jobs.purge_expired --every 3600    # pass every hour
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from database import SessionLocal
+from models.leave_requests import EmailVerificationToken, User
+
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+# Unvalidated accounts older than this, with no live token left, are removed
+STALE_ACCOUNT_DAYS = int(os.getenv("STALE_ACCOUNT_DAYS", "7"))
+
+def purge_in_batches(session_factory, select_ids, delete_ids, batch_size: int, pause: float) -> int:
+    """Repeatedly select up to batch_size ids and delete them in their own transaction"""
+    total = 0
+    while True:
+        db = session_factory()
+        try:
+            ids = [row[0] for row in select_ids(db).limit(batch_size).all()]
+            if not ids:
+                return total
+            delete_ids(db, ids)
+            db.commit()
+            total += len(ids)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        if len(ids) < batch_size:
+            return total
+        # Give concurrent writers room between batches
+        time.sleep(pause)
+
+def purge_expired_tokens(session_factory=SessionLocal, batch_size: int = PURGE_BATCH_SIZE, pause: float = 0.05) -> int:
+    """Delete confirmation tokens past their expiry (uses the expires_at index)"""
+    now = datetime.utcnow()
+    return purge_in_batches(
+        session_factory,
+        lambda db: db.query(EmailVerificationToken.token_hash).filter(EmailVerificationToken.expires_at < now),
+        lambda db, hashes: db.query(EmailVerificationToken).filter(
+            EmailVerificationToken.token_hash.in_(hashes)
+        ).delete(synchronize_session=False),
+        batch_size,
+        pause
+    )
+
+def purge_stale_accounts(session_factory=SessionLocal, stale_days: int = STALE_ACCOUNT_DAYS,
+                         batch_size: int = PURGE_BATCH_SIZE, pause: float = 0.05) -> int:
+    """Delete unvalidated accounts older than stale_days that have no live confirmation token"""
+    cutoff = datetime.utcnow() - timedelta(days=stale_days)
+    now = datetime.utcnow()
+    return purge_in_batches(
+        session_factory,
+        lambda db: db.query(User.id).filter(
+            User.validated == False,
+            User.created_at < cutoff,
+            ~db.query(EmailVerificationToken.token_hash).filter(
+                EmailVerificationToken.user_id == User.id,
+                EmailVerificationToken.expires_at >= now
+            ).exists()
+        ),
+        delete_users,
+        batch_size,
+        pause
+    )
+
+def delete_users(db, user_ids: list):
+    # Tokens first, so the delete also works where foreign keys don't cascade (SQLite)
+    db.query(EmailVerificationToken).filter(EmailVerificationToken.user_id.in_(user_ids)).delete(synchronize_session=False)
+    db.query(User).filter(User.id.in_(user_ids), User.validated == False).delete(synchronize_session=False)
+
+def run_once(session_factory=SessionLocal) -> dict:
+    return {
+        "expired_tokens": purge_expired_tokens(session_factory),
+        "stale_accounts": purge_stale_accounts(session_factory)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--every", type=float, default=None, help="Repeat every N seconds instead of running once")
+    args = parser.parse_args()
+
+    while True:
+        print(f"Purged: {run_once()}")
+        if args.every is None:
+            break
+        time.sleep(args.every)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Run the webhook dispatcher: queue, send, retry and dead-letter deliveries.
+
+Runs next to the API, never inside it, so deliveries add no latency to API
+calls. Run one dispatcher per database:
+
+    python -m jobs.webhooks            # dispatch until interrupted
+    python -m jobs.webhooks --once     # single pass, waiting for its sends
+"""
+import argparse
+import logging
+
+from logging_setup import setup_logging
+from webhooks import WebhookDispatcher
+
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="Run a single pass instead of dispatching until interrupted")
+    args = parser.parse_args()
+
+    setup_logging()
+    dispatcher = WebhookDispatcher()
+    try:
+        if args.once:
+            print(f"Dispatched: {dispatcher.run_once()}")
+        else:
+            dispatcher.run()
+    except KeyboardInterrupt:
+        logger.info("Webhook dispatcher stopping")
+    finally:
+        dispatcher.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Structured, non-blocking logging.
+
+Records are put on a bounded in-memory queue by the emitting thread (the
+event loop included) and written as JSON lines to stdout by a background
+QueueListener thread, so slow stdout never stalls a request. Each record
+carries the request_id and user_id of the request that emitted it.
+"""
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" for log shippers, "text" for reading in a terminal
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Records waiting to be written; further records are dropped rather than blocking the caller
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Per-logger sample rates for records below WARNING, e.g. "api.leave_requests=0.1,websocket_manager=0.5"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+
+# Correlation ids of the request being handled, set by RequestIdMiddleware and the auth layer
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+user_id_var: ContextVar[Optional[int]] = ContextVar("user_id", default=None)
+
+# LogRecord attributes that are not user supplied `extra` fields
+RESERVED_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "user_id"}
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """Turn "name=rate,name=rate" into {logger name: rate}"""
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+class CorrelationFilter(logging.Filter):
+    """Stamp records with the request and user ids of the emitting context"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.user_id = user_id_var.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the sub-WARNING records of configured loggers (and their children)"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.cache: Dict[str, float] = {}
+
+    def rate_for(self, name: str) -> float:
+        rate = self.cache.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self.cache[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full and leaves formatting to the listener"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only resolve what can't cross threads; JSON formatting happens on the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "user_id": getattr(record, "user_id", None)
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        record.request_id = getattr(record, "request_id", None) or "-"
+        return super().format(record)
+
+listener: Optional[QueueListener] = None
+queue_handler: Optional[NonBlockingQueueHandler] = None
+
+def setup_logging(stream=None):
+    """Route the root logger through the queue; safe to call more than once"""
+    global listener, queue_handler
+    if listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(CorrelationFilter())
+    if LOG_SAMPLING:
+        queue_handler.addFilter(SamplingFilter(parse_sampling(LOG_SAMPLING)))
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(queue_handler.queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.unregister(shutdown_logging)
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global listener, queue_handler
+    if listener is None:
+        return
+    listener.stop()
+    logging.getLogger().removeHandler(queue_handler)
+    listener = None
+    queue_handler = None
+
+def reinit_after_fork():
+    """Restart logging in a forked worker: the parent's listener thread doesn't exist here"""
+    global listener, queue_handler
+    if queue_handler is not None:
+        logging.getLogger().removeHandler(queue_handler)
+    listener = None
+    queue_handler = None
+    setup_logging()
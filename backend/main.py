@@ -1,37 +1,144 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from api.leave_requests import router as leave_requests_router
-from api.authentication import router as auth_router
-from api.profile import router as profile_router
-from api.google_oauth import router as google_oauth_router
-from api.websocket import router as websocket_router
-from middleware.auth import AuthMiddleware
-
-app = FastAPI(title="Timeoff Manager API")
-
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000", "http://127.0.0.1:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Add authentication middleware
-app.add_middleware(AuthMiddleware)
-
-# Include routers
-app.include_router(leave_requests_router)
-app.include_router(auth_router)
-app.include_router(profile_router)
-app.include_router(google_oauth_router)
-app.include_router(websocket_router)
-
-@app.get("/")
-def read_root():
-    return {"message": "Timeoff Manager API is running!"}
-
-@app.get("/health")
-def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+"""Application entry point.
+
+`main:app` is built by create_app() the first time it is accessed, so
+`uvicorn main:app` and `gunicorn main:app` work as before while importing
+this module (tests, jobs, tooling) costs nothing. Routers and middleware are
+imported inside the factory, the profiler only when PROFILING_SECRET is set;
+the database engine is created at startup.
+"""
+import asyncio
+import os
+
+# Browser origins allowed to call the API
+CORS_ORIGINS = ["http://localhost:3000", "http://127.0.0.1:3000"]
+
+def create_app(session_factory=None, profiling_secret=None, title: str = "Timeoff Manager API", background_tasks: bool = True):
+    """Build the API application.
+
+    session_factory and profiling_secret override what the auth and
+    profiling middleware use; background_tasks=False skips the startup jobs
+    (token version refresh, readiness probes) and engine creation.
+    """
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from middleware.auth import AuthMiddleware
+    from middleware.metrics import MetricsMiddleware
+    from middleware.query_stats import QueryStatsMiddleware
+    from middleware.read_your_writes import ReadYourWritesMiddleware
+    from middleware.request_id import RequestIdMiddleware
+    from api.leave_requests import router as leave_requests_router
+    from api.authentication import router as auth_router
+    from api.profile import router as profile_router
+    from api.google_oauth import router as google_oauth_router
+    from api.websocket import router as websocket_router
+    from api.metrics import router as metrics_router
+    from api.health import router as health_router
+    from api.changes import router as changes_router
+    from api.webhooks import router as webhooks_router
+    from api.calendar import router as calendar_router
+
+    app = FastAPI(title=title)
+
+    # Add CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Hand writers the cookie that pins their next reads to the primary, on any worker
+    app.add_middleware(ReadYourWritesMiddleware)
+
+    # Add authentication middleware
+    if session_factory is None:
+        app.add_middleware(AuthMiddleware)
+    else:
+        app.add_middleware(AuthMiddleware, session_factory=session_factory)
+
+    # Add metrics middleware around authentication and CORS so it times the whole request
+    app.add_middleware(MetricsMiddleware)
+
+    # Add SQL statement accounting around the metrics middleware, which reads its counts
+    app.add_middleware(QueryStatsMiddleware)
+
+    # Add on-demand profiling around those, so a profile covers them too; only when a secret is configured
+    profiling_secret = profiling_secret or os.getenv("PROFILING_SECRET")
+    if profiling_secret:
+        from middleware.profiling import ProfilingMiddleware
+        app.add_middleware(ProfilingMiddleware, secret=profiling_secret)
+
+    # Add request ids outermost, so every log record of a request carries one
+    app.add_middleware(RequestIdMiddleware)
+
+    # Include routers
+    app.include_router(leave_requests_router)
+    app.include_router(auth_router)
+    app.include_router(profile_router)
+    app.include_router(google_oauth_router)
+    app.include_router(websocket_router)
+    app.include_router(metrics_router)
+    app.include_router(health_router)
+    app.include_router(changes_router)
+    app.include_router(webhooks_router)
+    app.include_router(calendar_router)
+
+    @app.get("/")
+    def read_root():
+        return {"message": "Timeoff Manager API is running!"}
+
+    @app.get("/health")
+    def health_check():
+        return {"status": "healthy"}
+
+    if background_tasks:
+        add_background_tasks(app)
+    return app
+
+def add_background_tasks(app):
+    from auth_tokens import token_versions, AUTH_MODE
+    from health import health_monitor
+    from directory import directory
+    from websocket_manager import notification_relay
+    import database
+
+    tasks = []
+
+    @app.on_event("startup")
+    async def start_background_tasks():
+        # Under gunicorn the master clears the drain flag once; a restarting worker must not clear it mid-drain
+        if not os.getenv("DRAIN_FILE_MANAGED"):
+            health_monitor.reset_draining()
+        # Create the engine (and import the DB driver) now rather than on the first request
+        database.get_engine()
+        # Keep the token version map fresh so stateless auth sees revocations within seconds
+        if AUTH_MODE == "stateless":
+            tasks.append(asyncio.create_task(token_versions.run()))
+        # Warm the user/unit directory, then keep it in sync with other workers
+        tasks.append(asyncio.create_task(directory.run()))
+        # Push notifications for changes committed by any worker to this worker's connections
+        tasks.append(asyncio.create_task(notification_relay.run()))
+        # Feed /ready from background probes instead of probing per request
+        tasks.append(asyncio.create_task(health_monitor.run_database_probe()))
+        tasks.append(asyncio.create_task(health_monitor.run_loop_lag_probe()))
+        # Take unreachable or lagging replicas out of read rotation
+        if database.replicas.replicas:
+            tasks.append(asyncio.create_task(database.replicas.run()))
+
+    @app.on_event("shutdown")
+    async def stop_background_tasks():
+        # Not ready is signalled before shutdown, by POST /drain; by now the listener is already closed
+        for task in tasks:
+            task.cancel()
+
+def __getattr__(name):
+    # Build the served app on first access of main.app
+    global app
+    if name == "app":
+        from logging_setup import setup_logging
+        # Configure logging before anything else logs
+        setup_logging()
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,187 @@
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+import threading
+import time
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets for counts such as queries per request
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    """Monotonic counter, incremented directly or read from a callback returning running totals"""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), callback: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.callback = callback
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        # Only incremented from the event loop thread, so no lock on the hot path
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        values = self.callback() if self.callback else self.values
+        for label_values, value in list(values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Gauge:
+    """Gauge whose samples are either set directly or read from a callback at scrape time"""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), callback: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.callback = callback
+        self.values: Dict[Tuple, float] = {}
+        # In-flight gauges move up and down from threadpool threads; a drift would never heal
+        self.lock = threading.Lock()
+
+    def set(self, value: float, *label_values):
+        self.values[label_values] = value
+
+    def inc(self, *label_values, amount: float = 1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount: float = 1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) - amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        values = self.callback() if self.callback else self.values
+        for label_values, value in list(values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # {label values: [per-bucket counts (+Inf last), sum]}
+        self.values: Dict[Tuple, list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = [(label_values, list(counts), total) for label_values, (counts, total) in self.values.items()]
+        for label_values, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, label_values)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template, method and status", ("route", "method", "status")
+))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("route", "method")
+))
+db_queries_per_request = registry.register(Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",), COUNT_BUCKETS
+))
+db_pool_checkout_wait_seconds = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection"
+))
+db_pool_waiting = registry.register(Gauge(
+    "db_pool_waiting", "Threads currently waiting for a pooled database connection"
+))
+notification_fanout_seconds = registry.register(Histogram(
+    "notification_fanout_seconds", "Duration of WebSocket notification fan-out", ("kind",)
+))
+bcrypt_in_flight = registry.register(Gauge(
+    "bcrypt_in_flight", "bcrypt hash/verify operations currently running"
+))
+bcrypt_duration_seconds = registry.register(Histogram(
+    "bcrypt_duration_seconds", "Duration of bcrypt hash/verify operations", ("operation",), (0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5)
+))
+
+def instrument_pool(engine):
+    """Time connection checkouts on an engine's pool (call again after dispose)"""
+    pool = engine.pool
+    if getattr(pool, "_metrics_instrumented", False):
+        return
+    connect = pool.connect
+
+    def timed_connect():
+        db_pool_waiting.inc()
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            db_pool_waiting.dec()
+            db_pool_checkout_wait_seconds.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+    pool._metrics_instrumented = True
+
+def register_pool_gauges(engine_getter: Callable):
+    """Expose checked-out/overflow/size of the engine's pool, read at scrape time"""
+    def read(attribute):
+        def callback():
+            pool = engine_getter().pool
+            method = getattr(pool, attribute, None)
+            return {(): method()} if method else {}
+        return callback
+
+    registry.register(Gauge("db_pool_checked_out", "Connections currently checked out of the pool", callback=read("checkedout")))
+    registry.register(Gauge("db_pool_overflow", "Connections open beyond the pool size", callback=read("overflow")))
+    registry.register(Gauge("db_pool_size", "Configured pool size", callback=read("size")))
+
+class timed:
+    """Context manager observing the elapsed time into a histogram"""
+
+    def __init__(self, histogram: Histogram, *label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+        return False
@@ -1,10 +1,10 @@
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response, JSONResponse
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
 import jwt
 import os
-from database import SessionLocal
-from models.leave_requests import User
+from database import ReadSessionLocal
+from auth_tokens import authenticate_payload, AUTH_MODE
+from logging_setup import user_id_var
 
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
@@ -14,96 +14,80 @@ ALGORITHM = "HS256"
 PUBLIC_ROUTES = {
     "/",
     "/health",
+    "/ready",
+    "/drain",
     "/login",
     "/register", 
     "/register_confirm",
+    "/token/refresh",
+    "/token/revoke",
     "/google/login",
     "/google/callback",
     "/google/auth-url",
     "/ws/status",
+    "/metrics",
     "/docs",
     "/redoc",
     "/openapi.json"
 }
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Allow OPTIONS requests (CORS preflight) without authentication
-        if request.method == "OPTIONS":
-            request.state.user = None
-            return await call_next(request)
+# Route prefixes authenticated by the endpoint itself (calendar feeds carry a token in the URL)
+PUBLIC_ROUTE_PREFIXES = ("/calendar/user/", "/calendar/unit/")
+
+class AuthMiddleware:
+    """Pure ASGI middleware authenticating requests and storing the user in request.state.user.
+
+    Unlike BaseHTTPMiddleware, the response is passed through untouched, so
+    it is not re-streamed through an extra task and the server sees the
+    request complete as soon as the body is sent.
+    """
+
+    def __init__(self, app, session_factory=ReadSessionLocal, mode: str = AUTH_MODE):
+        self.app = app
+        self.session_factory = session_factory
+        self.mode = mode
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
         
-        # Check if the route is public
-        if request.url.path in PUBLIC_ROUTES:
-            request.state.user = None
-            return await call_next(request)
+        state = scope.setdefault("state", {})
         
-        # Get token from Authorization header
-        auth_header = request.headers.get("Authorization")
+        # Allow OPTIONS requests (CORS preflight) and public routes without authentication
+        if scope["method"] == "OPTIONS" or scope["path"] in PUBLIC_ROUTES or scope["path"].startswith(PUBLIC_ROUTE_PREFIXES):
+            state["user"] = None
+            return await self.app(scope, receive, send)
+        
+        user, error = self.authenticate(Headers(scope=scope).get("Authorization"))
+        if error:
+            return await JSONResponse(status_code=401, content={"detail": error})(scope, receive, send)
+        
+        # Store user info in request state
+        state["user"] = user
+        user_id_var.set(user["id"])
+        await self.app(scope, receive, send)
+
+    def authenticate(self, auth_header):
+        """Resolve the Authorization header to (user, None) or (None, error detail)"""
         if not auth_header:
-            return JSONResponse(
-                status_code=401,
-                content={"detail": "Authorization header missing"}
-            )
+            return None, "Authorization header missing"
         
         # Check if it's a Bearer token
         if not auth_header.startswith("Bearer "):
-            return JSONResponse(
-                status_code=401,
-                content={"detail": "Invalid authorization header format"}
-            )
+            return None, "Invalid authorization header format"
         
         token = auth_header.split(" ")[1]
         
         try:
             # Verify and decode the token
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            user_id = payload.get("user_id")
-            email = payload.get("sub")
-            
-            if user_id is None or email is None:
-                return JSONResponse(
-                    status_code=401,
-                    content={"detail": "Invalid token payload"}
-                )
-            
-            # Get user from database to ensure they still exist and are validated
-            db = SessionLocal()
-            try:
-                user = db.query(User).filter(User.id == user_id, User.email == email).first()
-                if not user:
-                    return JSONResponse(
-                        status_code=401,
-                        content={"detail": "User not found"}
-                    )
-                
-                if not user.validated:
-                    return JSONResponse(
-                        status_code=401,
-                        content={"detail": "Account not validated"}
-                    )
-                
-                # Store user info in request state
-                request.state.user = {
-                    "id": user.id,
-                    "email": user.email,
-                    "name": user.name,
-                    "role": user.role,
-                    "unit_id": user.unit_id
-                }
-                
-            finally:
-                db.close()
-                
         except jwt.ExpiredSignatureError:
-            return JSONResponse(
-                status_code=401,
-                content={"detail": "Token has expired"}
-            )
+            return None, "Token has expired"
         except jwt.InvalidTokenError:
-            return JSONResponse(
-                status_code=401,
-                content={"detail": "Invalid token"}
-            )
+            return None, "Invalid token"
+        
+        if payload.get("user_id") is None or payload.get("sub") is None:
+            return None, "Invalid token payload"
         
-        return await call_next(request)
+        # Check the user still exists and is validated (from claims in stateless mode)
+        return authenticate_payload(payload, self.session_factory, self.mode)
@@ -0,0 +1,41 @@
+from metrics import http_requests_total, http_request_duration_seconds, db_queries_per_request
+from query_stats import current_query_stats
+import time
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route request counts, latency and SQL statement counts.
+
+    Plain ASGI instead of BaseHTTPMiddleware keeps the per-request cost to a
+    couple of perf_counter() calls and dict updates. Statement counts come
+    from QueryStatsMiddleware, which must wrap this one.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+        stats = current_query_stats.get()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            # Label by route template (/leave_requests/{request_id}/status), never the raw path
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_requests_total.inc(path, method, status_code)
+            http_request_duration_seconds.observe(elapsed, path, method)
+            if stats is not None:
+                db_queries_per_request.observe(stats.count, path)
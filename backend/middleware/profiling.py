@@ -0,0 +1,41 @@
+from profiling import Sampler, new_profile_id, save_profile, verify_profile_token, PROFILING_SECRET
+import anyio.to_thread
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware sampling requests sent with a valid X-Profile token.
+
+    The profile id is returned in the X-Profile-Id response header. Other
+    requests only pay for a header scan, and nothing at all when
+    PROFILING_SECRET is unset.
+    """
+
+    def __init__(self, app, secret=PROFILING_SECRET):
+        self.app = app
+        self.secret = secret
+
+    async def __call__(self, scope, receive, send):
+        if not self.secret or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                token = value.decode("latin-1")
+                break
+        if token is None or not verify_profile_token(token, self.secret):
+            return await self.app(scope, receive, send)
+
+        profile_id = new_profile_id(scope["method"], scope["path"])
+        sampler = Sampler()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            await anyio.to_thread.run_sync(save_profile, profile_id, sampler.collapsed())
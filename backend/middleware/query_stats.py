@@ -0,0 +1,35 @@
+from query_stats import QueryStats, current_query_stats, report_repeated_statements, QUERY_STATS_HEADERS
+
+class QueryStatsMiddleware:
+    """Pure ASGI middleware collecting the SQL statements of each request.
+
+    Adds X-DB-Queries and Server-Timing headers (visible in the browser's
+    network panel) and reports statements repeated within one request.
+    Statements run after the headers are sent, e.g. while streaming, are
+    still counted for metrics and N+1 detection but not in the headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and QUERY_STATS_HEADERS:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.count).encode()))
+                headers.append((b"server-timing", f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_query_stats.reset(token)
+            route = scope.get("route")
+            report_repeated_statements(stats, scope["method"], route.path if route is not None else scope["path"])
@@ -0,0 +1,26 @@
+from database import last_write_cookie
+
+class ReadYourWritesMiddleware:
+    """Pure ASGI middleware handing a writer the time of their write as a cookie.
+
+    get_db records a user's committed write on request.state; the cookie
+    comes back with their next requests, so get_read_db keeps those on the
+    primary for READ_YOUR_WRITES_SECONDS whichever worker serves them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                last_write = scope.get("state", {}).get("last_write")
+                if last_write is not None:
+                    cookie = last_write_cookie(*last_write).encode("latin-1")
+                    message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie)]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,40 @@
+from logging_setup import request_id_var, user_id_var
+import uuid
+
+class RequestIdMiddleware:
+    """Pure ASGI middleware giving every request a correlation id for its log records.
+
+    A well-formed incoming X-Request-ID (e.g. from the load balancer) is
+    reused, otherwise one is generated; either way it is echoed in the
+    response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                value = value.decode("latin-1")
+                if 0 < len(value) <= 64 and value.replace("-", "").isalnum():
+                    request_id = value
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-request-id", request_id.encode())]}
+            await send(message)
+
+        request_token = request_id_var.set(request_id)
+        # Set by AuthMiddleware once the caller is known
+        user_token = user_id_var.set(None)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(request_token)
+            user_id_var.reset(user_token)
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Date, Text, DateTime, Enum, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Date, Text, DateTime, Enum, ForeignKey, Boolean, DDL, Index, event, func, inspect
 from sqlalchemy.ext.declarative import declarative_base
-from datetime import datetime
+from datetime import datetime, time
 import enum
 
 Base = declarative_base()
@@ -29,6 +29,7 @@ class Unit(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), unique=True, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class User(Base):
     __tablename__ = "users"
@@ -41,9 +42,21 @@ class User(Base):
     role = Column(Enum(RoleEnum), default=RoleEnum.user)
     unit_id = Column(Integer, ForeignKey("units.id"))
     validated = Column(Boolean, default=False)
-    confirmation_token = Column(String(255), nullable=True)
+    # Bumped whenever a claim carried by access tokens changes, invalidating older tokens
+    token_version = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Indexed: its maximum is part of the cached leave request lists' version
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+# User attributes copied into access token claims
+TOKEN_CLAIM_ATTRIBUTES = ("name", "email", "role", "unit_id", "validated")
+
+@event.listens_for(User, "before_update")
+def bump_token_version(mapper, connection, target):
+    """Revoke outstanding access tokens when a claim they carry changes"""
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in TOKEN_CLAIM_ATTRIBUTES):
+        target.token_version = (target.token_version or 0) + 1
 
 class LeaveRequest(Base):
     __tablename__ = "leave_requests"
@@ -65,3 +78,170 @@ class LeaveRequest(Base):
     reviewed_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Absence as a half-open [starts_at, ends_at) interval for both types, set on write
+    starts_at = Column(DateTime, nullable=True)
+    ends_at = Column(DateTime, nullable=True)
+    
+    # Overlap queries (ends_at > X AND starts_at < Y) range over ends_at, which
+    # only requests that aren't over yet pass for "now and later" questions
+    __table_args__ = (Index("idx_leave_requests_ends_at_starts_at", "ends_at", "starts_at"),)
+
+# Last day of a request, whichever its type; the archive stores it as period_end
+PERIOD_END = func.coalesce(LeaveRequest.end_date, func.date(LeaveRequest.end_datetime))
+
+def leave_interval(start_date, end_date, start_datetime, end_datetime):
+    """(starts_at, ends_at) of a request; timeoff runs from start_date until the start of end_date"""
+    if start_datetime is not None or end_datetime is not None:
+        return start_datetime, end_datetime
+    return (
+        datetime.combine(start_date, time()) if start_date is not None else None,
+        datetime.combine(end_date, time()) if end_date is not None else None
+    )
+
+@event.listens_for(LeaveRequest, "before_insert")
+@event.listens_for(LeaveRequest, "before_update")
+def set_leave_interval(mapper, connection, target):
+    """Keep starts_at/ends_at in sync with the type-specific columns"""
+    target.starts_at, target.ends_at = leave_interval(
+        target.start_date, target.end_date, target.start_datetime, target.end_datetime
+    )
+
+# Text index for /leave_requests/search: FULLTEXT indexes on MySQL, an FTS5 table
+# kept current by triggers on SQLite (rowid = leave request id)
+LEAVE_REQUESTS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS leave_requests_fts USING fts5(reason, user_name)",
+    """CREATE TRIGGER IF NOT EXISTS leave_requests_fts_insert AFTER INSERT ON leave_requests BEGIN
+        INSERT INTO leave_requests_fts (rowid, reason, user_name)
+        VALUES (new.id, new.reason, (SELECT name FROM users WHERE id = new.user_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS leave_requests_fts_update AFTER UPDATE OF reason ON leave_requests BEGIN
+        UPDATE leave_requests_fts SET reason = new.reason WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS leave_requests_fts_delete AFTER DELETE ON leave_requests BEGIN
+        DELETE FROM leave_requests_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS leave_requests_fts_user_name AFTER UPDATE OF name ON users BEGIN
+        UPDATE leave_requests_fts SET user_name = new.name
+        WHERE rowid IN (SELECT id FROM leave_requests WHERE user_id = new.id);
+    END""",
+]
+for statement in LEAVE_REQUESTS_FTS_DDL:
+    event.listen(LeaveRequest.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(LeaveRequest.__table__, "before_drop", DDL("DROP TABLE IF EXISTS leave_requests_fts").execute_if(dialect="sqlite"))
+event.listen(LeaveRequest.__table__, "after_create",
+             DDL("ALTER TABLE leave_requests ADD FULLTEXT INDEX ft_leave_requests_reason (reason)").execute_if(dialect="mysql"))
+event.listen(User.__table__, "after_create",
+             DDL("ALTER TABLE users ADD FULLTEXT INDEX ft_users_name (name)").execute_if(dialect="mysql"))
+
+class LeaveRequestArchive(Base):
+    """Reviewed leave requests that ended in past years, moved out of leave_requests.
+
+    Same columns as leave_requests (ids are kept), plus the end date used to
+    partition the table by year on MySQL; see jobs.archive_leave_requests.
+    """
+    __tablename__ = "leave_requests_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False, index=True)
+    request_type = Column(Enum(RequestTypeEnum), nullable=False)
+    start_date = Column(Date, nullable=True)
+    end_date = Column(Date, nullable=True)
+    start_datetime = Column(DateTime, nullable=True)
+    end_datetime = Column(DateTime, nullable=True)
+    reason = Column(Text)
+    status = Column(Enum(StatusEnum))
+    reviewed_by = Column(Integer)
+    reviewed_at = Column(DateTime)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    starts_at = Column(DateTime)
+    ends_at = Column(DateTime)
+    # end_date, or the date of end_datetime for permissions; the partitioning key
+    period_end = Column(Date, primary_key=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+class LeaveRequestChange(Base):
+    """Append-only log of leave request changes, written in the changing transaction.
+
+    The id is the change feed cursor; see change_feed.
+    """
+    __tablename__ = "leave_request_changes"
+    
+    id = Column(Integer, primary_key=True)
+    leave_request_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False, index=True)  # Owner of the request
+    change_type = Column(String(32), nullable=False)  # created, status_changed, archived
+    # JSON snapshot of the request after the change
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class WebhookSubscription(Base):
+    """An HR tool endpoint that receives leave request changes, signed with its secret"""
+    __tablename__ = "webhook_subscriptions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String(500), nullable=False)
+    secret = Column(String(64), nullable=False)
+    # Comma separated change types to deliver (created, status_changed)
+    event_types = Column(String(100), nullable=False)
+    # Batches in flight to this endpoint at once
+    max_concurrency = Column(Integer, nullable=False, default=2)
+    active = Column(Boolean, nullable=False, default=True)
+    # Last change feed cursor turned into deliveries; new subscriptions start at the current end
+    last_change_id = Column(Integer, nullable=False, default=0)
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class WebhookDelivery(Base):
+    """One change to deliver to one subscription; pending rows are the delivery queue"""
+    __tablename__ = "webhook_deliveries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    subscription_id = Column(Integer, ForeignKey("webhook_subscriptions.id", ondelete="CASCADE"), nullable=False, index=True)
+    change_id = Column(Integer, nullable=False)
+    # The change as served by GET /changes
+    payload = Column(Text, nullable=False)
+    status = Column(String(16), nullable=False, default="pending")  # pending, delivered, dead
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Set while a sender holds the delivery; expired leases (crashed dispatcher) are picked up again
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text)
+    delivered_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (Index("idx_webhook_deliveries_status_next_attempt_at", "status", "next_attempt_at"),)
+
+class CalendarFeedToken(Base):
+    """Secret token in the URL of a user's or unit's .ics feed; only its SHA-256 is stored"""
+    __tablename__ = "calendar_feed_tokens"
+    
+    token_hash = Column(String(64), primary_key=True)
+    kind = Column(String(8), nullable=False)  # user, unit
+    subject_id = Column(Integer, nullable=False)
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (Index("idx_calendar_feed_tokens_kind_subject_id", "kind", "subject_id"),)
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # Only the SHA-256 of the token is stored; rotated tokens share a family_id
+    token_hash = Column(String(64), unique=True, nullable=False)
+    family_id = Column(String(32), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class EmailVerificationToken(Base):
+    __tablename__ = "email_verification_tokens"
+    
+    # Keyed by the SHA-256 of the token sent by email, so lookups are a primary key hit
+    token_hash = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,120 @@
+"""Opt-in sampling profiler for single requests.
+
+A request carrying a valid X-Profile token (a JWT signed with
+PROFILING_SECRET, see `python -m profiling --help`) is sampled while it
+runs. The collapsed stacks (flamegraph.pl / speedscope format) are written
+to PROFILE_DIR, which keeps only the newest PROFILE_MAX_FILES profiles.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import uuid
+import jwt
+
+# Profiling is disabled unless a secret for signing profile tokens is configured
+PROFILING_SECRET = os.getenv("PROFILING_SECRET")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "timeoff-profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+ALGORITHM = "HS256"
+
+# Leaf frames in these stdlib modules are idle threads (threadpool workers waiting for work)
+IDLE_MODULES = ("threading.py", "queue.py", "selectors.py")
+
+def create_profile_token(minutes: int = 15, secret: Optional[str] = PROFILING_SECRET) -> str:
+    """Sign a token that enables profiling for the requests carrying it until it expires"""
+    return jwt.encode(
+        {"scope": "profile", "exp": datetime.utcnow() + timedelta(minutes=minutes)},
+        secret,
+        algorithm=ALGORITHM
+    )
+
+def verify_profile_token(token: str, secret: Optional[str] = PROFILING_SECRET) -> bool:
+    if not secret:
+        return False
+    try:
+        payload = jwt.decode(token, secret, algorithms=[ALGORITHM])
+    except jwt.InvalidTokenError:
+        return False
+    return payload.get("scope") == "profile"
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+class Sampler:
+    """Background thread counting the stacks of all other threads every interval.
+
+    Sync endpoints and database calls run on threadpool threads, so every
+    thread is sampled; concurrent requests therefore show up in the profile
+    too, which is why it is best taken on a quiet worker.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self.stopped.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(frame_label(frame))
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                labels.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+def new_profile_id(method: str, path: str) -> str:
+    slug = "".join(c if c.isalnum() else "_" for c in path.strip("/"))[:60] or "root"
+    return f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{method.lower()}-{slug}-{uuid.uuid4().hex[:8]}.folded"
+
+def save_profile(profile_id: str, content: str, directory: Optional[str] = None, max_files: Optional[int] = None):
+    """Write a profile to PROFILE_DIR and delete the oldest ones beyond PROFILE_MAX_FILES"""
+    directory = directory or PROFILE_DIR
+    max_files = max_files or PROFILE_MAX_FILES
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, profile_id), "w") as f:
+        f.write(content)
+
+    profiles = sorted(name for name in os.listdir(directory) if name.endswith(".folded"))
+    for name in profiles[:-max_files]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a token enabling profiling of requests sent with X-Profile: <token>")
+    parser.add_argument("--minutes", type=int, default=15)
+    args = parser.parse_args()
+    if not PROFILING_SECRET:
+        parser.error("PROFILING_SECRET is not set")
+    print(create_profile_token(args.minutes))
+
+if __name__ == "__main__":
+    main()
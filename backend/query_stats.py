@@ -0,0 +1,89 @@
+from contextvars import ContextVar
+from typing import Dict, Optional
+from sqlalchemy import event
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this are logged with the shape of their parameters
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# The same statement executed this many times in one request is reported as a suspected N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+# Add X-DB-Queries and Server-Timing headers to every HTTP response
+QUERY_STATS_HEADERS = os.getenv("QUERY_STATS_HEADERS", "true").lower() == "true"
+
+class QueryStats:
+    """SQL statements executed while handling one request"""
+
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Dict[str, int] = {}
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.duration += elapsed
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> Dict[str, int]:
+        """Statements executed at least threshold times, i.e. suspected N+1 patterns"""
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+# Stats of the request being handled; the object is shared with threadpool copies of the context
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """Describe bound parameters by type only, so values (passwords, emails) never reach the log"""
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = parameter_shape(parameters[0]) if parameters else "()"
+        return f"{len(parameters)} x {first}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning(
+            "Slow query",
+            extra={"duration_ms": round(elapsed * 1000, 1), "statement": " ".join(statement.split()), "params": parameter_shape(parameters, executemany)}
+        )
+
+def handle_error(exception_context):
+    """Drop the start time of a failed statement so the stack stays balanced"""
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+def instrument_engine(engine):
+    """Attach the statement accounting listeners to an engine (idempotent)"""
+    for name, listener in (
+        ("before_cursor_execute", before_cursor_execute),
+        ("after_cursor_execute", after_cursor_execute),
+        ("handle_error", handle_error)
+    ):
+        if not event.contains(engine, name, listener):
+            event.listen(engine, name, listener)
+
+def report_repeated_statements(stats: QueryStats, method: str, path: str):
+    """Log suspected N+1 statements of a finished request"""
+    for statement, count in stats.repeated().items():
+        logger.warning(
+            "Suspected N+1",
+            extra={"method": method, "route": path, "executions": count, "statement": " ".join(statement.split())}
+        )
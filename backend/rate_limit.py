@@ -0,0 +1,193 @@
+from fastapi import HTTPException, Request
+from typing import Dict, List, Optional, Tuple
+import ipaddress
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Limits are "<requests>/<seconds>": a bucket of <requests> tokens refilled over <seconds>
+LOGIN_IP_LIMIT = os.getenv("LOGIN_IP_LIMIT", "20/60")
+LOGIN_EMAIL_LIMIT = os.getenv("LOGIN_EMAIL_LIMIT", "5/60")
+REGISTER_IP_LIMIT = os.getenv("REGISTER_IP_LIMIT", "5/600")
+REGISTER_EMAIL_LIMIT = os.getenv("REGISTER_EMAIL_LIMIT", "3/600")
+
+# Optional shared state for multi-worker deployments (requires the redis package)
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+
+# Proxies trusted to report the client address in X-Forwarded-For: comma separated addresses or
+# networks, "*" for any. Gunicorn and uvicorn read the same variable (forwarded_allow_ips)
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# Upper bound on tracked keys per process, so a spray of addresses can't grow memory forever
+MAX_TRACKED_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+def parse_networks(value: str) -> Optional[List]:
+    """Turn a FORWARDED_ALLOW_IPS value into networks; None trusts every peer"""
+    entries = [entry.strip() for entry in value.split(",") if entry.strip()]
+    if "*" in entries:
+        return None
+    return [ipaddress.ip_network(entry, strict=False) for entry in entries]
+
+TRUSTED_PROXIES = parse_networks(FORWARDED_ALLOW_IPS)
+
+def is_trusted_proxy(host: str) -> bool:
+    if TRUSTED_PROXIES is None:
+        return True
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+def client_ip(request: Request) -> str:
+    """Address of the client: the peer, or behind trusted proxies the nearest forwarded hop that isn't one.
+
+    Hops are read right to left, so addresses a client puts in its own
+    X-Forwarded-For are never reached while a proxy appends the real one.
+    """
+    host = request.client.host if request.client else "unknown"
+    hops = [hop.strip() for hop in ",".join(request.headers.getlist("x-forwarded-for")).split(",") if hop.strip()]
+    while hops and is_trusted_proxy(host):
+        host = hops.pop()
+    return host
+
+def parse_limit(limit: str) -> Tuple[float, float]:
+    """Turn "<requests>/<seconds>" into (capacity, tokens refilled per second)"""
+    count, seconds = limit.split("/")
+    return float(count), float(count) / float(seconds)
+
+class InMemoryBackend:
+    """Token buckets kept in this process: {key: (tokens, last update)}"""
+
+    def __init__(self, max_keys: int = MAX_TRACKED_KEYS):
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        self.max_keys = max_keys
+        # Sync endpoints run in the threadpool, so buckets are shared between threads
+        self.lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, rate: float) -> float:
+        """Take one token; returns 0 if allowed, otherwise seconds until a token is available"""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                retry_after = 0.0
+            else:
+                self.buckets[key] = (tokens, now)
+                retry_after = (1 - tokens) / rate
+            if len(self.buckets) > self.max_keys:
+                self.prune()
+        return retry_after
+
+    def prune(self):
+        """Keep the most recently used half of the buckets; idle ones have mostly refilled anyway"""
+        newest = sorted(self.buckets.items(), key=lambda item: item[1][1])[-(self.max_keys // 2):]
+        self.buckets = dict(newest)
+
+    def reset(self):
+        with self.lock:
+            self.buckets = {}
+
+class RedisBackend:
+    """Token buckets shared by all workers through Redis, updated atomically by a Lua script"""
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated) * rate)
+    local retry_after = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        retry_after = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(retry_after)
+    """
+
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.take_script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key: str, capacity: float, rate: float) -> float:
+        try:
+            return float(self.take_script(keys=[f"rate_limit:{key}"], args=[capacity, rate]))
+        except Exception as e:
+            # Fail open: an unreachable Redis must not lock everybody out of login
+            logger.warning("Rate limit backend error, allowing request", extra={"error": str(e)})
+            return 0.0
+
+    def reset(self):
+        for key in self.client.scan_iter("rate_limit:*"):
+            self.client.delete(key)
+
+class RateLimiter:
+    """A named token bucket limit with allowed/rejected counters for monitoring"""
+
+    def __init__(self, name: str, limit: str, backend):
+        self.name = name
+        self.capacity, self.rate = parse_limit(limit)
+        self.backend = backend
+        self.allowed = 0
+        self.rejected = 0
+
+    def hit(self, key: str) -> float:
+        """Count a request for key; returns 0 if allowed, otherwise the Retry-After in seconds"""
+        retry_after = self.backend.take(f"{self.name}:{key}", self.capacity, self.rate)
+        if retry_after:
+            self.rejected += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+backend = RedisBackend(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_REDIS_URL else InMemoryBackend()
+
+limiters = {
+    "login_ip": RateLimiter("login_ip", LOGIN_IP_LIMIT, backend),
+    "login_email": RateLimiter("login_email", LOGIN_EMAIL_LIMIT, backend),
+    "register_ip": RateLimiter("register_ip", REGISTER_IP_LIMIT, backend),
+    "register_email": RateLimiter("register_email", REGISTER_EMAIL_LIMIT, backend)
+}
+
+def throttle(request: Request, action: str, email: str):
+    """Reject with 429 when the client IP or the target email exceeded its limit for action.
+
+    Must run before any password hashing, which is the work being protected.
+    """
+    retry_after = max(
+        limiters[f"{action}_ip"].hit(client_ip(request)),
+        limiters[f"{action}_email"].hit(email.strip().lower())
+    )
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts. Please try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+def get_stats() -> dict:
+    """Allowed/rejected counters per limiter (per process)"""
+    return {
+        name: {"allowed": limiter.allowed, "rejected": limiter.rejected}
+        for name, limiter in limiters.items()
+    }
+
+def reset():
+    """Clear all buckets and counters"""
+    backend.reset()
+    for limiter in limiters.values():
+        limiter.allowed = 0
+        limiter.rejected = 0
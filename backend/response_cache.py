@@ -0,0 +1,133 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Cached responses expire after this many seconds; versions change with every write,
+# so this only bounds how long entries of superseded versions hold memory
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+# Entries kept per process by the in-memory backend (least recently used are evicted)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+
+# Optional cache shared by all workers, so each version is computed once (requires the redis package)
+RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL")
+
+class InMemoryBackend:
+    """Cached bodies kept in this process"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.max_entries = max_entries
+        # Sync endpoints run in the threadpool, so entries are shared between threads
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+
+class RedisBackend:
+    """Cached bodies shared by all workers through Redis"""
+
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(f"response_cache:entry:{key}")
+        except Exception as e:
+            logger.warning("Response cache backend error", extra={"error": str(e)})
+            return None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        try:
+            self.client.set(f"response_cache:entry:{key}", value, px=int(ttl * 1000))
+        except Exception as e:
+            logger.warning("Response cache backend error", extra={"error": str(e)})
+
+    def reset(self):
+        for key in self.client.scan_iter("response_cache:*"):
+            self.client.delete(key)
+
+class ResponseCache:
+    """Response bodies cached per (scope, scope version, variant).
+
+    Callers read the version of a scope from shared state (the database)
+    on every request, so a write committed by any worker changes the key and
+    the next read misses instead of serving stale data. Concurrent misses on the same key
+    in this process are collapsed into one computation (single-flight):
+    the first caller computes, the others wait for its result.
+    """
+
+    def __init__(self, backend, ttl: float = RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.in_flight: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_compute(self, scope: str, version: str, variant: str, compute: Callable[[], bytes]) -> bytes:
+        key = f"{scope}:{version}:{variant}"
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+            self.backend.set(key, value, self.ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def get_stats(self) -> dict:
+        """Hit/miss/coalesced counters (per process)"""
+        return {"hit": self.hits, "miss": self.misses, "coalesced": self.coalesced}
+
+    def reset(self):
+        """Drop all entries and counters"""
+        self.backend.reset()
+        self.hits = self.misses = self.coalesced = 0
+
+response_cache = ResponseCache(RedisBackend(RESPONSE_CACHE_REDIS_URL) if RESPONSE_CACHE_REDIS_URL else InMemoryBackend())
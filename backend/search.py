@@ -0,0 +1,82 @@
+"""Ranked full-text search over leave request reasons and requester names.
+
+MySQL uses the FULLTEXT indexes on leave_requests.reason and users.name
+(natural language mode); SQLite uses the leave_requests_fts FTS5 table.
+Both indexes are declared with the models and kept current by the database.
+Other databases fall back to an unindexed ILIKE scan.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import case, or_, text
+from sqlalchemy.orm import Session
+
+from models.leave_requests import LeaveRequest, User
+
+# Words beyond this are ignored, bounding the cost of a query
+SEARCH_MAX_TERMS = 10
+
+def search_terms(q: str) -> List[str]:
+    """Words of a search query; punctuation and index query syntax are dropped"""
+    return re.findall(r"\w+", q.lower())[:SEARCH_MAX_TERMS]
+
+# One MATCH per table, so each side is answered from its own FULLTEXT index (an OR across
+# the join can use neither); a request matching on both sides gets the sum of its scores
+MYSQL_SEARCH = """
+    SELECT matches.id, SUM(matches.score) AS score
+    FROM (
+        SELECT lr.id, MATCH (lr.reason) AGAINST (:q) AS score
+        FROM leave_requests lr
+        WHERE MATCH (lr.reason) AGAINST (:q) {owner_filter}
+        UNION ALL
+        SELECT lr.id, MATCH (u.name) AGAINST (:q) AS score
+        FROM users u JOIN leave_requests lr ON lr.user_id = u.id
+        WHERE MATCH (u.name) AGAINST (:q) {owner_filter}
+    ) matches
+    GROUP BY matches.id
+    ORDER BY score DESC, matches.id DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+SQLITE_SEARCH = """
+    SELECT lr.id, -bm25(leave_requests_fts) AS score
+    FROM leave_requests_fts JOIN leave_requests lr ON lr.id = leave_requests_fts.rowid
+    WHERE leave_requests_fts MATCH :q {owner_filter}
+    ORDER BY score DESC, lr.id DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+def substring_search(db: Session, terms: List[str], user_id: Optional[int], limit: int, offset: int) -> List[Tuple[int, float]]:
+    """Fallback without a full-text index: the score is the number of words found in the reason or name"""
+    # Words are \w+, so "_" is the only LIKE wildcard they can contain
+    patterns = ["%" + term.replace("_", "\\_") + "%" for term in terms]
+    found = [or_(LeaveRequest.reason.ilike(pattern, escape="\\"), User.name.ilike(pattern, escape="\\")) for pattern in patterns]
+    score = sum(case((condition, 1), else_=0) for condition in found)
+    query = db.query(LeaveRequest.id, score.label("score")).join(User, User.id == LeaveRequest.user_id).filter(or_(*found))
+    if user_id is not None:
+        query = query.filter(LeaveRequest.user_id == user_id)
+    rows = query.order_by(score.desc(), LeaveRequest.id.desc()).limit(limit).offset(offset)
+    return [(row.id, float(row.score)) for row in rows]
+
+def search_leave_request_ids(db: Session, q: str, user_id: Optional[int] = None,
+                             limit: int = 20, offset: int = 0) -> List[Tuple[int, float]]:
+    """[(leave request id, score)] best match first, restricted to user_id's requests if given"""
+    terms = search_terms(q)
+    if not terms:
+        return []
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        sql, match = MYSQL_SEARCH, " ".join(terms)
+    elif dialect == "sqlite":
+        # Every word as a quoted prefix, any of them matching; bm25 ranks rows matching more and rarer words first
+        sql, match = SQLITE_SEARCH, " OR ".join(f'"{term}"*' for term in terms)
+    else:
+        return substring_search(db, terms, user_id, limit, offset)
+
+    params = {"q": match, "limit": limit, "offset": offset}
+    owner_filter = ""
+    if user_id is not None:
+        owner_filter = "AND lr.user_id = :user_id"
+        params["user_id"] = user_id
+    return [(row.id, float(row.score)) for row in db.execute(text(sql.format(owner_filter=owner_filter)), params)]
@@ -1,6 +1,12 @@
 import pytest
-from fastapi import status
-from models.leave_requests import User
+from fastapi import Request, status
+from models.leave_requests import User, RefreshToken, EmailVerificationToken
+from api.authentication import issue_refresh_token, hash_token, create_access_token
+from auth_tokens import authenticate_payload, token_claims, token_versions
+import jwt
+from datetime import datetime, timedelta
+import time
+import rate_limit
 
 class TestAuthentication:
     """Test authentication endpoints"""
@@ -24,7 +30,10 @@ class TestAuthentication:
         assert user is not None
         assert user.name == "New User"
         assert user.validated == False
-        assert user.confirmation_token is not None
+        
+        # The confirmation token is stored hashed, with an expiry
+        verification = db_session.query(EmailVerificationToken).filter(EmailVerificationToken.user_id == user.id).one()
+        assert verification.expires_at > datetime.utcnow()
     
     def test_register_duplicate_email(self, client, test_user):
         """Test registration with existing email"""
@@ -107,10 +116,15 @@ class TestAuthentication:
             password_hash=password_hash,
             role="user",
             unit_id=test_unit.id,
-            validated=False,
-            confirmation_token="test-token-123"
+            validated=False
         )
         db_session.add(user)
+        db_session.flush()
+        db_session.add(EmailVerificationToken(
+            token_hash=hash_token("test-token-123"),
+            user_id=user.id,
+            expires_at=datetime.utcnow() + timedelta(hours=1)
+        ))
         db_session.commit()
         
         response = client.post("/register_confirm", json={
@@ -121,10 +135,10 @@ class TestAuthentication:
         data = response.json()
         assert "Account confirmed successfully" in data["message"]
         
-        # Check user is now validated
+        # Check user is now validated and the token is gone
         db_session.refresh(user)
         assert user.validated == True
-        assert user.confirmation_token is None
+        assert db_session.query(EmailVerificationToken).count() == 0
     
     def test_register_confirm_invalid_token(self, client):
         """Test confirmation with invalid token"""
@@ -149,10 +163,15 @@ class TestAuthentication:
             password_hash=password_hash,
             role="user",
             unit_id=test_unit.id,
-            validated=True,
-            confirmation_token="test-token-123"
+            validated=True
         )
         db_session.add(user)
+        db_session.flush()
+        db_session.add(EmailVerificationToken(
+            token_hash=hash_token("test-token-123"),
+            user_id=user.id,
+            expires_at=datetime.utcnow() + timedelta(hours=1)
+        ))
         db_session.commit()
         
         response = client.post("/register_confirm", json={
@@ -162,3 +181,233 @@ class TestAuthentication:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         data = response.json()
         assert "Account already validated" in data["detail"]
+    
+    def test_register_confirm_expired_token(self, client, db_session, test_unit):
+        """Test confirmation with an expired token"""
+        user = User(
+            name="Late User",
+            email="late@example.com",
+            role="user",
+            unit_id=test_unit.id,
+            validated=False
+        )
+        db_session.add(user)
+        db_session.flush()
+        db_session.add(EmailVerificationToken(
+            token_hash=hash_token("expired-token"),
+            user_id=user.id,
+            expires_at=datetime.utcnow() - timedelta(minutes=1)
+        ))
+        db_session.commit()
+        
+        response = client.post("/register_confirm", json={
+            "token": "expired-token"
+        })
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "Invalid or expired confirmation token" in response.json()["detail"]
+    
+    def test_login_returns_refresh_token(self, client, test_user, db_session):
+        """Test that login issues a refresh token stored only as a hash"""
+        response = client.post("/login", json={
+            "email": test_user.email,
+            "password": "testpassword"
+        })
+        
+        assert response.status_code == status.HTTP_200_OK
+        refresh_token = response.json()["refresh_token"]
+        assert refresh_token
+        
+        stored = db_session.query(RefreshToken).filter(RefreshToken.user_id == test_user.id).one()
+        assert stored.token_hash == hash_token(refresh_token)
+        assert stored.token_hash != refresh_token
+    
+    def test_refresh_token_rotation(self, client, test_user, db_session):
+        """Test that a refresh returns a new access token and rotates the refresh token"""
+        refresh_token = issue_refresh_token(db_session, test_user.id)
+        db_session.commit()
+        
+        response = client.post("/token/refresh", json={"refresh_token": refresh_token})
+        
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["user_id"] == test_user.id
+        assert data["token"]
+        assert data["refresh_token"] != refresh_token
+        
+        # The new access token works on protected endpoints
+        response = client.get("/profile", headers={"Authorization": f"Bearer {data['token']}"})
+        assert response.status_code == status.HTTP_200_OK
+    
+    def test_refresh_token_reuse_revokes_family(self, client, test_user, db_session):
+        """Test that presenting a rotated token revokes every token of its family"""
+        refresh_token = issue_refresh_token(db_session, test_user.id)
+        db_session.commit()
+        
+        rotated = client.post("/token/refresh", json={"refresh_token": refresh_token}).json()["refresh_token"]
+        
+        response = client.post("/token/refresh", json={"refresh_token": refresh_token})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert "reuse detected" in response.json()["detail"]
+        
+        # The legitimate successor is revoked as well
+        response = client.post("/token/refresh", json={"refresh_token": rotated})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_refresh_token_invalid(self, client):
+        """Test refreshing with an unknown token"""
+        response = client.post("/token/refresh", json={"refresh_token": "not-a-token"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_revoke_refresh_token(self, client, test_user, db_session):
+        """Test that a revoked refresh token can no longer be used"""
+        refresh_token = issue_refresh_token(db_session, test_user.id)
+        db_session.commit()
+        
+        response = client.post("/token/revoke", json={"refresh_token": refresh_token})
+        assert response.status_code == status.HTTP_200_OK
+        
+        response = client.post("/token/refresh", json={"refresh_token": refresh_token})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+class TestStatelessAuth:
+    """Test claim-based authentication and token version revocation"""
+    
+    def test_login_token_carries_claims(self, client, test_user):
+        """Test that access tokens carry the claims needed to skip the user lookup"""
+        response = client.post("/login", json={
+            "email": test_user.email,
+            "password": "testpassword"
+        })
+        
+        payload = jwt.decode(response.json()["token"], options={"verify_signature": False})
+        assert payload["user_id"] == test_user.id
+        assert payload["name"] == test_user.name
+        assert payload["role"] == "user"
+        assert payload["unit_id"] == test_user.unit_id
+        assert payload["token_version"] == test_user.token_version
+    
+    def test_role_change_revokes_token(self, client, auth_headers, test_user, db_session):
+        """Test that changing a claim bumps the token version and rejects older tokens"""
+        assert client.get("/profile", headers=auth_headers).status_code == status.HTTP_200_OK
+        
+        test_user.role = "manager"
+        db_session.commit()
+        
+        response = client.get("/profile", headers=auth_headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.json()["detail"] == "Token has been revoked"
+        
+        # A token issued after the change carries the new role
+        db_session.refresh(test_user)
+        token = create_access_token(data=token_claims(test_user))
+        response = client.get("/profile", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["role"] == "manager"
+    
+    def test_token_without_claims_uses_database(self, client, test_user):
+        """Test that tokens issued before claims existed still authenticate"""
+        token = create_access_token(data={"sub": test_user.email, "user_id": test_user.id})
+        response = client.get("/profile", headers={"Authorization": f"Bearer {token}"})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["name"] == test_user.name
+    
+    def test_stateless_mode_skips_database(self, test_user, auth_headers):
+        """Test that a cached token version authenticates without opening a session"""
+        token_versions.versions[test_user.id] = test_user.token_version
+        payload = jwt.decode(auth_headers["Authorization"].split(" ")[1], options={"verify_signature": False})
+        
+        def no_database():
+            raise AssertionError("database used in stateless mode")
+        
+        user, error = authenticate_payload(payload, no_database, "stateless")
+        assert error is None
+        assert user["id"] == test_user.id
+        assert user["role"] == "user"
+
+class TestThrottling:
+    """Test login and registration throttling"""
+    
+    def test_login_throttled_per_email(self, client, test_user, monkeypatch):
+        """Test that repeated logins for one email get 429 before any password check"""
+        checks = []
+        monkeypatch.setattr(
+            "api.authentication.verify_password",
+            lambda plain, hashed: checks.append(plain) or False
+        )
+        capacity = int(rate_limit.limiters["login_email"].capacity)
+        
+        for _ in range(capacity):
+            response = client.post("/login", json={"email": test_user.email, "password": "wrong"})
+            assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        
+        response = client.post("/login", json={"email": test_user.email, "password": "wrong"})
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert int(response.headers["Retry-After"]) >= 1
+        assert len(checks) == capacity
+        assert rate_limit.get_stats()["login_email"]["rejected"] == 1
+    
+    def test_register_throttled_per_ip(self, client):
+        """Test that a registration burst from one address is rejected"""
+        capacity = int(rate_limit.limiters["register_ip"].capacity)
+        
+        for i in range(capacity):
+            response = client.post("/register", json={
+                "name": "Burst User",
+                "email": f"burst{i}@example.com",
+                "password": "testpassword123"
+            })
+            assert response.status_code == status.HTTP_200_OK
+        
+        response = client.post("/register", json={
+            "name": "Burst User",
+            "email": "burst-last@example.com",
+            "password": "testpassword123"
+        })
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    
+    def test_register_throttled_per_forwarded_client(self, client, monkeypatch):
+        """Test that behind a trusted proxy each forwarded client address gets its own bucket"""
+        monkeypatch.setattr(rate_limit, "TRUSTED_PROXIES", rate_limit.parse_networks("*"))
+        capacity = int(rate_limit.limiters["register_ip"].capacity)
+        
+        def register(email, forwarded_for):
+            return client.post("/register", headers={"X-Forwarded-For": forwarded_for}, json={
+                "name": "Burst User",
+                "email": email,
+                "password": "testpassword123"
+            })
+        
+        for i in range(capacity):
+            assert register(f"burst{i}@example.com", "203.0.113.7").status_code == status.HTTP_200_OK
+        assert register("burst-last@example.com", "203.0.113.7").status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert register("other@example.com", "198.51.100.9").status_code == status.HTTP_200_OK
+    
+    def test_forwarded_for_only_from_trusted_proxies(self, monkeypatch):
+        """Test that X-Forwarded-For is followed through trusted hops only"""
+        monkeypatch.setattr(rate_limit, "TRUSTED_PROXIES", rate_limit.parse_networks("10.0.0.0/8, 127.0.0.1"))
+        
+        def request(peer, forwarded_for):
+            return Request({"type": "http", "client": (peer, 50000), "headers": [(b"x-forwarded-for", forwarded_for.encode())]})
+        
+        # The client spoofed the first hop; the proxies appended the address they saw
+        assert rate_limit.client_ip(request("10.0.0.2", "192.0.2.1, 203.0.113.7, 10.0.0.5")) == "203.0.113.7"
+        # A client connecting directly can't pick its own address
+        assert rate_limit.client_ip(request("203.0.113.7", "192.0.2.1")) == "203.0.113.7"
+    
+    def test_throttle_stats_manager_only(self, client, auth_headers, manager_headers):
+        """Test that throttling counters are exposed to managers"""
+        assert client.get("/throttle/stats", headers=auth_headers).status_code == status.HTTP_403_FORBIDDEN
+        
+        response = client.get("/throttle/stats", headers=manager_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert set(response.json()["limiters"]) == {"login_ip", "login_email", "register_ip", "register_email"}
+    
+    def test_token_bucket_refills(self):
+        """Test that a drained bucket allows requests again after refilling"""
+        backend = rate_limit.InMemoryBackend()
+        assert backend.take("key", capacity=1, rate=1000) == 0
+        assert backend.take("key", capacity=1, rate=1000) > 0
+        time.sleep(0.01)
+        assert backend.take("key", capacity=1, rate=1000) == 0
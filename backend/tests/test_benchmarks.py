@@ -0,0 +1,87 @@
+import pytest
+import random
+from datetime import datetime
+from benchmarks.suite import compare, summarize
+from benchmarks.generate_data import generate, generate_users, generate_leave_requests
+from benchmarks.import_time import deferred_imports, import_times
+from models.leave_requests import User, LeaveRequest, RequestTypeEnum, StatusEnum
+
+def results(throughput, p90_ms):
+    return {"results": {"profile": {"throughput": throughput, "p90_ms": p90_ms}}}
+
+class TestBenchmarkSuite:
+    """Test benchmark summaries and baseline comparison"""
+    
+    def test_summarize_percentiles(self):
+        """Test throughput and percentiles of recorded latencies"""
+        summary = summarize([i / 1000 for i in range(1, 101)], elapsed=2.0)
+        
+        assert summary["requests"] == 100
+        assert summary["throughput"] == 50.0
+        assert summary["p50_ms"] == pytest.approx(51.0, abs=1)
+        assert summary["p99_ms"] == pytest.approx(99.0, abs=1)
+        assert summary["max_ms"] == 100.0
+    
+    def test_compare_within_threshold(self):
+        """Test that small changes are not reported"""
+        assert compare(results(500, 10), results(460, 11), threshold=0.15) == []
+    
+    def test_compare_regression(self):
+        """Test that throughput drops and latency growth beyond the threshold are reported"""
+        regressions = compare(results(500, 10), results(300, 20), threshold=0.15)
+        
+        assert len(regressions) == 2
+        assert regressions[0].startswith("profile: throughput")
+
+class TestGenerateData:
+    """Test the synthetic data generator"""
+    
+    def test_generate_deterministic(self):
+        """Test that the same seed and date produce the same rows"""
+        now = datetime(2026, 3, 1)
+        users = generate_users(random.Random(7), 50, 3, now, years=2)
+        
+        first = list(generate_leave_requests(random.Random(7), 200, users, now, years=2))
+        second = list(generate_leave_requests(random.Random(7), 200, users, now, years=2))
+        
+        assert first == second
+        assert len({row[0] for row in first}) == 200
+    
+    def test_generate_into_database(self, db_session):
+        """Test bulk insertion and the shape of generated rows"""
+        counts = generate(db_session.get_bind(), units=3, users=60, leave_requests=500, seed=1, verbose=False, now=datetime(2026, 3, 1))
+        
+        assert (counts["units"], counts["users"], counts["leave_requests"]) == (3, 60, 500)
+        # Every unit has a manager and every review comes from a manager
+        managers = {user.id: user.unit_id for user in db_session.query(User).filter(User.role == "manager")}
+        assert set(managers.values()) == {1, 2, 3}
+        for leave_request in db_session.query(LeaveRequest).all():
+            if leave_request.request_type == RequestTypeEnum.timeoff:
+                assert leave_request.start_date < leave_request.end_date
+            else:
+                assert leave_request.start_datetime < leave_request.end_datetime
+            assert (leave_request.reviewed_by is None) == (leave_request.status == StatusEnum.pending)
+            assert leave_request.reviewed_by is None or leave_request.reviewed_by in managers
+    
+    def test_generate_refuses_existing_data(self, db_session, test_user):
+        """Test that generating into a populated database requires reset"""
+        with pytest.raises(RuntimeError):
+            generate(db_session.get_bind(), units=1, users=5, leave_requests=10, verbose=False)
+
+class TestImportTime:
+    """Test what building the application imports"""
+    
+    def test_app_defers_optional_imports(self):
+        """Test that building the app neither imports first-use modules nor creates the engine"""
+        entries = import_times("import main, database; main.app; assert database._engine is None")
+        names = [name for name, _, _ in entries]
+        
+        assert "main" in names and "api.leave_requests" in names
+        assert deferred_imports(entries) == []
+    
+    def test_importing_main_is_cheap(self):
+        """Test that importing main alone doesn't build the app"""
+        names = [name for name, _, _ in import_times("import main")]
+        
+        assert "main" in names
+        assert "fastapi" not in names
@@ -0,0 +1,156 @@
+import pytest
+import time
+from types import SimpleNamespace
+from fastapi import status
+from datetime import date, datetime, timedelta
+from calendar_feed import fold
+from models.leave_requests import LeaveRequest, RequestTypeEnum, StatusEnum
+from jobs.archive_leave_requests import archive_leave_requests
+from tests.conftest import TestingSessionLocal
+import api.calendar
+
+class TestCalendarFeeds:
+    """Test the token-authenticated iCalendar feeds"""
+
+    def create_feed(self, client, headers, kind, subject_id):
+        response = client.post("/calendar/feeds", json={"kind": kind, "id": subject_id}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+
+    def feed_path(self, feed):
+        return feed["url"].replace("http://testserver", "")
+
+    def create_request(self, client, headers, data, approve_headers=None):
+        response = client.post("/leave_requests", json=data, headers=headers)
+        leave_request_id = response.json()["id"]
+        if approve_headers:
+            client.put(f"/leave_requests/{leave_request_id}/status", json={"status": "approved"}, headers=approve_headers)
+        return leave_request_id
+
+    def timeoff(self, days=3, reason="Holiday"):
+        start = date.today() + timedelta(days=days)
+        return {"request_type": "timeoff", "start_date": start.isoformat(), "end_date": (start + timedelta(days=2)).isoformat(), "reason": reason}
+
+    def test_feed_requires_valid_token(self, client, auth_headers, test_user):
+        """Test that feeds open with their own token only"""
+        feed = self.create_feed(client, auth_headers, "user", test_user.id)
+
+        assert client.get(f"/calendar/user/{test_user.id}.ics").status_code == status.HTTP_404_NOT_FOUND
+        assert client.get(f"/calendar/user/{test_user.id}.ics?token=wrong").status_code == status.HTTP_404_NOT_FOUND
+        assert client.get(f"/calendar/user/{test_user.id + 1}.ics?token={feed['token']}").status_code == status.HTTP_404_NOT_FOUND
+        assert client.get(self.feed_path(feed)).status_code == status.HTTP_200_OK
+
+    def test_feed_creation_permissions(self, client, auth_headers, manager_headers, test_user, test_manager, test_unit):
+        """Test that users only get their own feed and managers any feed"""
+        assert client.post("/calendar/feeds", json={"kind": "user", "id": test_manager.id}, headers=auth_headers).status_code == 403
+        assert client.post("/calendar/feeds", json={"kind": "unit", "id": test_unit.id}, headers=auth_headers).status_code == 403
+        assert client.post("/calendar/feeds", json={"kind": "user", "id": test_user.id}).status_code == 401
+        self.create_feed(client, manager_headers, "user", test_user.id)
+        self.create_feed(client, manager_headers, "unit", test_unit.id)
+
+    def test_user_feed_events(self, client, auth_headers, manager_headers, test_user):
+        """Test that approved time off is all-day, permissions are timed and pending requests are left out"""
+        timeoff = self.timeoff()
+        start = datetime.combine(date.today() + timedelta(days=5), datetime.min.time()).replace(hour=9)
+        self.create_request(client, auth_headers, timeoff, manager_headers)
+        self.create_request(client, auth_headers, {
+            "request_type": "permission",
+            "start_datetime": start.isoformat(),
+            "end_datetime": (start + timedelta(hours=2)).isoformat(),
+            "reason": "Dentist, 2h"
+        }, manager_headers)
+        self.create_request(client, auth_headers, self.timeoff(days=20, reason="Pending"))
+        feed = self.create_feed(client, auth_headers, "user", test_user.id)
+
+        response = client.get(self.feed_path(feed))
+
+        assert response.headers["content-type"] == "text/calendar; charset=utf-8"
+        body = response.text
+        assert body.startswith("BEGIN:VCALENDAR\r\n") and body.endswith("END:VCALENDAR\r\n")
+        assert body.count("BEGIN:VEVENT") == 2
+        assert f"DTSTART;VALUE=DATE:{timeoff['start_date'].replace('-', '')}\r\n" in body
+        assert f"DTEND;VALUE=DATE:{timeoff['end_date'].replace('-', '')}\r\n" in body
+        assert f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}\r\n" in body
+        assert "DESCRIPTION:Dentist\\, 2h\r\n" in body
+        assert "Pending" not in body
+
+    def test_unit_feed_hides_reasons(self, client, auth_headers, manager_headers, test_unit):
+        """Test that the unit feed names people but not their reasons"""
+        self.create_request(client, auth_headers, self.timeoff(reason="Private"), manager_headers)
+        feed = self.create_feed(client, manager_headers, "unit", test_unit.id)
+
+        body = client.get(self.feed_path(feed)).text
+
+        assert "SUMMARY:Test User: Time off\r\n" in body
+        assert "X-WR-CALNAME:Leave - Test Unit\r\n" in body
+        assert "Private" not in body
+
+    def test_conditional_requests(self, client, auth_headers, manager_headers, test_user):
+        """Test ETag and Last-Modified revalidation"""
+        self.create_request(client, auth_headers, self.timeoff(), manager_headers)
+        path = self.feed_path(self.create_feed(client, auth_headers, "user", test_user.id))
+        first = client.get(path)
+
+        assert client.get(path, headers={"If-None-Match": first.headers["etag"]}).status_code == status.HTTP_304_NOT_MODIFIED
+        assert client.get(path, headers={"If-Modified-Since": first.headers["last-modified"]}).status_code == status.HTTP_304_NOT_MODIFIED
+        assert client.get(path, headers={"If-None-Match": '"other"'}).status_code == status.HTTP_200_OK
+
+    def test_if_modified_since_after_rename_and_archive(self, client, auth_headers, manager_headers, test_user, db_session, monkeypatch):
+        """Test that changes without a newer leave request row still fail If-Modified-Since"""
+        # The old request was the last one touched, so dropping it lowers the newest updated_at
+        self.create_request(client, auth_headers, self.timeoff(), manager_headers)
+        db_session.add(LeaveRequest(
+            user_id=test_user.id, request_type=RequestTypeEnum.timeoff, status=StatusEnum.approved,
+            start_date=date(2023, 5, 1), end_date=date(2023, 5, 2), updated_at=datetime.utcnow() + timedelta(hours=1)
+        ))
+        db_session.commit()
+        path = self.feed_path(self.create_feed(client, manager_headers, "unit", test_user.unit_id))
+        first = client.get(path)
+        assert first.text.count("BEGIN:VEVENT") == 2
+
+        test_user.name = "Renamed User"
+        db_session.commit()
+        assert archive_leave_requests(TestingSessionLocal, cutoff=date(2025, 1, 1), pause=0) == 1
+        # Render a second later, as Last-Modified has whole seconds
+        later = time.time() + 1
+        monkeypatch.setattr(api.calendar, "time", SimpleNamespace(time=lambda: later))
+
+        response = client.get(path, headers={"If-Modified-Since": first.headers["last-modified"]})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.text.count("BEGIN:VEVENT") == 1
+        assert "SUMMARY:Renamed User: Time off\r\n" in response.text
+        assert response.headers["last-modified"] != first.headers["last-modified"]
+
+    def test_feed_rendered_once_per_change(self, client, auth_headers, manager_headers, test_user, max_queries):
+        """Test that polls are served from the cache until a request is approved"""
+        path = self.feed_path(self.create_feed(client, auth_headers, "user", test_user.id))
+        first = client.get(path)
+        assert "BEGIN:VEVENT" not in first.text
+
+        # Token and body are both cached; only the version is read
+        with max_queries(1):
+            assert client.get(path).headers["etag"] == first.headers["etag"]
+
+        self.create_request(client, auth_headers, self.timeoff(), manager_headers)
+        second = client.get(path)
+
+        assert second.headers["etag"] != first.headers["etag"]
+        assert second.text.count("BEGIN:VEVENT") == 1
+
+    def test_revoked_feed(self, client, auth_headers, test_user):
+        """Test that revoking a feed disables its URLs"""
+        path = self.feed_path(self.create_feed(client, auth_headers, "user", test_user.id))
+
+        response = client.delete(f"/calendar/feeds/user/{test_user.id}", headers=auth_headers)
+
+        assert response.json() == {"revoked": 1}
+        assert client.get(path).status_code == status.HTTP_404_NOT_FOUND
+
+    def test_fold_keeps_utf8_characters_whole(self):
+        """Test that long lines are folded at 75 octets without splitting characters"""
+        folded = fold("SUMMARY:" + "é" * 60)
+
+        lines = folded.split(b"\r\n ")
+        assert all(len(line.rstrip(b"\r\n")) <= 75 for line in lines)
+        assert b"".join(lines).decode() == "SUMMARY:" + "é" * 60 + "\r\n"
@@ -0,0 +1,132 @@
+import asyncio
+import pytest
+import orjson
+from fastapi import status
+from datetime import date, datetime, timedelta
+from models.leave_requests import LeaveRequestChange
+from change_feed import read_changes, change_events
+
+class TestChangeFeed:
+    """Test the leave request change feed and its SSE stream"""
+
+    def create_request(self, client, headers, days=3):
+        start = date.today() + timedelta(days=days)
+        response = client.post("/leave_requests", json={
+            "request_type": "timeoff",
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=1)).isoformat()
+        }, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()["id"]
+
+    def add_change(self, db_session, change_id, created_at):
+        db_session.add(LeaveRequestChange(id=change_id, leave_request_id=1, user_id=1, change_type="created",
+                                          payload="{}", created_at=created_at))
+        db_session.commit()
+
+    def test_changes_requires_manager(self, client, auth_headers):
+        """Test that the feed is for managers only"""
+        assert client.get("/changes").status_code == status.HTTP_401_UNAUTHORIZED
+        assert client.get("/changes", headers=auth_headers).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_changes_follow_creates_and_reviews(self, client, auth_headers, manager_headers, test_user):
+        """Test that creates and status changes appear once, in order, and resume from the cursor"""
+        leave_request_id = self.create_request(client, auth_headers)
+        client.put(f"/leave_requests/{leave_request_id}/status", json={"status": "approved"}, headers=manager_headers)
+
+        body = client.get("/changes?since=0", headers=manager_headers).json()
+
+        assert [(change["type"], change["leave_request"]["status"]) for change in body["changes"]] == [
+            ("created", "pending"), ("status_changed", "approved")
+        ]
+        assert body["changes"][0]["leave_request_id"] == leave_request_id
+        assert body["changes"][0]["user_id"] == test_user.id
+        assert body["next_cursor"] == body["changes"][-1]["cursor"]
+
+        # Resuming from the stored cursor returns only what happened since
+        assert client.get(f"/changes?since={body['next_cursor']}", headers=manager_headers).json()["changes"] == []
+        new_id = self.create_request(client, auth_headers, days=10)
+        later = client.get(f"/changes?since={body['next_cursor']}", headers=manager_headers).json()
+        assert [change["leave_request_id"] for change in later["changes"]] == [new_id]
+
+    def test_changes_rejected_transition_not_recorded(self, client, auth_headers, manager_headers):
+        """Test that a failed status change leaves no change behind"""
+        leave_request_id = self.create_request(client, auth_headers)
+        client.put(f"/leave_requests/{leave_request_id}/status", json={"status": "approved"}, headers=manager_headers)
+        response = client.put(f"/leave_requests/{leave_request_id}/status", json={"status": "rejected"}, headers=manager_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        assert client.get("/changes", headers=manager_headers).json()["count"] == 2
+
+    def test_changes_batches(self, client, auth_headers, manager_headers):
+        """Test limit and has_more"""
+        for days in range(3, 6):
+            self.create_request(client, auth_headers, days)
+
+        first = client.get("/changes?limit=2", headers=manager_headers).json()
+        rest = client.get(f"/changes?limit=2&since={first['next_cursor']}", headers=manager_headers).json()
+
+        assert (first["count"], first["has_more"]) == (2, True)
+        assert (rest["count"], rest["has_more"]) == (1, False)
+
+    def test_changes_long_poll_times_out_empty(self, client, manager_headers):
+        """Test that ?wait= returns an empty batch at the same cursor when nothing happens"""
+        response = client.get("/changes?since=0&wait=0.2", headers=manager_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["changes"] == []
+        assert response.json()["next_cursor"] == 0
+
+    def test_read_changes_waits_at_recent_gap(self, db_session):
+        """Test that reading stops before a missing id until the change after it has settled"""
+        now = datetime.utcnow()
+        self.add_change(db_session, 1, now - timedelta(seconds=1))
+        self.add_change(db_session, 3, now - timedelta(seconds=1))
+
+        changes, cursor = read_changes(db_session, 0, 100, now=now)
+        assert [change["cursor"] for change in changes] == [1]
+        assert cursor == 1
+
+        # Id 2 commits late: it is delivered before 3
+        self.add_change(db_session, 2, now)
+        changes, cursor = read_changes(db_session, 1, 100, now=now)
+        assert [change["cursor"] for change in changes] == [2, 3]
+
+    def test_read_changes_skips_settled_gap(self, db_session):
+        """Test that a gap older than the grace period (a rollback) no longer blocks the feed"""
+        now = datetime.utcnow()
+        self.add_change(db_session, 1, now - timedelta(minutes=5))
+        self.add_change(db_session, 3, now - timedelta(minutes=5))
+
+        changes, cursor = read_changes(db_session, 0, 100, now=now)
+
+        assert [change["cursor"] for change in changes] == [1, 3]
+        assert cursor == 3
+
+    def test_stream_rejects_invalid_last_event_id(self, client, manager_headers):
+        """Test that a malformed Last-Event-ID is refused before streaming"""
+        response = client.get("/changes/stream", headers={**manager_headers, "Last-Event-ID": "abc"})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_change_events(self):
+        """Test that the stream sends each change as an event with its cursor as id, then stops on disconnect"""
+        batches = [([{"cursor": 7, "type": "created", "leave_request_id": 3}], 7), ([], 7)]
+        cursors = []
+
+        async def read_batch(since):
+            cursors.append(since)
+            return batches.pop(0)
+
+        async def is_disconnected():
+            return not batches
+
+        async def collect():
+            return [event async for event in change_events(read_batch, 6, is_disconnected)]
+
+        events = asyncio.run(collect())
+
+        assert events[0] == b"retry: 3000\n\n"
+        assert events[1].startswith(b"id: 7\nevent: created\ndata: ")
+        assert orjson.loads(events[1].split(b"data: ")[1])["leave_request_id"] == 3
+        assert cursors == [6, 7]
@@ -0,0 +1,74 @@
+import pytest
+from datetime import date, datetime, timedelta
+from fastapi import status
+from sqlalchemy import update
+from benchmarks.directory_memory import measure
+from directory import directory
+from models.leave_requests import LeaveRequest, RequestTypeEnum, StatusEnum, Unit, User
+from tests.conftest import TestingSessionLocal
+
+class TestDirectory:
+    """Test the in-memory user and unit directory"""
+    
+    def test_list_reads_users_from_directory(self, client, db_session, test_user, manager_headers, max_queries):
+        """Test that the leave request list fills in user data without joining users"""
+        db_session.add(LeaveRequest(
+            user_id=test_user.id, request_type=RequestTypeEnum.timeoff, status=StatusEnum.pending,
+            start_date=date.today() + timedelta(days=1), end_date=date.today() + timedelta(days=2)
+        ))
+        db_session.commit()
+        directory.load(TestingSessionLocal)
+        client.get("/profile", headers=manager_headers)
+        
+        # The version, then the list
+        with max_queries(2) as statements:
+            response = client.get("/leave_requests", headers=manager_headers)
+        
+        assert response.status_code == status.HTTP_200_OK
+        row = response.json()["leave_requests"][0]
+        assert (row["user_name"], row["user_email"]) == (test_user.name, test_user.email)
+        assert "users" not in statements[1].split(" FROM ")[1]
+    
+    def test_committed_changes_update_directory(self, client, db_session, test_user):
+        """Test that registrations and user changes reach the directory once committed"""
+        response = client.post("/register", json={"name": "New User", "email": "newuser@example.com", "password": "testpassword123"})
+        user_id = response.json()["user_id"]
+        
+        assert directory.users[user_id].name == "New User"
+        
+        test_user.role = "manager"
+        db_session.commit()
+        assert directory.users[test_user.id].role == "manager"
+    
+    def test_rolled_back_changes_ignored(self, db_session, test_user):
+        """Test that a rolled back change never reaches the directory"""
+        directory.get_user(test_user.id, db_session)
+        test_user.name = "Renamed"
+        db_session.flush()
+        db_session.rollback()
+        
+        assert directory.users[test_user.id].name == "Test User"
+    
+    def test_catch_up_applies_changes_made_elsewhere(self, db_session, test_user, test_unit):
+        """Test that catching up reloads users and units changed after the last load"""
+        directory.load(TestingSessionLocal)
+        later = datetime.utcnow() + timedelta(seconds=1)
+        db_session.execute(update(User).where(User.id == test_user.id).values(name="Renamed", updated_at=later))
+        db_session.execute(update(Unit).where(Unit.id == test_unit.id).values(name="Renamed Unit", updated_at=later))
+        db_session.commit()
+        
+        directory.catch_up(db_session, later, later)
+        
+        assert directory.users[test_user.id].name == "Renamed"
+        assert directory.units[test_unit.id] == "Renamed Unit"
+        assert directory.users_through == later
+    
+    def test_profile_unit_name(self, client, auth_headers, test_unit):
+        """Test that the profile carries the user's unit name"""
+        response = client.get("/profile", headers=auth_headers)
+        
+        assert response.json()["unit_name"] == test_unit.name
+    
+    def test_memory_per_10k_users(self):
+        """Test that 10k users fit in a few MiB"""
+        assert measure(10000) < 4 * 1024 * 1024
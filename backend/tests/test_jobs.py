@@ -0,0 +1,124 @@
+import pytest
+from datetime import date, datetime, timedelta
+from models.leave_requests import User, EmailVerificationToken, LeaveRequest, LeaveRequestArchive, LeaveRequestChange, RequestTypeEnum, StatusEnum
+from api.leave_requests import leave_requests_version
+from jobs.purge_expired import purge_expired_tokens, purge_stale_accounts
+from jobs.archive_leave_requests import archive_leave_requests, archive_cutoff
+from jobs.backfill_leave_intervals import backfill_leave_intervals
+from tests.conftest import TestingSessionLocal
+
+class TestPurgeExpired:
+    """Test the confirmation token and stale account purge job"""
+    
+    def add_user(self, db_session, email, validated, created_at, token_expires_at=None):
+        user = User(name="Purge User", email=email, role="user", validated=validated, created_at=created_at)
+        db_session.add(user)
+        db_session.flush()
+        if token_expires_at:
+            db_session.add(EmailVerificationToken(token_hash=email.ljust(64, "0"), user_id=user.id, expires_at=token_expires_at))
+        db_session.commit()
+        return user.id
+    
+    def test_purge_expired_tokens_in_batches(self, db_session):
+        """Test that only expired tokens are deleted, across several batches"""
+        now = datetime.utcnow()
+        for i in range(5):
+            self.add_user(db_session, f"expired{i}@example.com", False, now, now - timedelta(hours=1))
+        self.add_user(db_session, "live@example.com", False, now, now + timedelta(hours=1))
+        
+        assert purge_expired_tokens(TestingSessionLocal, batch_size=2, pause=0) == 5
+        assert db_session.query(EmailVerificationToken).count() == 1
+    
+    def test_purge_stale_accounts(self, db_session):
+        """Test that old unvalidated accounts without a live token are removed"""
+        old = datetime.utcnow() - timedelta(days=30)
+        stale_id = self.add_user(db_session, "stale@example.com", False, old)
+        pending_id = self.add_user(db_session, "pending@example.com", False, old, datetime.utcnow() + timedelta(hours=1))
+        validated_id = self.add_user(db_session, "validated@example.com", True, old)
+        recent_id = self.add_user(db_session, "recent@example.com", False, datetime.utcnow())
+        
+        assert purge_stale_accounts(TestingSessionLocal, stale_days=7, pause=0) == 1
+        
+        remaining = {user_id for (user_id,) in db_session.query(User.id).all()}
+        assert stale_id not in remaining
+        assert {pending_id, validated_id, recent_id} <= remaining
+
+class TestArchiveLeaveRequests:
+    """Test the job moving past reviewed leave requests to the archive"""
+    
+    def add_request(self, db_session, user_id, end, status=StatusEnum.approved):
+        if isinstance(end, datetime):
+            leave_request = LeaveRequest(user_id=user_id, request_type=RequestTypeEnum.permission, status=status,
+                                         start_datetime=end - timedelta(hours=2), end_datetime=end)
+        else:
+            leave_request = LeaveRequest(user_id=user_id, request_type=RequestTypeEnum.timeoff, status=status,
+                                         start_date=end - timedelta(days=1), end_date=end)
+        db_session.add(leave_request)
+        db_session.commit()
+        return leave_request.id
+    
+    def test_archive_cutoff(self):
+        """Test that last year stays hot by default"""
+        assert archive_cutoff(date(2026, 10, 19)) == date(2025, 1, 1)
+        assert archive_cutoff(date(2026, 1, 1), after_years=0) == date(2026, 1, 1)
+    
+    def test_moves_reviewed_requests_before_cutoff_in_batches(self, db_session, test_user):
+        """Test that old reviewed requests move with their ids, and pending or recent ones stay"""
+        cutoff = date(2025, 1, 1)
+        old_ids = [
+            self.add_request(db_session, test_user.id, date(2023, 5, 2)),
+            self.add_request(db_session, test_user.id, date(2024, 12, 31), StatusEnum.rejected),
+            self.add_request(db_session, test_user.id, datetime(2024, 6, 1, 12)),
+        ]
+        pending_id = self.add_request(db_session, test_user.id, date(2023, 5, 2), StatusEnum.pending)
+        recent_id = self.add_request(db_session, test_user.id, date(2025, 1, 1))
+        
+        assert archive_leave_requests(TestingSessionLocal, cutoff=cutoff, batch_size=2, pause=0) == 3
+        
+        db_session.expire_all()
+        assert {row.id for row in db_session.query(LeaveRequest.id)} == {pending_id, recent_id}
+        archived = {row.id: row for row in db_session.query(LeaveRequestArchive)}
+        assert set(archived) == set(old_ids)
+        assert archived[old_ids[1]].status == StatusEnum.rejected
+        assert archived[old_ids[2]].period_end == date(2024, 6, 1)
+        assert archived[old_ids[2]].end_datetime == datetime(2024, 6, 1, 12)
+        
+        # A second pass has nothing left to move
+        assert archive_leave_requests(TestingSessionLocal, cutoff=cutoff, pause=0) == 0
+    
+    def test_archiving_moves_list_versions(self, db_session, test_user):
+        """Test that moved requests change the versions every worker keys its cached lists by"""
+        leave_request_id = self.add_request(db_session, test_user.id, date(2023, 5, 2))
+        before = leave_requests_version(db_session, None), leave_requests_version(db_session, test_user.id)
+        db_session.commit()
+        
+        assert archive_leave_requests(TestingSessionLocal, cutoff=date(2025, 1, 1), pause=0) == 1
+        
+        change = db_session.query(LeaveRequestChange).one()
+        assert (change.change_type, change.leave_request_id) == ("archived", leave_request_id)
+        assert leave_requests_version(db_session, None) != before[0]
+        assert leave_requests_version(db_session, test_user.id) != before[1]
+
+class TestBackfillLeaveIntervals:
+    """Test the starts_at/ends_at backfill for requests written before those columns"""
+    
+    def test_backfill_leave_intervals(self, db_session, test_user):
+        """Test that missing intervals are filled in batches and updated_at is kept"""
+        written = datetime(2024, 1, 2, 3, 4, 5)
+        timeoff = LeaveRequest(user_id=test_user.id, request_type=RequestTypeEnum.timeoff,
+                               start_date=date(2024, 5, 6), end_date=date(2024, 5, 8))
+        permission = LeaveRequest(user_id=test_user.id, request_type=RequestTypeEnum.permission,
+                                  start_datetime=datetime(2024, 5, 6, 9), end_datetime=datetime(2024, 5, 6, 11))
+        db_session.add_all([timeoff, permission])
+        db_session.commit()
+        # As left by upgrades/006 on rows written before it
+        db_session.execute(LeaveRequest.__table__.update().values(starts_at=None, ends_at=None, updated_at=written))
+        db_session.commit()
+        
+        assert backfill_leave_intervals(TestingSessionLocal, batch_size=1, pause=0) == 2
+        
+        db_session.expire_all()
+        assert (timeoff.starts_at, timeoff.ends_at) == (datetime(2024, 5, 6), datetime(2024, 5, 8))
+        assert (permission.starts_at, permission.ends_at) == (datetime(2024, 5, 6, 9), datetime(2024, 5, 6, 11))
+        assert timeoff.updated_at == written
+        assert backfill_leave_intervals(TestingSessionLocal, pause=0) == 0
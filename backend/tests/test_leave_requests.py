@@ -277,3 +277,326 @@ class TestLeaveRequests:
             "status": "rejected"
         }, headers=manager_headers)
         assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_get_leave_requests_etag_not_modified(self, client, auth_headers, test_user, db_session):
+        """Test that a matching If-None-Match returns 304 without a body"""
+        leave_request = LeaveRequest(
+            user_id=test_user.id,
+            request_type=RequestTypeEnum.timeoff,
+            start_date=date.today(),
+            end_date=date.today() + timedelta(days=1),
+            reason="Vacation"
+        )
+        db_session.add(leave_request)
+        db_session.commit()
+        
+        response = client.get("/leave_requests", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        etag = response.headers["ETag"]
+        
+        response = client.get("/leave_requests", headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+    
+    def test_get_leave_requests_etag_changes_on_update(self, client, manager_headers, test_user, db_session):
+        """Test that creating or reviewing a request invalidates the list ETag"""
+        leave_request = LeaveRequest(
+            user_id=test_user.id,
+            request_type=RequestTypeEnum.timeoff,
+            start_date=date.today(),
+            end_date=date.today() + timedelta(days=1),
+            reason="Vacation"
+        )
+        db_session.add(leave_request)
+        db_session.commit()
+        
+        etag = client.get("/leave_requests", headers=manager_headers).headers["ETag"]
+        
+        client.put(f"/leave_requests/{leave_request.id}/status", json={"status": "approved"}, headers=manager_headers)
+        
+        response = client.get("/leave_requests", headers={**manager_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+        assert response.json()["leave_requests"][0]["status"] == "approved"
+    
+    def test_get_leave_requests_sparse_fields(self, client, auth_headers, test_user, db_session):
+        """Test that ?fields= limits each row to the requested fields plus id"""
+        leave_request = LeaveRequest(
+            user_id=test_user.id,
+            request_type=RequestTypeEnum.timeoff,
+            start_date=date.today(),
+            end_date=date.today() + timedelta(days=1),
+            reason="Vacation"
+        )
+        db_session.add(leave_request)
+        db_session.commit()
+        
+        response = client.get("/leave_requests?fields=status,start_date", headers=auth_headers)
+        
+        assert response.status_code == status.HTTP_200_OK
+        row = response.json()["leave_requests"][0]
+        assert row == {"id": leave_request.id, "start_date": date.today().isoformat(), "status": "pending"}
+    
+    def test_get_leave_requests_unknown_field(self, client, auth_headers):
+        """Test that unknown fields are rejected"""
+        response = client.get("/leave_requests?fields=status,password_hash", headers=auth_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "password_hash" in response.json()["detail"]
+    
+    def test_get_leave_requests_users_table(self, client, manager_headers, test_manager, test_user, db_session):
+        """Test that ?users=table returns requesters once in a side table"""
+        db_session.add_all([
+            LeaveRequest(
+                user_id=test_user.id,
+                request_type=RequestTypeEnum.timeoff,
+                start_date=date.today(),
+                end_date=date.today() + timedelta(days=1),
+                reason="Vacation"
+            ),
+            LeaveRequest(
+                user_id=test_user.id,
+                request_type=RequestTypeEnum.timeoff,
+                start_date=date.today() + timedelta(days=7),
+                end_date=date.today() + timedelta(days=8),
+                reason="Wedding"
+            )
+        ])
+        db_session.commit()
+        
+        response = client.get("/leave_requests?users=table", headers=manager_headers)
+        
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert len(data["leave_requests"]) == 2
+        for row in data["leave_requests"]:
+            assert row["user_id"] == test_user.id
+            assert "user_name" not in row
+            assert "user_email" not in row
+        assert data["users"] == {str(test_user.id): {"name": test_user.name, "email": test_user.email}}
+    
+    def test_get_leave_requests_query_budget(self, client, manager_headers, test_user, db_session, max_queries):
+        """Test that the list runs a fixed number of queries regardless of its length"""
+        db_session.add_all([
+            LeaveRequest(
+                user_id=test_user.id,
+                request_type=RequestTypeEnum.timeoff,
+                start_date=date.today() + timedelta(days=offset),
+                end_date=date.today() + timedelta(days=offset + 1),
+                reason="Vacation"
+            )
+            for offset in range(10)
+        ])
+        db_session.commit()
+        
+        # Token version lookup and the list itself
+        from directory import directory
+        from tests.conftest import TestingSessionLocal
+        
+        # Token check, version and list; names come from the directory, loaded on startup
+        directory.load(TestingSessionLocal)
+        with max_queries(3):
+            response = client.get("/leave_requests", headers=manager_headers)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()["leave_requests"]) == 10
+        assert int(response.headers["X-DB-Queries"]) <= 3
+    
+    def test_update_request_status_single_statement(self, client, manager_headers, test_user, db_session, max_queries):
+        """Test that a status transition is one conditional UPDATE plus its change feed entry, with nothing read back"""
+        leave_request = LeaveRequest(
+            user_id=test_user.id,
+            request_type=RequestTypeEnum.timeoff,
+            start_date=date.today() + timedelta(days=1),
+            end_date=date.today() + timedelta(days=2),
+            reason="Test"
+        )
+        db_session.add(leave_request)
+        db_session.commit()
+        client.get("/profile", headers=manager_headers)
+        
+        with max_queries(2) as statements:
+            response = client.put(f"/leave_requests/{leave_request.id}/status", json={"status": "rejected"}, headers=manager_headers)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["status"] == "rejected"
+        assert response.json()["start_date"] == leave_request.start_date.isoformat()
+        assert statements[0].startswith("UPDATE leave_requests")
+        assert "WHERE leave_requests.id = ? AND leave_requests.status = ?" in statements[0]
+        assert statements[1].startswith("INSERT INTO leave_request_changes")
+    
+    def test_create_leave_request_single_statement(self, client, auth_headers, max_queries):
+        """Test that creating a request is one INSERT plus its change feed entry, with nothing read back"""
+        client.get("/profile", headers=auth_headers)
+        start = date.today() + timedelta(days=3)
+        
+        with max_queries(2) as statements:
+            response = client.post("/leave_requests", json={
+                "request_type": "timeoff",
+                "start_date": start.isoformat(),
+                "end_date": (start + timedelta(days=1)).isoformat()
+            }, headers=auth_headers)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["id"] is not None
+        assert statements[0].startswith("INSERT INTO leave_requests")
+        assert statements[1].startswith("INSERT INTO leave_request_changes")
+    
+    def test_get_leave_requests_include_archived(self, client, auth_headers, test_user, db_session):
+        """Test that archived requests are left out unless include_archived is set"""
+        from jobs.archive_leave_requests import archive_leave_requests
+        from tests.conftest import TestingSessionLocal
+        
+        for year in (2020, date.today().year):
+            db_session.add(LeaveRequest(
+                user_id=test_user.id,
+                request_type=RequestTypeEnum.timeoff,
+                start_date=date(year, 3, 1),
+                end_date=date(year, 3, 2),
+                status=StatusEnum.approved
+            ))
+        db_session.commit()
+        assert client.get("/leave_requests", headers=auth_headers).json()["count"] == 2
+        
+        assert archive_leave_requests(TestingSessionLocal, pause=0) == 1
+        
+        response = client.get("/leave_requests", headers=auth_headers)
+        assert response.json()["count"] == 1
+        assert response.json()["leave_requests"][0]["start_date"] == date(date.today().year, 3, 1).isoformat()
+        
+        response = client.get("/leave_requests?include_archived=true&since=2020-01-01&fields=start_date,status", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert sorted(item["start_date"] for item in response.json()["leave_requests"]) == [
+            "2020-03-01", date(date.today().year, 3, 1).isoformat()
+        ]
+    
+    def test_include_archived_reads_requested_years(self, client, auth_headers, test_user, db_session, max_queries):
+        """Test that archive reads are bounded by period_end, by default to the last INCLUDE_ARCHIVED_YEARS years"""
+        from jobs.archive_leave_requests import archive_leave_requests
+        from tests.conftest import TestingSessionLocal
+        
+        last_year = date.today().year - 1
+        for year in (2020, last_year):
+            db_session.add(LeaveRequest(
+                user_id=test_user.id,
+                request_type=RequestTypeEnum.timeoff,
+                start_date=date(year, 3, 1),
+                end_date=date(year, 3, 2),
+                status=StatusEnum.approved
+            ))
+        db_session.commit()
+        assert archive_leave_requests(TestingSessionLocal, cutoff=date(date.today().year, 1, 1), pause=0) == 2
+        
+        with max_queries(3) as statements:
+            response = client.get("/leave_requests?include_archived=true&fields=start_date", headers=auth_headers)
+        assert [item["start_date"] for item in response.json()["leave_requests"]] == [date(last_year, 3, 1).isoformat()]
+        assert "leave_requests_archive.period_end >=" in statements[-1]
+        
+        response = client.get(f"/leave_requests?include_archived=true&since={last_year + 1}-01-01", headers=auth_headers)
+        assert response.json()["count"] == 0
+    
+    def test_update_request_status_archived(self, client, manager_headers, test_user, db_session):
+        """Test that reviewing an archived request reports its status instead of 404"""
+        from jobs.archive_leave_requests import archive_leave_requests
+        from tests.conftest import TestingSessionLocal
+        
+        leave_request = LeaveRequest(
+            user_id=test_user.id,
+            request_type=RequestTypeEnum.permission,
+            start_datetime=datetime(2020, 3, 1, 9),
+            end_datetime=datetime(2020, 3, 1, 11),
+            status=StatusEnum.rejected
+        )
+        db_session.add(leave_request)
+        db_session.commit()
+        archive_leave_requests(TestingSessionLocal, pause=0)
+        
+        response = client.put(f"/leave_requests/{leave_request.id}/status", json={"status": "approved"}, headers=manager_headers)
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "rejected" in response.json()["detail"]
+    
+    def test_leave_request_interval_set_on_write(self, client, auth_headers, db_session):
+        """Test that both request types get a normalized [starts_at, ends_at) interval"""
+        start = date.today() + timedelta(days=3)
+        timeoff = client.post("/leave_requests", json={
+            "request_type": "timeoff",
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=2)).isoformat()
+        }, headers=auth_headers).json()
+        starts = datetime.combine(start, datetime.min.time()) + timedelta(hours=9)
+        permission = client.post("/leave_requests", json={
+            "request_type": "permission",
+            "start_datetime": starts.isoformat(),
+            "end_datetime": (starts + timedelta(hours=2)).isoformat()
+        }, headers=auth_headers).json()
+        
+        timeoff_row = db_session.get(LeaveRequest, timeoff["id"])
+        permission_row = db_session.get(LeaveRequest, permission["id"])
+        assert (timeoff_row.starts_at, timeoff_row.ends_at) == (
+            datetime.combine(start, datetime.min.time()), datetime.combine(start + timedelta(days=2), datetime.min.time())
+        )
+        assert (permission_row.starts_at, permission_row.ends_at) == (starts, starts + timedelta(hours=2))
+    
+    def test_get_away(self, client, manager_headers, auth_headers, test_user, test_manager, db_session, max_queries):
+        """Test that away returns approved requests overlapping [start, end) in one query after the version"""
+        day = date.today() + timedelta(days=10)
+        midnight = datetime.combine(day, datetime.min.time())
+        requests = {
+            "timeoff": LeaveRequest(user_id=test_user.id, request_type=RequestTypeEnum.timeoff, status=StatusEnum.approved,
+                                    start_date=day - timedelta(days=2), end_date=day + timedelta(days=1)),
+            "permission": LeaveRequest(user_id=test_manager.id, request_type=RequestTypeEnum.permission, status=StatusEnum.approved,
+                                       start_datetime=midnight + timedelta(hours=14), end_datetime=midnight + timedelta(hours=16)),
+            "pending": LeaveRequest(user_id=test_user.id, request_type=RequestTypeEnum.permission, status=StatusEnum.pending,
+                                    start_datetime=midnight + timedelta(hours=9), end_datetime=midnight + timedelta(hours=10)),
+            "ended_before": LeaveRequest(user_id=test_user.id, request_type=RequestTypeEnum.timeoff, status=StatusEnum.approved,
+                                         start_date=day - timedelta(days=3), end_date=day),
+            "rejected": LeaveRequest(user_id=test_user.id, request_type=RequestTypeEnum.timeoff, status=StatusEnum.rejected,
+                                     start_date=day, end_date=day + timedelta(days=1)),
+        }
+        db_session.add_all(requests.values())
+        db_session.commit()
+        period = {"start": midnight.isoformat(), "end": (midnight + timedelta(days=1)).isoformat()}
+        client.get("/profile", headers=manager_headers)
+        
+        with max_queries(2):
+            response = client.get("/leave_requests/away", params=period, headers=manager_headers)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [entry["leave_request_id"] for entry in response.json()["away"]] == [
+            requests["timeoff"].id, requests["permission"].id
+        ]
+        assert response.json()["away"][1]["user_name"] == "Test Manager"
+        
+        with_pending = client.get("/leave_requests/away", params={**period, "include_pending": "true"}, headers=manager_headers)
+        assert with_pending.json()["count"] == 3
+        
+        own = client.get("/leave_requests/away", params=period, headers=auth_headers)
+        assert [entry["leave_request_id"] for entry in own.json()["away"]] == [requests["timeoff"].id]
+        
+        empty = client.get("/leave_requests/away", params={"start": period["end"], "end": period["start"]}, headers=manager_headers)
+        assert empty.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_get_away_etag(self, client, manager_headers, auth_headers, test_user, db_session, max_queries):
+        """Test that a repeated away poll is answered from its version alone, until a request changes"""
+        day = date.today() + timedelta(days=10)
+        period = {"start": datetime.combine(day, datetime.min.time()).isoformat(), "end": datetime.combine(day + timedelta(days=1), datetime.min.time()).isoformat()}
+        first = client.get("/leave_requests/away", params=period, headers=manager_headers)
+        etag = first.headers["ETag"]
+        
+        with max_queries(1):
+            response = client.get("/leave_requests/away", params=period, headers={**manager_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        
+        # Another period is another response
+        other = client.get("/leave_requests/away", params={**period, "include_pending": "true"}, headers=manager_headers)
+        assert other.headers["ETag"] != etag
+        
+        client.post("/leave_requests", headers=auth_headers, json={
+            "request_type": "timeoff",
+            "start_date": day.isoformat(),
+            "end_date": (day + timedelta(days=1)).isoformat()
+        })
+        response = client.get("/leave_requests/away", params=period, headers={**manager_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
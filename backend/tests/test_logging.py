@@ -0,0 +1,79 @@
+import io
+import json
+import logging
+import queue
+import pytest
+from fastapi import status
+from logging_setup import (
+    CorrelationFilter, JsonFormatter, NonBlockingQueueHandler, SamplingFilter,
+    parse_sampling, request_id_var, user_id_var
+)
+
+@pytest.fixture
+def json_logger():
+    """Logger writing JSON lines with correlation ids to a string buffer"""
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.addFilter(CorrelationFilter())
+    handler.setFormatter(JsonFormatter())
+    logger = logging.getLogger("tests.json_logger")
+    logger.addHandler(handler)
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    yield logger, stream
+    logger.removeHandler(handler)
+
+class TestLogging:
+    """Test structured logging and request correlation"""
+    
+    def test_request_id_generated(self, client):
+        """Test that every response carries a request id"""
+        response = client.get("/health")
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.headers["X-Request-ID"]) == 32
+    
+    def test_request_id_propagated(self, client):
+        """Test that a well-formed incoming request id is reused and a malformed one replaced"""
+        response = client.get("/health", headers={"X-Request-ID": "lb-1234-abcd"})
+        assert response.headers["X-Request-ID"] == "lb-1234-abcd"
+        
+        response = client.get("/health", headers={"X-Request-ID": "bad id\nwith newline"})
+        assert response.headers["X-Request-ID"] != "bad id\nwith newline"
+    
+    def test_json_record_correlation(self, json_logger):
+        """Test that records carry the context's request/user ids and extra fields"""
+        logger, stream = json_logger
+        request_token = request_id_var.set("req-1")
+        user_token = user_id_var.set(7)
+        try:
+            logger.info("Sent notification", extra={"leave_request_id": 42})
+        finally:
+            request_id_var.reset(request_token)
+            user_id_var.reset(user_token)
+        
+        entry = json.loads(stream.getvalue())
+        assert entry["message"] == "Sent notification"
+        assert entry["level"] == "INFO"
+        assert (entry["request_id"], entry["user_id"]) == ("req-1", 7)
+        assert entry["leave_request_id"] == 42
+    
+    def test_sampling_filter(self):
+        """Test that sampling drops sub-warning records of configured loggers only"""
+        sampling = SamplingFilter(parse_sampling("noisy=0.0"))
+        
+        def record(name, level):
+            return logging.LogRecord(name, level, __file__, 1, "message", None, None)
+        
+        assert not sampling.filter(record("noisy.child", logging.INFO))
+        assert sampling.filter(record("noisy.child", logging.WARNING))
+        assert sampling.filter(record("quiet", logging.INFO))
+    
+    def test_queue_full_drops_records(self):
+        """Test that a full queue drops records instead of blocking the caller"""
+        handler = NonBlockingQueueHandler(queue.Queue(1))
+        for _ in range(3):
+            handler.handle(logging.LogRecord("tests", logging.INFO, __file__, 1, "message", None, None))
+        
+        assert handler.queue.qsize() == 1
+        assert handler.dropped == 2
@@ -1,5 +1,12 @@
+import logging
 import pytest
 from fastapi import status
+from sqlalchemy import create_engine
+from health import health_monitor, HealthMonitor
+import database
+import api.health
+import logging_setup
+from tests.conftest import engine
 
 class TestMain:
     """Test main application endpoints"""
@@ -35,3 +42,109 @@ class TestMain:
         assert "openapi" in data
         assert "info" in data
         assert "paths" in data
+        assert "/webhooks" in data["paths"]
+        assert "/calendar/user/{user_id}.ics" in data["paths"]
+
+class TestReadiness:
+    """Test the readiness endpoint"""
+    
+    @pytest.fixture
+    def monitor(self, tmp_path):
+        """Global health monitor with a test drain file, restored after the test"""
+        saved = dict(vars(health_monitor))
+        health_monitor.drain_file = str(tmp_path / "drain")
+        yield health_monitor
+        vars(health_monitor).update(saved)
+    
+    def test_ready(self, client, monitor):
+        """Test that a worker with a reachable database is ready"""
+        monitor.probe_database(engine)
+        response = client.get("/ready")
+        
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["ready"] is True
+        assert data["database"]["reachable"] is True
+    
+    def test_not_ready_without_probe(self, client, monitor):
+        """Test that a worker is not ready before the first database probe"""
+        monitor.database_checked_at = None
+        response = client.get("/ready")
+        
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.json()["checks"]["database"] is False
+    
+    def test_not_ready_when_database_unreachable(self, client, monitor):
+        """Test that a failed probe makes the worker not ready"""
+        monitor.probe_database(create_engine("sqlite:////nonexistent/dir/db.sqlite"))
+        response = client.get("/ready")
+        
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.json()["database"]["error"]
+    
+    def test_not_ready_when_draining(self, client, monitor):
+        """Test that draining flips readiness while /health stays up"""
+        monitor.probe_database(engine)
+        monitor.start_draining()
+        
+        assert client.get("/ready").status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert client.get("/health").status_code == status.HTTP_200_OK
+    
+    def test_drain_requires_token(self, client, monitor, monkeypatch):
+        """Test that only callers holding DRAIN_TOKEN can put the server into draining"""
+        assert client.post("/drain", headers={"X-Drain-Token": ""}).status_code == status.HTTP_403_FORBIDDEN
+        
+        monkeypatch.setattr(api.health, "DRAIN_TOKEN", "drain-secret")
+        assert client.post("/drain").status_code == status.HTTP_403_FORBIDDEN
+        assert client.post("/drain", headers={"X-Drain-Token": "wrong"}).status_code == status.HTTP_403_FORBIDDEN
+        assert monitor.is_draining() is False
+        
+        response = client.post("/drain", headers={"X-Drain-Token": "drain-secret"})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert monitor.is_draining() is True
+    
+    def test_drain_reaches_every_worker(self, client, monitor):
+        """Test that draining one worker makes the other workers of the server report not ready too"""
+        monitor.probe_database(engine)
+        other_worker = HealthMonitor(lambda: engine, drain_file=monitor.drain_file)
+        other_worker.probe_database(engine)
+        
+        monitor.start_draining()
+        
+        assert other_worker.status()["ready"] is False
+        assert other_worker.status()["draining"] is True
+        
+        # A new server start clears the flag left behind
+        other_worker.reset_draining()
+        monitor.draining = False
+        assert client.get("/ready").status_code == status.HTTP_200_OK
+
+class TestWorkerFork:
+    """Test the per-worker reinitialization run by gunicorn after fork"""
+    
+    def test_recreate_engine_rebinds_sessions(self):
+        """Test that sessions created after recreate_engine use the new engine"""
+        original = database.engine
+        try:
+            replacement = database.recreate_engine()
+            
+            assert replacement is not original
+            assert database.engine is replacement
+            assert database.SessionLocal().get_bind() is replacement
+        finally:
+            database._engine = original
+            database.SessionLocal.configure(bind=original)
+    
+    def test_reinit_after_fork_restarts_listener(self):
+        """Test that logging gets a fresh listener thread and a single queue handler"""
+        inherited = logging_setup.queue_handler
+        try:
+            logging_setup.reinit_after_fork()
+            root_handlers = logging.getLogger().handlers
+            
+            assert logging_setup.listener is not None
+            assert logging_setup.queue_handler in root_handlers
+            assert inherited not in root_handlers
+        finally:
+            logging_setup.shutdown_logging()
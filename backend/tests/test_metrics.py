@@ -0,0 +1,64 @@
+import pytest
+from fastapi import status
+import api.metrics
+from query_stats import QueryStats, parameter_shape
+
+class TestMetrics:
+    """Test the Prometheus metrics endpoint"""
+    
+    def test_metrics_public(self, client):
+        """Test that metrics can be scraped without a user token"""
+        response = client.get("/metrics")
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "# TYPE http_request_duration_seconds histogram" in response.text
+        assert "threadpool_waiting_tasks" in response.text
+        # Running totals are counters, so rate() applies
+        assert "# TYPE response_cache_requests_total counter" in response.text
+        assert "# TYPE auth_throttle_requests_total counter" in response.text
+    
+    def test_metrics_route_template_labels(self, client, manager_headers):
+        """Test that requests are labelled by route template, not raw path"""
+        client.put("/leave_requests/987654/status", json={"status": "approved"}, headers=manager_headers)
+        client.get("/leave_requests", headers=manager_headers)
+        response = client.get("/metrics")
+        
+        assert 'route="/leave_requests/{request_id}/status",method="PUT",status="404"' in response.text
+        assert "987654" not in response.text
+        assert 'db_queries_per_request_count{route="/leave_requests"}' in response.text
+    
+    def test_metrics_token(self, client, monkeypatch):
+        """Test that METRICS_TOKEN protects the endpoint when set"""
+        monkeypatch.setattr(api.metrics, "METRICS_TOKEN", "scrape-secret")
+        
+        assert client.get("/metrics").status_code == status.HTTP_401_UNAUTHORIZED
+        response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+        assert response.status_code == status.HTTP_200_OK
+
+class TestQueryStats:
+    """Test per-request SQL statement accounting"""
+    
+    def test_query_headers(self, client, auth_headers):
+        """Test that responses report their statement count and time"""
+        response = client.get("/profile", headers=auth_headers)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert int(response.headers["X-DB-Queries"]) >= 1
+        assert response.headers["Server-Timing"].startswith("db;dur=")
+    
+    def test_repeated_statements(self):
+        """Test that a statement repeated within a request is flagged as N+1"""
+        stats = QueryStats()
+        for _ in range(6):
+            stats.record("SELECT users.name FROM users WHERE users.id = ?", 0.001)
+        stats.record("SELECT leave_requests.id FROM leave_requests", 0.002)
+        
+        assert stats.count == 7
+        assert stats.repeated(5) == {"SELECT users.name FROM users WHERE users.id = ?": 6}
+    
+    def test_parameter_shape_hides_values(self):
+        """Test that slow query logging only reports parameter types"""
+        assert parameter_shape({"email": "a@example.com", "id": 1}) == "{email: str, id: int}"
+        assert parameter_shape(("secret",)) == "(str)"
+        assert parameter_shape([(1, "x"), (2, "y")], executemany=True) == "2 x (int, str)"
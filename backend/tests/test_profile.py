@@ -32,3 +32,14 @@ class TestProfile:
         assert data["email"] == test_manager.email
         assert data["role"] == test_manager.role
         assert data["unit_id"] == test_manager.unit_id
+    
+    def test_get_profile_etag_not_modified(self, client, auth_headers):
+        """Test that a matching If-None-Match returns 304"""
+        response = client.get("/profile", headers=auth_headers)
+        etag = response.headers["ETag"]
+        
+        response = client.get("/profile", headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        
+        response = client.get("/profile", headers={**auth_headers, "If-None-Match": '"stale"'})
+        assert response.status_code == status.HTTP_200_OK
@@ -0,0 +1,48 @@
+import pytest
+from fastapi import status
+import profiling
+from profiling import create_profile_token, save_profile
+from tests.conftest import PROFILING_SECRET
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    return tmp_path
+
+class TestProfiling:
+    """Test on-demand request profiling"""
+    
+    def test_unprofiled_request(self, client, auth_headers, profile_dir):
+        """Test that requests without a profile token are not profiled"""
+        response = client.get("/profile", headers=auth_headers)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert "X-Profile-Id" not in response.headers
+        assert list(profile_dir.iterdir()) == []
+    
+    def test_profiled_request(self, client, auth_headers, profile_dir):
+        """Test that a signed token profiles the request and returns the profile id"""
+        token = create_profile_token(secret=PROFILING_SECRET)
+        response = client.get("/profile", headers={**auth_headers, "X-Profile": token})
+        
+        assert response.status_code == status.HTTP_200_OK
+        profile_id = response.headers["X-Profile-Id"]
+        assert "-get-profile-" in profile_id
+        assert (profile_dir / profile_id).exists()
+    
+    def test_invalid_token_ignored(self, client, auth_headers, profile_dir):
+        """Test that tokens not signed with the profiling secret are ignored"""
+        token = create_profile_token(secret="someone-elses-profiling-secret-for-hs256")
+        response = client.get("/profile", headers={**auth_headers, "X-Profile": token})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert "X-Profile-Id" not in response.headers
+    
+    def test_profile_directory_bounded(self, tmp_path):
+        """Test that only the newest profiles are kept"""
+        for i in range(5):
+            save_profile(f"2026010{i}T000000-get-x-{i}.folded", "main 1\n", directory=str(tmp_path), max_files=3)
+        
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            f"2026010{i}T000000-get-x-{i}.folded" for i in (2, 3, 4)
+        ]
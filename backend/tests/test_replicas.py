@@ -0,0 +1,123 @@
+import pytest
+from datetime import date, timedelta
+from fastapi import Depends, status
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from main import create_app
+from models.leave_requests import Base, User, Unit, LeaveRequest, RequestTypeEnum, StatusEnum
+from api.authentication import create_access_token
+from auth_tokens import token_claims, token_versions
+import database
+
+def seed(engine, users):
+    """Create the schema and the given users, with the same ids on every database"""
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as session:
+        session.add(Unit(id=1, name="Test Unit"))
+        for user_id, role in users:
+            session.add(User(id=user_id, name=f"{role.title()} {user_id}", email=f"{role}{user_id}@example.com",
+                             password_hash="x", role=role, unit_id=1, validated=True))
+        session.commit()
+
+def headers_for(engine, user_id):
+    with Session(engine) as session:
+        user = session.get(User, user_id)
+        return {"Authorization": f"Bearer {create_access_token(token_claims(user))}"}
+
+@pytest.fixture
+def two_databases(tmp_path, monkeypatch):
+    """App reading from a replica database and writing to a primary, both local SQLite files.
+
+    Nothing replicates between them, so which database answered a read is visible.
+    """
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}", connect_args={"check_same_thread": False})
+    replica_engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}", connect_args={"check_same_thread": False})
+    seed(primary, [(1, "user"), (2, "manager"), (3, "user")])
+    # User 3 confirmed their account a moment ago and hasn't replicated yet
+    seed(replica_engine, [(1, "user"), (2, "manager")])
+
+    replica = database.Replica(engine=replica_engine)
+    previous_bind = database.SessionLocal.kw.get("bind")
+    monkeypatch.setattr(database, "_engine", primary)
+    monkeypatch.setattr(database, "replicas", database.ReplicaSet([replica]))
+    database.SessionLocal.configure(bind=primary)
+    token_versions.clear()
+
+    app = create_app(background_tasks=False)
+    
+    @app.get("/test/leave_request_count")
+    def leave_request_count(db: Session = Depends(database.get_read_db)):
+        return {"count": db.query(LeaveRequest).count()}
+    
+    with TestClient(app) as client:
+        yield client, primary, replica
+    database.SessionLocal.configure(bind=previous_bind)
+    token_versions.clear()
+
+def add_leave_request(engine, user_id):
+    with Session(engine) as session:
+        session.add(LeaveRequest(user_id=user_id, request_type=RequestTypeEnum.timeoff, status=StatusEnum.pending,
+                                 start_date=date.today() + timedelta(days=1), end_date=date.today() + timedelta(days=2)))
+        session.commit()
+
+class TestReadReplicas:
+    """Test replica routing, read-your-writes and fallback to the primary"""
+
+    def test_reads_use_replica(self, two_databases):
+        """Test that read-only endpoints are served by the replica"""
+        client, primary, replica = two_databases
+        add_leave_request(replica.engine, 1)
+
+        response = client.get("/test/leave_request_count", headers=headers_for(primary, 1))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["count"] == 1
+
+    def test_read_your_writes(self, two_databases, monkeypatch):
+        """Test that a user's reads stick to the primary right after they write, and only theirs"""
+        client, primary, replica = two_databases
+        user_headers = headers_for(primary, 1)
+        start = date.today() + timedelta(days=7)
+        response = client.post("/leave_requests", headers=user_headers, json={
+            "request_type": "timeoff",
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=2)).isoformat()
+        })
+        assert response.status_code == status.HTTP_200_OK
+
+        assert client.get("/test/leave_request_count", headers=user_headers).json()["count"] == 1
+        assert client.get("/test/leave_request_count", headers=headers_for(primary, 2)).json()["count"] == 0
+
+        # The pin travels with the writer's cookie, so another worker honors it too
+        cookie = response.cookies[database.READ_YOUR_WRITES_COOKIE]
+        with TestClient(client.app) as other_worker:
+            assert other_worker.get("/test/leave_request_count", headers=user_headers).json()["count"] == 0
+            other_worker.cookies.set(database.READ_YOUR_WRITES_COOKIE, cookie)
+            assert other_worker.get("/test/leave_request_count", headers=user_headers).json()["count"] == 1
+
+        monkeypatch.setattr(database, "READ_YOUR_WRITES_SECONDS", 0)
+        assert client.get("/test/leave_request_count", headers=user_headers).json()["count"] == 0
+
+    def test_unhealthy_replica_falls_back_to_primary(self, two_databases):
+        """Test that reads go to the primary while the replica fails its checks"""
+        client, primary, replica = two_databases
+        add_leave_request(primary, 1)
+        manager_headers = headers_for(primary, 2)
+
+        replica.engine.dispose()
+        replica._engine = create_engine("sqlite:////nonexistent/dir/replica.db")
+        replica.watch(replica._engine)
+        replica.check()
+
+        assert replica.healthy is False
+        assert client.get("/test/leave_request_count", headers=manager_headers).json()["count"] == 1
+
+    def test_auth_rechecks_primary_before_rejecting(self, two_databases):
+        """Test that a user missing from the replica is looked up on the primary"""
+        client, primary, replica = two_databases
+
+        response = client.get("/profile", headers=headers_for(primary, 3))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["id"] == 3
@@ -0,0 +1,139 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+from fastapi import status
+from sqlalchemy import update
+from api.leave_requests import leave_requests_version
+from change_feed import record_change
+from models.leave_requests import LeaveRequest, LeaveRequestChange, RequestTypeEnum, StatusEnum, User
+from response_cache import InMemoryBackend, ResponseCache, response_cache
+
+class TestResponseCache:
+    """Test the versioned response cache and single-flight misses"""
+    
+    def test_concurrent_misses_compute_once(self):
+        """Test that concurrent misses on one key share a single computation"""
+        cache = ResponseCache(InMemoryBackend())
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return b"body"
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_compute("scope", "1", "variant", compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(calls) == 1
+        assert results == [b"body"] * 8
+        assert cache.get_stats() == {"hit": 0, "miss": 1, "coalesced": 7}
+    
+    def test_new_version_misses(self):
+        """Test that a new scope version makes its next read miss, and only its"""
+        cache = ResponseCache(InMemoryBackend())
+        cache.get_or_compute("a", "1", "v", lambda: b"a1")
+        cache.get_or_compute("b", "1", "v", lambda: b"b1")
+        
+        assert cache.get_or_compute("a", "2", "v", lambda: b"a2") == b"a2"
+        assert cache.get_or_compute("b", "1", "v", lambda: b"b2") == b"b1"
+    
+    def test_entries_expire(self):
+        """Test that entries expire after the TTL"""
+        cache = ResponseCache(InMemoryBackend(), ttl=0)
+        cache.get_or_compute("a", "1", "v", lambda: b"a1")
+        
+        assert cache.get_or_compute("a", "1", "v", lambda: b"a2") == b"a2"
+    
+    def test_cached_list_reads_only_version(self, client, manager_headers, max_queries):
+        """Test that a second list request only reads the version from the database"""
+        client.get("/leave_requests", headers=manager_headers)
+        
+        with max_queries(1):
+            response = client.get("/leave_requests", headers=manager_headers)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["authenticated_user"]["email"] == "manager@example.com"
+        assert response_cache.get_stats()["hit"] == 1
+    
+    def test_create_bumps_manager_list(self, client, manager_headers, auth_headers):
+        """Test that a new request shows up in the cached manager list right away"""
+        assert client.get("/leave_requests", headers=manager_headers).json()["count"] == 0
+        
+        start = date.today() + timedelta(days=7)
+        client.post("/leave_requests", headers=auth_headers, json={
+            "request_type": "timeoff",
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=2)).isoformat()
+        })
+        
+        assert client.get("/leave_requests", headers=manager_headers).json()["count"] == 1
+        assert client.get("/leave_requests", headers=auth_headers).json()["count"] == 1
+    
+    def test_write_from_other_worker_shows_up(self, client, db_session, test_user, auth_headers, manager_headers):
+        """Test that a change committed outside this process's API calls misses the cached lists"""
+        assert client.get("/leave_requests", headers=manager_headers).json()["count"] == 0
+        assert client.get("/leave_requests", headers=auth_headers).json()["count"] == 0
+        
+        # Another worker: its own session, nothing in this process is told
+        leave_request = LeaveRequest(
+            user_id=test_user.id, request_type=RequestTypeEnum.timeoff, status=StatusEnum.pending,
+            start_date=date.today() + timedelta(days=7), end_date=date.today() + timedelta(days=8)
+        )
+        db_session.add(leave_request)
+        db_session.flush()
+        record_change(db_session, leave_request, "created")
+        db_session.commit()
+        
+        assert client.get("/leave_requests", headers=manager_headers).json()["count"] == 1
+        assert client.get("/leave_requests", headers=auth_headers).json()["count"] == 1
+    
+    def test_late_commit_with_lower_id_changes_version(self, db_session, test_user):
+        """Test that a change committed after a higher id was already seen still changes the version"""
+        def change(change_id):
+            return LeaveRequestChange(id=change_id, leave_request_id=1, user_id=test_user.id, change_type="created", payload="{}")
+        
+        db_session.add(change(2))
+        db_session.commit()
+        before = leave_requests_version(db_session, None), leave_requests_version(db_session, test_user.id)
+        
+        # Id 1 was handed out first, but its transaction only commits now
+        db_session.add(change(1))
+        db_session.commit()
+        
+        after = leave_requests_version(db_session, None), leave_requests_version(db_session, test_user.id)
+        assert after[0].last_change == before[0].last_change
+        assert after[0] != before[0] and after[1] != before[1]
+    
+    def test_rename_from_other_worker_shows_up(self, client, db_session, test_user, auth_headers, manager_headers):
+        """Test that a user renamed directly in the database is renamed in cached lists"""
+        start = date.today() + timedelta(days=7)
+        client.post("/leave_requests", headers=auth_headers, json={
+            "request_type": "timeoff",
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=1)).isoformat()
+        })
+        assert client.get("/leave_requests", headers=manager_headers).json()["leave_requests"][0]["user_name"] == "Test User"
+        
+        # A core UPDATE skips the ORM events, so neither the directory nor the cache hear about it
+        db_session.execute(update(User).where(User.id == test_user.id).values(name="Renamed", updated_at=datetime.utcnow() + timedelta(seconds=1)))
+        db_session.commit()
+        
+        assert client.get("/leave_requests", headers=manager_headers).json()["leave_requests"][0]["user_name"] == "Renamed"
+    
+    def test_conditional_get_skips_list(self, client, manager_headers, max_queries):
+        """Test that a matching If-None-Match is answered from the version alone, even on a cache miss"""
+        etag = client.get("/leave_requests", headers=manager_headers).headers["etag"]
+        response_cache.reset()
+        
+        with max_queries(1):
+            response = client.get("/leave_requests", headers={**manager_headers, "If-None-Match": etag})
+        
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response_cache.get_stats()["miss"] == 0
@@ -0,0 +1,131 @@
+import pytest
+from fastapi import status
+from datetime import date, timedelta
+from models.leave_requests import LeaveRequest, RequestTypeEnum, User
+from search import substring_search
+
+class TestSearchLeaveRequests:
+    """Test full-text search over leave reasons and requester names"""
+
+    def add_request(self, db_session, user_id, reason):
+        leave_request = LeaveRequest(
+            user_id=user_id,
+            request_type=RequestTypeEnum.timeoff,
+            start_date=date.today() + timedelta(days=1),
+            end_date=date.today() + timedelta(days=2),
+            reason=reason
+        )
+        db_session.add(leave_request)
+        db_session.commit()
+        return leave_request.id
+
+    def search(self, client, headers, q, **params):
+        response = client.get("/leave_requests/search", params={"q": q, **params}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+
+    def test_search_unauthorized(self, client):
+        """Test that searching requires authentication"""
+        response = client.get("/leave_requests/search?q=wedding")
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_search_ranks_reason_and_name_matches(self, client, manager_headers, test_manager, test_user, db_session):
+        """Test that reasons and requester names both match, best match first, with prefixes"""
+        marco = User(name="Marco Rossi", email="marco@example.com", role="user", validated=True)
+        db_session.add(marco)
+        db_session.commit()
+        wedding_id = self.add_request(db_session, marco.id, "Sister's wedding in Rome")
+        other_wedding_id = self.add_request(db_session, test_user.id, "Wedding")
+        self.add_request(db_session, test_user.id, "Dentist")
+
+        body = self.search(client, manager_headers, "wedding marco")
+
+        assert [item["id"] for item in body["leave_requests"]] == [wedding_id, other_wedding_id]
+        assert body["leave_requests"][0]["score"] > body["leave_requests"][1]["score"]
+        assert body["leave_requests"][0]["user_name"] == "Marco Rossi"
+        assert body["leave_requests"][0]["reason"] == "Sister's wedding in Rome"
+        assert {item["id"] for item in self.search(client, manager_headers, "wedd")["leave_requests"]} == {wedding_id, other_wedding_id}
+
+    def test_search_users_see_only_their_requests(self, client, auth_headers, test_user, test_manager, db_session):
+        """Test that search applies the same visibility rules as the list"""
+        own_id = self.add_request(db_session, test_user.id, "Conference")
+        self.add_request(db_session, test_manager.id, "Conference")
+
+        body = self.search(client, auth_headers, "conference")
+
+        assert [item["id"] for item in body["leave_requests"]] == [own_id]
+
+    def test_search_pagination(self, client, manager_headers, test_user, db_session):
+        """Test limit/offset paging and next_offset"""
+        ids = {self.add_request(db_session, test_user.id, f"Moving day {i}") for i in range(5)}
+
+        first = self.search(client, manager_headers, "moving", limit=2)
+        second = self.search(client, manager_headers, "moving", limit=2, offset=first["next_offset"])
+        last = self.search(client, manager_headers, "moving", limit=2, offset=second["next_offset"])
+
+        assert (first["next_offset"], second["next_offset"], last["next_offset"]) == (2, 4, None)
+        pages = first["leave_requests"] + second["leave_requests"] + last["leave_requests"]
+        assert {item["id"] for item in pages} == ids
+        assert len(pages) == 5
+
+    def test_search_index_follows_creates_and_renames(self, client, auth_headers, manager_headers, test_user, db_session):
+        """Test that new requests and renamed requesters are searchable right away"""
+        start = date.today() + timedelta(days=3)
+        response = client.post("/leave_requests", json={
+            "request_type": "timeoff",
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=1)).isoformat(),
+            "reason": "Marathon in Berlin"
+        }, headers=auth_headers)
+        created_id = response.json()["id"]
+
+        assert [item["id"] for item in self.search(client, manager_headers, "berlin")["leave_requests"]] == [created_id]
+
+        test_user.name = "Giulia Bianchi"
+        db_session.commit()
+
+        assert [item["id"] for item in self.search(client, manager_headers, "giulia")["leave_requests"]] == [created_id]
+        assert self.search(client, manager_headers, "test")["count"] == 0
+
+    def test_search_etag(self, client, auth_headers, manager_headers, test_user, db_session, max_queries):
+        """Test that a repeated search is answered from the list version alone, until a request or name changes"""
+        start = date.today() + timedelta(days=3)
+        client.post("/leave_requests", json={
+            "request_type": "timeoff",
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=1)).isoformat(),
+            "reason": "Marathon in Berlin"
+        }, headers=auth_headers)
+        etag = client.get("/leave_requests/search", params={"q": "berlin"}, headers=manager_headers).headers["ETag"]
+
+        with max_queries(1):
+            response = client.get("/leave_requests/search", params={"q": "berlin"}, headers={**manager_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert client.get("/leave_requests/search", params={"q": "marathon"}, headers=manager_headers).headers["ETag"] != etag
+
+        test_user.name = "Giulia Bianchi"
+        db_session.commit()
+
+        response = client.get("/leave_requests/search", params={"q": "berlin"}, headers={**manager_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["leave_requests"][0]["user_name"] == "Giulia Bianchi"
+
+    def test_search_ignores_query_syntax(self, client, manager_headers, test_user, db_session):
+        """Test that operators and quotes in q are treated as plain text"""
+        self.add_request(db_session, test_user.id, "Wedding")
+
+        assert self.search(client, manager_headers, '"wedding" OR NEAR(')["count"] == 1
+        assert self.search(client, manager_headers, '"*"')["count"] == 0
+    
+    def test_substring_fallback(self, db_session, test_user, test_manager):
+        """Test the ILIKE search used on databases without a full-text index"""
+        both_id = self.add_request(db_session, test_user.id, "Test day off")
+        reason_id = self.add_request(db_session, test_manager.id, "A test of patience")
+        self.add_request(db_session, test_manager.id, "Unrelated")
+        underscore_id = self.add_request(db_session, test_manager.id, "t_st")
+        
+        # Matching both words ranks first; "_" in a word is literal, not a wildcard
+        assert substring_search(db_session, ["test", "user"], None, 10, 0)[0] == (both_id, 2.0)
+        assert {match[0] for match in substring_search(db_session, ["patience"], test_manager.id, 10, 0)} == {reason_id}
+        assert substring_search(db_session, ["t_st"], None, 10, 0) == [(underscore_id, 1.0)]
@@ -0,0 +1,230 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+import pytest
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from fastapi import status
+from models.leave_requests import WebhookDelivery
+from tests.conftest import TestingSessionLocal
+from webhooks import WebhookDispatcher
+import webhooks
+
+class StubReceiver:
+    """Local HTTP endpoint recording the webhook batches it receives"""
+
+    def __init__(self, status_code=200, delay=0.0):
+        self.status_code = status_code
+        self.delay = delay
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                with receiver.lock:
+                    receiver.active += 1
+                    receiver.max_active = max(receiver.max_active, receiver.active)
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                time.sleep(receiver.delay)
+                with receiver.lock:
+                    receiver.requests.append((dict(self.headers), body))
+                    receiver.active -= 1
+                self.send_response(receiver.status_code)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def receiver():
+    stub = StubReceiver()
+    yield stub
+    stub.close()
+
+@pytest.fixture
+def dispatcher(db_session):
+    instance = WebhookDispatcher(TestingSessionLocal, workers=4, timeout=5)
+    yield instance
+    instance.close()
+
+class TestWebhooks:
+    """Test webhook subscriptions and the delivery pipeline against a local receiver"""
+
+    def subscribe(self, client, headers, url, **options):
+        response = client.post("/webhooks", json={"url": url, **options}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+
+    def create_request(self, client, headers, days=3):
+        start = date.today() + timedelta(days=days)
+        response = client.post("/leave_requests", json={
+            "request_type": "timeoff",
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=1)).isoformat()
+        }, headers=headers)
+        return response.json()["id"]
+
+    def test_subscriptions_require_manager(self, client, auth_headers):
+        """Test that only managers manage webhooks"""
+        response = client.post("/webhooks", json={"url": "http://127.0.0.1/hook"}, headers=auth_headers)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_subscription_validation(self, client, manager_headers):
+        """Test that urls and event types are checked"""
+        assert client.post("/webhooks", json={"url": "ftp://example.com"}, headers=manager_headers).status_code == 422
+        response = client.post("/webhooks", json={"url": "http://example.com", "event_types": ["deleted"]}, headers=manager_headers)
+        assert response.status_code == 422
+
+    def test_secret_only_returned_on_create(self, client, manager_headers, receiver):
+        """Test that the signing secret is shown once"""
+        subscription = self.subscribe(client, manager_headers, receiver.url)
+
+        listed = client.get("/webhooks", headers=manager_headers).json()["webhooks"]
+
+        assert len(subscription["secret"]) == 64
+        assert [entry["id"] for entry in listed] == [subscription["id"]]
+        assert "secret" not in listed[0]
+
+    def test_delivers_signed_batches(self, client, auth_headers, manager_headers, receiver, dispatcher):
+        """Test that changes after subscribing are delivered once, batched and signed"""
+        self.create_request(client, auth_headers, days=20)
+        subscription = self.subscribe(client, manager_headers, receiver.url)
+        leave_request_id = self.create_request(client, auth_headers)
+        client.put(f"/leave_requests/{leave_request_id}/status", json={"status": "approved"}, headers=manager_headers)
+
+        assert dispatcher.run_once() == {"queued": 2, "batches": 1}
+        assert dispatcher.run_once() == {"queued": 0, "batches": 0}
+
+        assert len(receiver.requests) == 1
+        headers, body = receiver.requests[0]
+        expected = hmac.new(subscription["secret"].encode(), headers["X-Webhook-Timestamp"].encode() + b"." + body, hashlib.sha256).hexdigest()
+        assert headers["X-Webhook-Signature"] == f"sha256={expected}"
+        deliveries = json.loads(body)["deliveries"]
+        assert [(delivery["change"]["type"], delivery["change"]["leave_request_id"]) for delivery in deliveries] == [
+            ("created", leave_request_id), ("status_changed", leave_request_id)
+        ]
+        assert deliveries[1]["change"]["leave_request"]["status"] == "approved"
+
+    def test_event_type_filter(self, client, auth_headers, manager_headers, receiver, dispatcher):
+        """Test that subscriptions only get the change types they asked for"""
+        self.subscribe(client, manager_headers, receiver.url, event_types=["status_changed"])
+        leave_request_id = self.create_request(client, auth_headers)
+        client.put(f"/leave_requests/{leave_request_id}/status", json={"status": "rejected"}, headers=manager_headers)
+
+        dispatcher.run_once()
+
+        deliveries = json.loads(receiver.requests[0][1])["deliveries"]
+        assert [delivery["change"]["type"] for delivery in deliveries] == ["status_changed"]
+
+    def test_retries_then_dead_letters(self, client, auth_headers, manager_headers, receiver, dispatcher, db_session, monkeypatch):
+        """Test backoff after failures, dead-lettering, and requeueing dead deliveries"""
+        monkeypatch.setattr(webhooks, "WEBHOOK_MAX_ATTEMPTS", 3)
+        monkeypatch.setattr(webhooks, "WEBHOOK_BACKOFF_BASE_SECONDS", 60)
+        receiver.status_code = 500
+        subscription = self.subscribe(client, manager_headers, receiver.url)
+        self.create_request(client, auth_headers)
+
+        dispatcher.run_once()
+        delivery = db_session.query(WebhookDelivery).one()
+        assert (delivery.status, delivery.attempts, delivery.last_error) == ("pending", 1, "HTTP 500")
+        # Backing off: not due again yet
+        assert dispatcher.run_once()["batches"] == 0
+
+        for _ in range(2):
+            db_session.query(WebhookDelivery).update({"next_attempt_at": delivery.created_at})
+            db_session.commit()
+            dispatcher.run_once()
+        db_session.expire_all()
+        assert (delivery.status, delivery.attempts) == ("dead", 3)
+        assert len(receiver.requests) == 3
+
+        dead = client.get(f"/webhooks/{subscription['id']}/deliveries?status=dead", headers=manager_headers).json()
+        assert [entry["id"] for entry in dead["deliveries"]] == [delivery.id]
+        assert client.get("/webhooks", headers=manager_headers).json()["webhooks"][0]["dead"] == 1
+
+        receiver.status_code = 204
+        response = client.post(f"/webhooks/{subscription['id']}/deliveries/retry", headers=manager_headers)
+        assert response.json() == {"requeued": 1}
+        dispatcher.run_once()
+        db_session.expire_all()
+        assert delivery.status == "delivered"
+
+    def test_per_endpoint_concurrency_limit(self, client, auth_headers, manager_headers, dispatcher):
+        """Test that a subscription never has more than max_concurrency batches in flight"""
+        slow = StubReceiver(delay=0.2)
+        try:
+            self.subscribe(client, manager_headers, slow.url, max_concurrency=2)
+            for days in range(3, 8):
+                self.create_request(client, auth_headers, days)
+            dispatcher.batch_size = 1
+            dispatcher.fan_out()
+
+            assert dispatcher.dispatch() == 2
+            # Both slots are taken until those sends finish
+            assert dispatcher.dispatch() == 0
+            for _ in range(5):
+                dispatcher.drain()
+                dispatcher.record()
+                dispatcher.dispatch()
+
+            assert len(slow.requests) == 5
+            assert slow.max_active == 2
+        finally:
+            slow.close()
+
+    def test_more_batches_than_senders_sent_once(self, client, auth_headers, manager_headers, db_session):
+        """Test that batches beyond the idle senders stay unleased, and expired leases never resend a batch"""
+        slow = StubReceiver(delay=0.1)
+        dispatcher = WebhookDispatcher(TestingSessionLocal, workers=1, timeout=5)
+        try:
+            self.subscribe(client, manager_headers, slow.url, max_concurrency=4)
+            for days in range(3, 7):
+                self.create_request(client, auth_headers, days)
+            dispatcher.batch_size = 1
+            dispatcher.fan_out()
+
+            # One sender, so one batch is leased and the other three wait in the table
+            assert dispatcher.dispatch() == 1
+            assert db_session.query(WebhookDelivery).filter(WebhookDelivery.locked_until != None).count() == 1
+
+            # Sent but not recorded yet when its lease runs out: the next batch goes, not the same one
+            dispatcher.drain()
+            db_session.query(WebhookDelivery).update({"locked_until": None})
+            db_session.commit()
+            assert dispatcher.dispatch() == 1
+            for _ in range(4):
+                dispatcher.drain()
+                dispatcher.record()
+                dispatcher.dispatch()
+
+            sent = [delivery["id"] for _, body in slow.requests for delivery in json.loads(body)["deliveries"]]
+            assert len(sent) == 4
+            assert len(set(sent)) == 4
+            assert slow.max_active == 1
+        finally:
+            dispatcher.close()
+            slow.close()
+
+    def test_deactivated_subscription_gets_nothing(self, client, auth_headers, manager_headers, receiver, dispatcher):
+        """Test that deleting a subscription stops its deliveries"""
+        subscription = self.subscribe(client, manager_headers, receiver.url)
+        client.delete(f"/webhooks/{subscription['id']}", headers=manager_headers)
+        self.create_request(client, auth_headers)
+
+        assert dispatcher.run_once() == {"queued": 0, "batches": 0}
+        assert receiver.requests == []
@@ -0,0 +1,123 @@
+import pytest
+import asyncio
+from datetime import date, timedelta
+from starlette.websockets import WebSocketDisconnect
+import websocket_manager
+from api.authentication import create_access_token
+from change_feed import record_change
+from models.leave_requests import LeaveRequest, RequestTypeEnum, StatusEnum
+from tests.conftest import TestingSessionLocal
+
+@pytest.fixture
+def ws_session(monkeypatch):
+    """Point the connection manager at the test database"""
+    monkeypatch.setattr(websocket_manager, "SessionLocal", TestingSessionLocal)
+    # Every test database starts with an empty change feed
+    monkeypatch.setattr(websocket_manager.notification_relay, "cursor", 0)
+
+def deliver_notifications() -> int:
+    """Run one step of the relay that pushes committed changes (a background task outside tests)"""
+    return asyncio.run(websocket_manager.notification_relay.deliver())
+
+class TestWebSocket:
+    """Test WebSocket endpoint"""
+    
+    def test_connect(self, client, ws_session, test_user, auth_headers):
+        """Test connecting with a valid token"""
+        token = auth_headers["Authorization"].split(" ")[1]
+        with client.websocket_connect(f"/ws?token={token}") as websocket:
+            message = websocket.receive_json()
+            assert message["type"] == "connection_established"
+            assert message["user_id"] == test_user.id
+    
+    def test_reauthenticate_in_band(self, client, ws_session, test_user, auth_headers):
+        """Test swapping the access token of an open connection"""
+        token = auth_headers["Authorization"].split(" ")[1]
+        new_token = create_access_token(
+            data={"sub": test_user.email, "user_id": test_user.id},
+            expires_delta=timedelta(minutes=30)
+        )
+        with client.websocket_connect(f"/ws?token={token}") as websocket:
+            websocket.receive_json()
+            
+            websocket.send_json({"type": "authenticate", "token": new_token})
+            message = websocket.receive_json()
+            assert message["type"] == "authenticated"
+            assert message["expires_at"] == websocket_manager.manager.token_expires_at[test_user.id]
+            
+            # The connection keeps working after re-authentication
+            websocket.send_json({"type": "ping"})
+            assert websocket.receive_json()["type"] == "pong"
+    
+    def test_reauthenticate_other_user_rejected(self, client, ws_session, test_user, test_manager, auth_headers, manager_headers):
+        """Test that a token for a different user can't take over a connection"""
+        token = auth_headers["Authorization"].split(" ")[1]
+        manager_token = manager_headers["Authorization"].split(" ")[1]
+        with client.websocket_connect(f"/ws?token={token}") as websocket:
+            websocket.receive_json()
+            
+            websocket.send_json({"type": "authenticate", "token": manager_token})
+            message = websocket.receive_json()
+            assert message["type"] == "error"
+            assert "user mismatch" in message["message"]
+    
+    def test_expired_token_gets_no_notifications(self, client, ws_session, test_user, auth_headers, manager_headers):
+        """Test that a passive connection is closed instead of notified once its token expired"""
+        token = auth_headers["Authorization"].split(" ")[1]
+        start = date.today() + timedelta(days=7)
+        response = client.post("/leave_requests", headers=auth_headers, json={
+            "request_type": "timeoff",
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=1)).isoformat()
+        })
+        with client.websocket_connect(f"/ws?token={token}") as websocket:
+            websocket.receive_json()
+            websocket_manager.manager.token_expires_at[test_user.id] = 0
+            
+            client.put(f"/leave_requests/{response.json()['id']}/status", json={"status": "approved"}, headers=manager_headers)
+            deliver_notifications()
+            
+            with pytest.raises(WebSocketDisconnect) as closed:
+                websocket.receive_json()
+            assert closed.value.code == 4003
+            assert not websocket_manager.manager.is_user_connected(test_user.id)
+    
+    def test_notifications_follow_the_change_feed(self, client, ws_session, test_user, test_manager, auth_headers, manager_headers):
+        """Test that changes committed by any worker reach the connections of this one"""
+        token = auth_headers["Authorization"].split(" ")[1]
+        manager_token = manager_headers["Authorization"].split(" ")[1]
+        with client.websocket_connect(f"/ws?token={manager_token}") as manager_socket:
+            manager_socket.receive_json()
+            
+            # Written straight to the database, as another worker would
+            db = TestingSessionLocal()
+            try:
+                start = date.today() + timedelta(days=7)
+                leave_request = LeaveRequest(
+                    user_id=test_user.id, request_type=RequestTypeEnum.timeoff,
+                    start_date=start, end_date=start + timedelta(days=1), status=StatusEnum.pending
+                )
+                db.add(leave_request)
+                db.flush()
+                record_change(db, leave_request, "created")
+                db.commit()
+                request_id = leave_request.id
+            finally:
+                db.close()
+            assert deliver_notifications() == 1
+            
+            message = manager_socket.receive_json()
+            assert message["notification_type"] == "new_leave_request"
+            assert message["data"]["request_id"] == request_id
+            assert message["data"]["user_name"] == test_user.name
+            assert message["data"]["details"]["start_date"] == start.isoformat()
+            
+            with client.websocket_connect(f"/ws?token={token}") as user_socket:
+                user_socket.receive_json()
+                client.put(f"/leave_requests/{request_id}/status", json={"status": "approved"}, headers=manager_headers)
+                assert deliver_notifications() == 1
+                
+                message = user_socket.receive_json()
+                assert message["notification_type"] == "leave_request_status_changed"
+                assert message["data"]["status"] == "approved"
+                assert message["data"]["reviewer_name"] == test_manager.name
@@ -0,0 +1,280 @@
+"""Webhook delivery: turns change feed entries into signed POSTs to subscribed endpoints.
+
+The API only writes the change feed; everything here runs in the dispatcher
+process (jobs.webhooks), so a slow or failing endpoint never touches API
+latency. Each pass of the dispatcher
+
+1. fans out: appends a webhook_deliveries row per new change and matching
+   subscription, advancing the subscription's change feed cursor in the
+   same transaction, so no change is queued twice or skipped;
+2. sends: due deliveries are leased, grouped per subscription into batches
+   of up to WEBHOOK_BATCH_SIZE and POSTed by a pool of WEBHOOK_WORKERS
+   threads over pooled connections, never more than the subscription's
+   max_concurrency batches at once. Batches are only leased when a sender
+   is free to start them, so a lease never runs out while its batch waits
+   in a queue, and deliveries sent but not yet recorded are never leased
+   again;
+3. records: delivered batches are marked delivered; failed ones are retried
+   with exponential backoff and jitter, and dead-lettered (status "dead")
+   after WEBHOOK_MAX_ATTEMPTS. Dead deliveries can be retried from the API.
+
+Sender threads only do HTTP; all database work happens on the dispatcher
+thread.
+
+Receivers verify X-Webhook-Signature, "sha256=" + the hex HMAC-SHA256 of
+"{X-Webhook-Timestamp}.{body}" keyed by the subscription secret, and should
+deduplicate on the delivery ids: a batch is resent when the dispatcher
+stops after sending but before recording the result.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+import hashlib
+import hmac
+import logging
+import os
+import random
+import threading
+import time
+
+import orjson
+
+from change_feed import read_changes, CHANGE_FEED_MAX_BATCH
+from database import SessionLocal
+from models.leave_requests import WebhookDelivery, WebhookSubscription
+
+logger = logging.getLogger(__name__)
+
+# Concurrent senders across all subscriptions (also the connection pool size)
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+# Changes per POST
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+# Attempts before a delivery is dead-lettered
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+# Retry delay: base * 2^(attempts - 1), capped, with jitter
+WEBHOOK_BACKOFF_BASE_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_BASE_SECONDS", "10"))
+WEBHOOK_BACKOFF_MAX_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_MAX_SECONDS", "3600"))
+# How often the dispatcher looks for new changes and due deliveries
+WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", "1"))
+
+WEBHOOK_EVENT_TYPES = ("created", "status_changed")
+
+def sign(secret: str, timestamp: str, body: bytes) -> str:
+    digest = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before the next attempt after `attempts` failures"""
+    delay = min(WEBHOOK_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), WEBHOOK_BACKOFF_MAX_SECONDS)
+    # Full-range jitter keeps batches that failed together from retrying together
+    return delay * random.uniform(0.5, 1.0)
+
+class WebhookDispatcher:
+    """Fans out changes to subscriptions and delivers them with a pool of senders"""
+
+    def __init__(self, session_factory=SessionLocal, workers: int = WEBHOOK_WORKERS,
+                 batch_size: int = WEBHOOK_BATCH_SIZE, timeout: float = WEBHOOK_TIMEOUT_SECONDS):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session_factory = session_factory
+        self.workers = workers
+        self.batch_size = batch_size
+        self.timeout = timeout
+        # Keep-alive connections shared by all senders
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="webhook")
+        # Batches in flight per subscription, for max_concurrency
+        self.in_flight: Dict[int, int] = {}
+        # Deliveries handed to a sender and not recorded yet, whatever their lease says
+        self.unrecorded: Set[int] = set()
+        self.futures = set()
+        # (delivery ids, error or None) of sent batches, recorded by the next pass
+        self.results: List[Tuple[List[int], Optional[str]]] = []
+        self.lock = threading.Lock()
+
+    def fan_out(self) -> int:
+        """Queue a delivery for every new change each active subscription wants"""
+        queued = 0
+        db = self.session_factory()
+        try:
+            for subscription in db.query(WebhookSubscription).filter(WebhookSubscription.active == True).all():
+                event_types = set(subscription.event_types.split(","))
+                changes, cursor = read_changes(db, subscription.last_change_id, CHANGE_FEED_MAX_BATCH)
+                for change in changes:
+                    if change["type"] in event_types:
+                        db.add(WebhookDelivery(
+                            subscription_id=subscription.id,
+                            change_id=change["cursor"],
+                            payload=orjson.dumps(change).decode()
+                        ))
+                        queued += 1
+                subscription.last_change_id = cursor
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return queued
+
+    def dispatch(self) -> int:
+        """Hand due deliveries to the senders, batched per subscription; returns batches started"""
+        now = datetime.utcnow()
+        started = 0
+        db = self.session_factory()
+        try:
+            subscriptions = {
+                subscription.id: subscription
+                for subscription in db.query(WebhookSubscription).filter(WebhookSubscription.active == True)
+            }
+            for subscription_id, subscription in subscriptions.items():
+                with self.lock:
+                    # Only as many batches as senders are idle: queued batches would outlive their lease
+                    idle = self.workers - sum(self.in_flight.values())
+                    free = min(subscription.max_concurrency - self.in_flight.get(subscription_id, 0), idle)
+                    unrecorded = list(self.unrecorded)
+                if idle <= 0:
+                    break
+                if free <= 0:
+                    continue
+                query = db.query(WebhookDelivery.id, WebhookDelivery.payload).filter(
+                    WebhookDelivery.subscription_id == subscription_id,
+                    WebhookDelivery.status == "pending",
+                    WebhookDelivery.next_attempt_at <= now,
+                    (WebhookDelivery.locked_until == None) | (WebhookDelivery.locked_until < now)
+                )
+                if unrecorded:
+                    query = query.filter(WebhookDelivery.id.notin_(unrecorded))
+                due = query.order_by(WebhookDelivery.id).limit(free * self.batch_size).all()
+                if not due:
+                    continue
+
+                # Lease the deliveries for longer than a send can take
+                db.query(WebhookDelivery).filter(WebhookDelivery.id.in_([row.id for row in due])).update(
+                    {"locked_until": now + timedelta(seconds=self.timeout * 3)}, synchronize_session=False
+                )
+                db.commit()
+
+                for i in range(0, len(due), self.batch_size):
+                    batch = due[i:i + self.batch_size]
+                    delivery_ids = [row.id for row in batch]
+                    with self.lock:
+                        self.in_flight[subscription_id] = self.in_flight.get(subscription_id, 0) + 1
+                        self.unrecorded.update(delivery_ids)
+                    future = self.executor.submit(
+                        self.send, subscription_id, subscription.url, subscription.secret,
+                        delivery_ids, [row.payload for row in batch]
+                    )
+                    with self.lock:
+                        self.futures.add(future)
+                    future.add_done_callback(
+                        lambda future, subscription_id=subscription_id, delivery_ids=delivery_ids:
+                            self.finished(subscription_id, delivery_ids, future)
+                    )
+                    started += 1
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return started
+
+    def finished(self, subscription_id: int, delivery_ids: List[int], future):
+        with self.lock:
+            self.in_flight[subscription_id] -= 1
+            self.futures.discard(future)
+            self.results.append((delivery_ids, future.result()))
+
+    def send(self, subscription_id: int, url: str, secret: str, delivery_ids: List[int], payloads: List[str]) -> Optional[str]:
+        """POST one batch (runs on a sender thread); returns the error, None once delivered"""
+        # Payloads are stored serialized; splice them instead of re-encoding
+        body = b'{"deliveries":[' + b",".join(
+            b'{"id":%d,"change":%s}' % (delivery_id, payload.encode())
+            for delivery_id, payload in zip(delivery_ids, payloads)
+        ) + b"]}"
+        timestamp = str(int(time.time()))
+        try:
+            response = self.http.post(url, data=body, timeout=self.timeout, headers={
+                "Content-Type": "application/json",
+                "X-Webhook-Timestamp": timestamp,
+                "X-Webhook-Signature": sign(secret, timestamp, body),
+                "X-Webhook-Subscription": str(subscription_id)
+            })
+            error = f"HTTP {response.status_code}" if response.status_code >= 300 else None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        if error:
+            logger.warning("Webhook delivery failed", extra={"subscription_id": subscription_id, "error": error})
+        return error
+
+    def record(self) -> int:
+        """Store the outcome of the batches sent since the last call; returns batches recorded"""
+        with self.lock:
+            results, self.results = self.results, []
+        if not results:
+            return 0
+
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            for delivery_ids, error in results:
+                if error is None:
+                    db.query(WebhookDelivery).filter(WebhookDelivery.id.in_(delivery_ids)).update(
+                        {"status": "delivered", "delivered_at": now, "locked_until": None, "attempts": WebhookDelivery.attempts + 1},
+                        synchronize_session=False
+                    )
+                    continue
+                for delivery in db.query(WebhookDelivery).filter(WebhookDelivery.id.in_(delivery_ids)):
+                    delivery.attempts += 1
+                    delivery.last_error = error[:1000]
+                    delivery.locked_until = None
+                    if delivery.attempts >= WEBHOOK_MAX_ATTEMPTS:
+                        delivery.status = "dead"
+                    else:
+                        delivery.next_attempt_at = now + timedelta(seconds=retry_delay(delivery.attempts))
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Unrecorded batches are sent again once their lease expires
+            logger.exception("Error recording webhook deliveries")
+        finally:
+            db.close()
+            with self.lock:
+                for delivery_ids, _ in results:
+                    self.unrecorded.difference_update(delivery_ids)
+        return len(results)
+
+    def drain(self, timeout: Optional[float] = None):
+        """Wait for the batches in flight"""
+        with self.lock:
+            futures = list(self.futures)
+        wait(futures, timeout=timeout)
+
+    def run_once(self) -> dict:
+        """One fan-out and dispatch pass, waiting for its sends and recording them"""
+        queued = self.fan_out()
+        batches = self.dispatch()
+        self.drain()
+        self.record()
+        return {"queued": queued, "batches": batches}
+
+    def run(self, poll: float = WEBHOOK_POLL_SECONDS):
+        """Dispatch until interrupted; sends overlap with the next passes"""
+        while True:
+            try:
+                self.record()
+                self.fan_out()
+                self.dispatch()
+            except Exception:
+                logger.exception("Webhook dispatcher pass failed")
+            time.sleep(poll)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.record()
+        self.http.close()
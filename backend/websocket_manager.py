@@ -1,10 +1,20 @@
 from fastapi import WebSocket
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from sqlalchemy import func
+import asyncio
 import json
 import jwt
+import logging
 import os
 from database import SessionLocal
-from models.leave_requests import User
+from auth_tokens import authenticate_payload
+from metrics import notification_fanout_seconds, timed
+from change_feed import read_changes, change_signal, CHANGE_FEED_POLL_SECONDS, CHANGE_FEED_MAX_BATCH
+from directory import directory
+from models.leave_requests import LeaveRequestChange
+
+logger = logging.getLogger(__name__)
 
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
@@ -16,6 +26,8 @@ class ConnectionManager:
         self.active_connections: Dict[int, WebSocket] = {}
         # Store user info: {user_id: {"name": str, "email": str, "role": str}}
         self.user_info: Dict[int, dict] = {}
+        # Store access token expiry: {user_id: exp timestamp}, extended by in-band re-authentication
+        self.token_expires_at: Dict[int, int] = {}
 
     async def connect(self, websocket: WebSocket, token: str):
         """Connect a WebSocket with JWT authentication"""
@@ -29,40 +41,36 @@ class ConnectionManager:
                 await websocket.close(code=4001, reason="Invalid token")
                 return None
 
-            # Verify user exists in database
-            db = SessionLocal()
-            try:
-                user = db.query(User).filter(User.id == user_id, User.email == email).first()
-                if not user or not user.validated:
-                    await websocket.close(code=4002, reason="User not found or not validated")
-                    return None
-
-                # Accept the connection
-                await websocket.accept()
-
-                # Store connection and user info
-                self.active_connections[user_id] = websocket
-                self.user_info[user_id] = {
-                    "name": user.name,
-                    "email": user.email,
-                    "role": user.role
-                }
+            # Verify user exists and is validated (from claims in stateless mode)
+            user, error = authenticate_payload(payload, SessionLocal)
+            if error:
+                await websocket.close(code=4002, reason="User not found or not validated")
+                return None
+
+            # Accept the connection
+            await websocket.accept()
 
-                # Send welcome message
-                await self.send_personal_message(
-                    {
-                        "type": "connection_established",
-                        "message": f"Welcome {user.name}! You are now connected.",
-                        "user_id": user_id,
-                        "user_info": self.user_info[user_id]
-                    },
-                    user_id
-                )
+            # Store connection and user info
+            self.active_connections[user_id] = websocket
+            self.user_info[user_id] = {
+                "name": user["name"],
+                "email": user["email"],
+                "role": user["role"]
+            }
+            self.token_expires_at[user_id] = payload.get("exp")
 
-                return user_id
+            # Send welcome message
+            await self.send_personal_message(
+                {
+                    "type": "connection_established",
+                    "message": f"Welcome {user['name']}! You are now connected.",
+                    "user_id": user_id,
+                    "user_info": self.user_info[user_id]
+                },
+                user_id
+            )
 
-            finally:
-                db.close()
+            return user_id
 
         except jwt.ExpiredSignatureError:
             await websocket.close(code=4003, reason="Token expired")
@@ -74,20 +82,66 @@ class ConnectionManager:
             await websocket.close(code=4005, reason=f"Authentication error: {str(e)}")
             return None
 
+    def reauthenticate(self, user_id: int, token: str) -> Optional[str]:
+        """Swap the access token of an open connection in-band; returns an error message on failure"""
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            return "Token expired"
+        except jwt.InvalidTokenError:
+            return "Invalid token"
+
+        # The connection stays bound to its user: a token for someone else is rejected
+        if payload.get("user_id") != user_id:
+            return "Invalid token: user mismatch"
+
+        user, error = authenticate_payload(payload, SessionLocal)
+        if error:
+            return f"Invalid token: {error}"
+
+        self.user_info[user_id] = {
+            "name": user["name"],
+            "email": user["email"],
+            "role": user["role"]
+        }
+        self.token_expires_at[user_id] = payload.get("exp")
+        return None
+
+    def is_token_expired(self, user_id: int) -> bool:
+        """Check whether the token a connection was authenticated with has expired"""
+        expires_at = self.token_expires_at.get(user_id)
+        return expires_at is not None and expires_at < datetime.utcnow().timestamp()
+
+    async def close_expired(self, user_id: int):
+        """Close a connection whose token expired; clients reconnect or re-authenticate before it does"""
+        websocket = self.active_connections.get(user_id)
+        self.disconnect(user_id)
+        if websocket is not None:
+            try:
+                await websocket.close(code=4003, reason="Token expired")
+            except Exception:
+                pass
+
     def disconnect(self, user_id: int):
         """Disconnect a WebSocket"""
         if user_id in self.active_connections:
             del self.active_connections[user_id]
         if user_id in self.user_info:
             del self.user_info[user_id]
+        if user_id in self.token_expires_at:
+            del self.token_expires_at[user_id]
 
     async def send_personal_message(self, message: dict, user_id: int):
         """Send a message to a specific user"""
+        # A passive client never sends anything to be checked on, so expiry is enforced on every push
+        if self.is_token_expired(user_id):
+            await self.close_expired(user_id)
+            return
         if user_id in self.active_connections:
             try:
                 await self.active_connections[user_id].send_text(json.dumps(message))
             except Exception as e:
-                print(f"Error sending message to user {user_id}: {e}")
+                logger.warning("Error sending WebSocket message, disconnecting", extra={"recipient_id": user_id, "error": str(e)})
                 # Remove the connection if it's broken
                 self.disconnect(user_id)
 
@@ -99,18 +153,22 @@ class ConnectionManager:
             "data": data,
             "timestamp": data.get("timestamp")
         }
-        await self.send_personal_message(message, user_id)
+        with timed(notification_fanout_seconds, "user"):
+            await self.send_personal_message(message, user_id)
 
     async def broadcast_to_managers(self, message: dict):
         """Send a message to all connected managers"""
-        for user_id, user_info in self.user_info.items():
-            if user_info.get("role") == "manager":
-                await self.send_personal_message(message, user_id)
+        with timed(notification_fanout_seconds, "managers"):
+            # Iterate over a copy: a failed send disconnects and mutates user_info
+            for user_id, user_info in list(self.user_info.items()):
+                if user_info.get("role") == "manager":
+                    await self.send_personal_message(message, user_id)
 
     async def broadcast_to_all(self, message: dict):
         """Send a message to all connected users"""
-        for user_id in self.active_connections:
-            await self.send_personal_message(message, user_id)
+        with timed(notification_fanout_seconds, "all"):
+            for user_id in list(self.active_connections):
+                await self.send_personal_message(message, user_id)
 
     def get_connected_users(self) -> List[dict]:
         """Get list of connected users"""
@@ -125,3 +183,86 @@ class ConnectionManager:
 
 # Global connection manager instance
 manager = ConnectionManager()
+
+# Leave request fields sent as the details of a notification
+DETAIL_FIELDS = ("start_date", "end_date", "start_datetime", "end_datetime", "reason")
+
+class NotificationRelay:
+    """Pushes leave request changes to this worker's connections by tailing the change feed.
+
+    Every worker runs its own relay, so a request created or reviewed on one
+    worker reaches users connected to any other.
+    """
+
+    def __init__(self, connections: ConnectionManager):
+        self.connections = connections
+        # Cursor of the last change pushed; None until the relay starts from the latest one
+        self.cursor: Optional[int] = None
+
+    def read(self) -> Tuple[List[dict], dict]:
+        """Changes after the cursor and the directory entries of their owners and reviewers"""
+        db = SessionLocal()
+        try:
+            if self.cursor is None:
+                self.cursor = db.query(func.max(LeaveRequestChange.id)).scalar() or 0
+                return [], {}
+            changes, self.cursor = read_changes(db, self.cursor, CHANGE_FEED_MAX_BATCH)
+            user_ids = {change["user_id"] for change in changes}
+            user_ids.update(change["leave_request"]["reviewed_by"] for change in changes if change["leave_request"]["reviewed_by"])
+            return changes, directory.get_users(user_ids, db) if user_ids else {}
+        finally:
+            db.close()
+
+    async def deliver(self) -> int:
+        """Push the changes committed since the last call; returns how many there were"""
+        changes, users = await asyncio.to_thread(self.read)
+        for change in changes:
+            try:
+                await self.push(change, users)
+            except Exception:
+                logger.exception("Error sending leave request notification", extra={"leave_request_id": change["leave_request_id"]})
+        return len(changes)
+
+    async def run(self):
+        while True:
+            try:
+                delivered = await self.deliver()
+            except Exception:
+                logger.exception("Error reading leave request changes for notifications")
+                delivered = 0
+            if not delivered:
+                await change_signal.wait(CHANGE_FEED_POLL_SECONDS)
+
+    async def push(self, change: dict, users: dict):
+        leave_request = change["leave_request"]
+        details = {name: leave_request[name] for name in DETAIL_FIELDS}
+        timestamp = change["created_at"].isoformat()
+        if change["type"] == "created":
+            owner = users.get(change["user_id"])
+            # Send notification to all managers about the new request
+            await self.connections.broadcast_to_managers({
+                "type": "manager_notification",
+                "notification_type": "new_leave_request",
+                "data": {
+                    "request_id": change["leave_request_id"],
+                    "request_type": leave_request["request_type"],
+                    "user_name": owner.name if owner else None,
+                    "user_id": change["user_id"],
+                    "timestamp": timestamp,
+                    "details": details
+                }
+            })
+        elif change["type"] == "status_changed":
+            reviewer = users.get(leave_request["reviewed_by"])
+            # Send notification only to the request owner
+            await self.connections.send_notification_to_user(change["user_id"], "leave_request_status_changed", {
+                "request_id": change["leave_request_id"],
+                "request_type": leave_request["request_type"],
+                "status": leave_request["status"],
+                "reviewer_name": reviewer.name if reviewer else None,
+                "timestamp": timestamp,
+                "details": details
+            })
+
+# Global notification relay instance
+notification_relay = NotificationRelay(manager)
@@ -1,7 +1,8 @@
 -- 1. UNITS TABLE (REPRESENTING DEPARTMENTS)
 CREATE TABLE units (
     id INT AUTO_INCREMENT PRIMARY KEY,
-    name VARCHAR(100) NOT NULL UNIQUE
+    name VARCHAR(100) NOT NULL UNIQUE,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP -- Part of the cached lists' version
 );
 
 -- 2. USERS TABLE
@@ -14,12 +15,24 @@ CREATE TABLE users (
     role ENUM('user', 'manager') DEFAULT 'user',
     unit_id INT,
     validated BOOLEAN DEFAULT FALSE,
-    confirmation_token VARCHAR(255) NULL,
+    token_version INT NOT NULL DEFAULT 0, -- Bumped when a token claim changes, revoking older access tokens
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_users_updated_at (updated_at), -- Part of the cached lists' version
+    FULLTEXT INDEX ft_users_name (name), -- For /leave_requests/search
     FOREIGN KEY (unit_id) REFERENCES units(id) ON DELETE SET NULL
 );
 
+-- Also revoke tokens when claims are edited outside the API (e.g. role changes in phpMyAdmin);
+-- updates made by the API already bump token_version themselves
+CREATE TRIGGER users_bump_token_version BEFORE UPDATE ON users FOR EACH ROW
+    SET NEW.token_version = NEW.token_version + (
+        NEW.token_version = OLD.token_version AND NOT (
+            OLD.name <=> NEW.name AND OLD.email <=> NEW.email AND OLD.role <=> NEW.role
+            AND OLD.unit_id <=> NEW.unit_id AND OLD.validated <=> NEW.validated
+        )
+    );
+
 -- 3. LEAVE REQUESTS TABLE
 CREATE TABLE leave_requests (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -35,12 +48,132 @@ CREATE TABLE leave_requests (
     reviewed_at DATETIME,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    starts_at DATETIME NULL, -- Both types as a half-open [starts_at, ends_at) interval, set by the API
+    ends_at DATETIME NULL,
+    INDEX idx_leave_requests_ends_at_starts_at (ends_at, starts_at), -- For "who is away" overlap queries
+    FULLTEXT INDEX ft_leave_requests_reason (reason), -- For /leave_requests/search
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (reviewed_by) REFERENCES users(id) ON DELETE SET NULL
 );
 
--- 4. INSERT DEFAULT UNIT
+-- 4. REFRESH TOKENS TABLE (SHA-256 HASHES, ROTATED WITHIN A FAMILY)
+CREATE TABLE refresh_tokens (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    token_hash CHAR(64) NOT NULL UNIQUE,
+    family_id VARCHAR(32) NOT NULL,
+    expires_at DATETIME NOT NULL,
+    revoked_at DATETIME NULL, -- Set when rotated or revoked; reuse after this revokes the family
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_refresh_tokens_user_id (user_id),
+    INDEX idx_refresh_tokens_family_id (family_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- 5. EMAIL VERIFICATION TOKENS TABLE (KEYED BY SHA-256 OF THE TOKEN, EXPIRING)
+CREATE TABLE email_verification_tokens (
+    token_hash CHAR(64) PRIMARY KEY,
+    user_id INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_email_verification_tokens_user_id (user_id),
+    INDEX idx_email_verification_tokens_expires_at (expires_at),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- 6. LEAVE REQUESTS ARCHIVE (REVIEWED REQUESTS FROM PAST YEARS, PARTITIONED BY YEAR)
+CREATE TABLE leave_requests_archive (
+    id INT NOT NULL, -- Same id as in leave_requests
+    user_id INT NOT NULL,
+    request_type ENUM('timeoff', 'permission') NOT NULL,
+    start_date DATE NULL,
+    end_date DATE NULL,
+    start_datetime DATETIME NULL,
+    end_datetime DATETIME NULL,
+    reason TEXT,
+    status ENUM('pending', 'approved', 'rejected'),
+    reviewed_by INT,
+    reviewed_at DATETIME,
+    created_at DATETIME,
+    updated_at DATETIME,
+    starts_at DATETIME,
+    ends_at DATETIME,
+    period_end DATE NOT NULL, -- end_date, or DATE(end_datetime) for permissions
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    -- The partitioning key must be part of every unique key; partitioned tables can't have foreign keys
+    PRIMARY KEY (id, period_end),
+    INDEX idx_leave_requests_archive_user_id (user_id)
+)
+-- One partition per year; before a year passes, split pmax with
+-- ALTER TABLE leave_requests_archive REORGANIZE PARTITION pmax INTO (PARTITION p2031 VALUES LESS THAN (2032), PARTITION pmax VALUES LESS THAN MAXVALUE);
+PARTITION BY RANGE (YEAR(period_end)) (
+    PARTITION p_old VALUES LESS THAN (2024),
+    PARTITION p2024 VALUES LESS THAN (2025),
+    PARTITION p2025 VALUES LESS THAN (2026),
+    PARTITION p2026 VALUES LESS THAN (2027),
+    PARTITION p2027 VALUES LESS THAN (2028),
+    PARTITION p2028 VALUES LESS THAN (2029),
+    PARTITION p2029 VALUES LESS THAN (2030),
+    PARTITION p2030 VALUES LESS THAN (2031),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- 7. LEAVE REQUEST CHANGES (APPEND-ONLY CHANGE FEED)
+CREATE TABLE leave_request_changes (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY, -- Cursor of GET /changes
+    leave_request_id INT NOT NULL,
+    user_id INT NOT NULL, -- Owner of the request
+    change_type VARCHAR(32) NOT NULL, -- created, status_changed, archived
+    payload TEXT NOT NULL, -- JSON snapshot of the request after the change
+    created_at DATETIME NOT NULL,
+    INDEX idx_leave_request_changes_user_id (user_id) -- Version of a user's cached list
+);
+
+-- 8. WEBHOOK SUBSCRIPTIONS AND DELIVERIES
+CREATE TABLE webhook_subscriptions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    url VARCHAR(500) NOT NULL,
+    secret CHAR(64) NOT NULL, -- HMAC-SHA256 signing key, shown to the manager once
+    event_types VARCHAR(100) NOT NULL, -- Comma separated: created, status_changed
+    max_concurrency INT NOT NULL DEFAULT 2, -- Batches in flight to this endpoint at once
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    last_change_id BIGINT NOT NULL DEFAULT 0, -- Last leave_request_changes id queued for this subscription
+    created_by INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL
+);
+
+-- Pending rows are the delivery queue; dead rows are the dead letters
+CREATE TABLE webhook_deliveries (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    subscription_id INT NOT NULL,
+    change_id BIGINT NOT NULL,
+    payload TEXT NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending', -- pending, delivered, dead
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_until DATETIME NULL, -- Lease held by the dispatcher while sending
+    last_error TEXT,
+    delivered_at DATETIME NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_webhook_deliveries_subscription_id (subscription_id),
+    INDEX idx_webhook_deliveries_status_next_attempt_at (status, next_attempt_at),
+    FOREIGN KEY (subscription_id) REFERENCES webhook_subscriptions(id) ON DELETE CASCADE
+);
+
+-- 9. CALENDAR FEED TOKENS (SHA-256 HASHES OF THE SECRETS IN .ICS FEED URLS)
+CREATE TABLE calendar_feed_tokens (
+    token_hash CHAR(64) PRIMARY KEY, -- SHA-256 of the token in the feed URL
+    kind VARCHAR(8) NOT NULL, -- user, unit
+    subject_id INT NOT NULL, -- User or unit id, depending on kind
+    created_by INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_calendar_feed_tokens_kind_subject_id (kind, subject_id),
+    FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- 10. INSERT DEFAULT UNIT
 INSERT INTO units (name) VALUES ('Default Office');
 
--- 5. INSERT ADMIN USER WITH PASSWORD 'password'
+-- 11. INSERT ADMIN USER WITH PASSWORD 'password'
 INSERT INTO users (name, email, password_hash, auth_provider, role, unit_id, validated) VALUES ('Admin', 'admin@example.com', '$2b$12$iDrs7S9nqjA0d/zeocrMLe0RIrY8utFgGxJZ1w1p7PN7HlUZQ31aO', 'local', 'manager', 1, 1);
@@ -0,0 +1,13 @@
+-- Refresh tokens with rotation (SHA-256 hashes, rotated within a family)
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    token_hash CHAR(64) NOT NULL UNIQUE,
+    family_id VARCHAR(32) NOT NULL,
+    expires_at DATETIME NOT NULL,
+    revoked_at DATETIME NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_refresh_tokens_user_id (user_id),
+    INDEX idx_refresh_tokens_family_id (family_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
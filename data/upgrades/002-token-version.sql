@@ -0,0 +1,10 @@
+-- Token version for stateless JWT authentication
+ALTER TABLE users ADD COLUMN token_version INT NOT NULL DEFAULT 0 AFTER confirmation_token;
+
+CREATE TRIGGER users_bump_token_version BEFORE UPDATE ON users FOR EACH ROW
+    SET NEW.token_version = NEW.token_version + (
+        NEW.token_version = OLD.token_version AND NOT (
+            OLD.name <=> NEW.name AND OLD.email <=> NEW.email AND OLD.role <=> NEW.role
+            AND OLD.unit_id <=> NEW.unit_id AND OLD.validated <=> NEW.validated
+        )
+    );
@@ -0,0 +1,18 @@
+-- Confirmation tokens move from users.confirmation_token to a dedicated, expiring table
+CREATE TABLE IF NOT EXISTS email_verification_tokens (
+    token_hash CHAR(64) PRIMARY KEY,
+    user_id INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_email_verification_tokens_user_id (user_id),
+    INDEX idx_email_verification_tokens_expires_at (expires_at),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Carry over pending tokens so already-sent confirmation links keep working
+INSERT IGNORE INTO email_verification_tokens (token_hash, user_id, expires_at)
+SELECT SHA2(confirmation_token, 256), id, NOW() + INTERVAL 48 HOUR
+FROM users
+WHERE confirmation_token IS NOT NULL AND validated = FALSE;
+
+ALTER TABLE users DROP COLUMN confirmation_token;
@@ -0,0 +1,37 @@
+-- Archive tier for leave requests: reviewed requests that ended in past years move here.
+-- Creating the table takes no lock on leave_requests. Existing rows are then moved by the
+-- batched job, a few hundred rows per short transaction, while the API keeps serving:
+--   docker exec timeoff-manager-api python -m jobs.archive_leave_requests
+CREATE TABLE leave_requests_archive (
+    id INT NOT NULL, -- Same id as in leave_requests
+    user_id INT NOT NULL,
+    request_type ENUM('timeoff', 'permission') NOT NULL,
+    start_date DATE NULL,
+    end_date DATE NULL,
+    start_datetime DATETIME NULL,
+    end_datetime DATETIME NULL,
+    reason TEXT,
+    status ENUM('pending', 'approved', 'rejected'),
+    reviewed_by INT,
+    reviewed_at DATETIME,
+    created_at DATETIME,
+    updated_at DATETIME,
+    period_end DATE NOT NULL, -- end_date, or DATE(end_datetime) for permissions
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    -- The partitioning key must be part of every unique key; partitioned tables can't have foreign keys
+    PRIMARY KEY (id, period_end),
+    INDEX idx_leave_requests_archive_user_id (user_id)
+)
+-- One partition per year; before a year passes, split pmax with
+-- ALTER TABLE leave_requests_archive REORGANIZE PARTITION pmax INTO (PARTITION p2031 VALUES LESS THAN (2032), PARTITION pmax VALUES LESS THAN MAXVALUE);
+PARTITION BY RANGE (YEAR(period_end)) (
+    PARTITION p_old VALUES LESS THAN (2024),
+    PARTITION p2024 VALUES LESS THAN (2025),
+    PARTITION p2025 VALUES LESS THAN (2026),
+    PARTITION p2026 VALUES LESS THAN (2027),
+    PARTITION p2027 VALUES LESS THAN (2028),
+    PARTITION p2028 VALUES LESS THAN (2029),
+    PARTITION p2029 VALUES LESS THAN (2030),
+    PARTITION p2030 VALUES LESS THAN (2031),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
@@ -0,0 +1,6 @@
+-- Full-text indexes for GET /leave_requests/search.
+-- InnoDB builds a FULLTEXT index in place but blocks writes to the table while it does
+-- (reads continue); the first one on a table also adds a hidden FTS_DOC_ID column.
+-- On a large leave_requests, run this in a quiet period.
+ALTER TABLE users ADD FULLTEXT INDEX ft_users_name (name);
+ALTER TABLE leave_requests ADD FULLTEXT INDEX ft_leave_requests_reason (reason);
@@ -0,0 +1,10 @@
+-- Normalized [starts_at, ends_at) interval for both request types, used by GET /leave_requests/away.
+-- Adding nullable columns at the end is instant on MySQL 8, and the index is built online
+-- (reads and writes continue). The API fills both columns on every write; existing rows are
+-- filled afterwards in small batches, leaving updated_at untouched:
+--   docker exec timeoff-manager-api python -m jobs.backfill_leave_intervals
+ALTER TABLE leave_requests ADD COLUMN starts_at DATETIME NULL, ADD COLUMN ends_at DATETIME NULL, ALGORITHM=INSTANT;
+ALTER TABLE leave_requests ADD INDEX idx_leave_requests_ends_at_starts_at (ends_at, starts_at), ALGORITHM=INPLACE, LOCK=NONE;
+
+-- The archive job copies every leave_requests column by name
+ALTER TABLE leave_requests_archive ADD COLUMN starts_at DATETIME NULL, ADD COLUMN ends_at DATETIME NULL;
@@ -0,0 +1,10 @@
+-- Append-only change log behind GET /changes and /changes/stream, written by the API in the
+-- same transaction as each create and status change. New table only; no existing table is touched.
+CREATE TABLE leave_request_changes (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY, -- Cursor of GET /changes
+    leave_request_id INT NOT NULL,
+    user_id INT NOT NULL, -- Owner of the request
+    change_type VARCHAR(32) NOT NULL, -- created, status_changed
+    payload TEXT NOT NULL, -- JSON snapshot of the request after the change
+    created_at DATETIME NOT NULL
+);
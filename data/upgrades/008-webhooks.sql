@@ -0,0 +1,31 @@
+-- Webhook subscriptions and their delivery queue, filled from leave_request_changes by jobs.webhooks. New tables only.
+CREATE TABLE webhook_subscriptions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    url VARCHAR(500) NOT NULL,
+    secret CHAR(64) NOT NULL, -- HMAC-SHA256 signing key, shown to the manager once
+    event_types VARCHAR(100) NOT NULL, -- Comma separated: created, status_changed
+    max_concurrency INT NOT NULL DEFAULT 2, -- Batches in flight to this endpoint at once
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    last_change_id BIGINT NOT NULL DEFAULT 0, -- Last leave_request_changes id queued for this subscription
+    created_by INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL
+);
+
+-- Pending rows are the delivery queue; dead rows are the dead letters
+CREATE TABLE webhook_deliveries (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    subscription_id INT NOT NULL,
+    change_id BIGINT NOT NULL,
+    payload TEXT NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending', -- pending, delivered, dead
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_until DATETIME NULL, -- Lease held by the dispatcher while sending
+    last_error TEXT,
+    delivered_at DATETIME NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_webhook_deliveries_subscription_id (subscription_id),
+    INDEX idx_webhook_deliveries_status_next_attempt_at (status, next_attempt_at),
+    FOREIGN KEY (subscription_id) REFERENCES webhook_subscriptions(id) ON DELETE CASCADE
+);
@@ -0,0 +1,10 @@
+-- Secret tokens of the per-user and per-unit iCalendar feeds. New table only.
+CREATE TABLE calendar_feed_tokens (
+    token_hash CHAR(64) PRIMARY KEY, -- SHA-256 of the token in the feed URL
+    kind VARCHAR(8) NOT NULL, -- user, unit
+    subject_id INT NOT NULL, -- User or unit id, depending on kind
+    created_by INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_calendar_feed_tokens_kind_subject_id (kind, subject_id),
+    FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE CASCADE
+);
@@ -0,0 +1,7 @@
+-- Cached leave request lists are keyed by a version read from the database, so a write on
+-- one worker reaches every worker as soon as it commits: the latest change feed ids (per
+-- owner, hence the index on user_id) and the latest user and unit updates. Existing units
+-- get the current time as their updated_at. The indexes are built online.
+ALTER TABLE units ADD COLUMN updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+ALTER TABLE users ADD INDEX idx_users_updated_at (updated_at), ALGORITHM=INPLACE, LOCK=NONE;
+ALTER TABLE leave_request_changes ADD INDEX idx_leave_request_changes_user_id (user_id), ALGORITHM=INPLACE, LOCK=NONE;
@@ -5,6 +5,7 @@ import api from '../utils/axios'
 export const useAuthStore = defineStore('auth', () => {
   // State
   const token = ref(localStorage.getItem('token') || null)
+  const refreshToken = ref(localStorage.getItem('refreshToken') || null)
   const user = ref(JSON.parse(localStorage.getItem('user') || 'null'))
   const loading = ref(false)
 
@@ -23,9 +24,11 @@ export const useAuthStore = defineStore('auth', () => {
       })
       
       token.value = response.data.token
+      refreshToken.value = response.data.refresh_token
       user.value = response.data
       
       localStorage.setItem('token', response.data.token)
+      localStorage.setItem('refreshToken', response.data.refresh_token)
       localStorage.setItem('user', JSON.stringify(response.data))
       
       return response.data
@@ -36,15 +39,54 @@ export const useAuthStore = defineStore('auth', () => {
     }
   }
 
+  // Single in-flight refresh shared by every request that hit a 401 at the same time
+  let refreshPromise = null
+
+  const refreshSession = async () => {
+    if (!refreshToken.value) {
+      return false
+    }
+    if (!refreshPromise) {
+      refreshPromise = api.post('token/refresh', { refresh_token: refreshToken.value }, { skipAuthRefresh: true })
+        .then(async (response) => {
+          token.value = response.data.token
+          refreshToken.value = response.data.refresh_token
+          localStorage.setItem('token', response.data.token)
+          localStorage.setItem('refreshToken', response.data.refresh_token)
+          
+          // Hand the new access token to the open WebSocket instead of reconnecting
+          try {
+            const { useWebSocketStore } = await import('./websocket')
+            useWebSocketStore().reauthenticate()
+          } catch (error) {
+            console.log('WebSocket store not available during token refresh')
+          }
+          return true
+        })
+        .catch(() => false)
+        .finally(() => {
+          refreshPromise = null
+        })
+    }
+    return refreshPromise
+  }
+
   const logout = async (reason = 'User logged out') => {
     console.log(`🔐 Logging out user: ${reason}`)
     
+    // Revoke the refresh token family server-side (best effort)
+    if (refreshToken.value) {
+      api.post('token/revoke', { refresh_token: refreshToken.value }, { skipAuthRefresh: true }).catch(() => {})
+    }
+    
     // Clear state
     token.value = null
+    refreshToken.value = null
     user.value = null
     
     // Clear localStorage
     localStorage.removeItem('token')
+    localStorage.removeItem('refreshToken')
     localStorage.removeItem('user')
     
     // Disconnect WebSocket if available
@@ -137,6 +179,7 @@ export const useAuthStore = defineStore('auth', () => {
   return {
     // State
     token,
+    refreshToken,
     user,
     loading,
     
@@ -147,6 +190,7 @@ export const useAuthStore = defineStore('auth', () => {
     
     // Actions
     login,
+    refreshSession,
     logout,
     forceLogout,
     validateToken,
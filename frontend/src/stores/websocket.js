@@ -146,6 +146,13 @@ export const useWebSocketStore = defineStore('websocket', () => {
     sendMessage({ type: 'ping' })
   }
 
+  // Send the refreshed access token over the open connection
+  const reauthenticate = () => {
+    if (authStore.token) {
+      sendMessage({ type: 'authenticate', token: authStore.token })
+    }
+  }
+
   const getConnectedUsers = () => {
     sendMessage({ type: 'get_connected_users' })
   }
@@ -178,6 +185,10 @@ export const useWebSocketStore = defineStore('websocket', () => {
         // Handle ping response
         break
         
+      case 'authenticated':
+        console.log('🔐 WebSocket re-authenticated, token valid until', message.expires_at)
+        break
+        
       case 'connected_users':
         console.log('Connected users:', message.users)
         break
@@ -329,6 +340,7 @@ export const useWebSocketStore = defineStore('websocket', () => {
     disconnect,
     sendMessage,
     ping,
+    reauthenticate,
     getConnectedUsers,
     addNotification,
     markAsRead,
@@ -31,6 +31,16 @@ api.interceptors.response.use(
     return response
   },
   async (error) => {
+    // Try a silent token refresh once before treating the 401 as an expired session
+    if (error.response?.status === 401 && error.config && !error.config.skipAuthRefresh && !error.config._retried) {
+      const authStore = useAuthStore()
+      if (authStore.refreshToken && await authStore.refreshSession()) {
+        error.config._retried = true
+        error.config.headers.Authorization = `Bearer ${authStore.token}`
+        return api(error.config)
+      }
+    }
+    
     if (error.response?.status === 401) {
       console.log('🔐 401 Unauthorized - Token expired, logging out user')
       console.log('🔐 Request URL:', error.config?.url)